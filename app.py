@@ -13,6 +13,10 @@ Flame app to send sequences to review.
 """
 
 import os
+import shutil
+import tempfile
+import threading
+import time
 import uuid
 
 from sgtk import TankError
@@ -32,6 +36,17 @@ class FlameReview(Application):
         """
         self.log_debug("%s: Initializing" % self)
 
+        tk_flame_review = self.import_module("tk_flame_review")
+
+        # optional recording or replay of the calls made to the site, see
+        # the shotgun property.
+        self._cassette = tk_flame_review.Cassette(
+            self.get_setting("api_cassette_path"),
+            self.get_setting("api_cassette_mode"),
+            latency_scale=self.get_setting("api_cassette_latency_scale"),
+            logger=self.log_debug,
+        )
+
         # register our desired interaction with Flame hooks
         menu_caption = self.get_setting("menu_name")
 
@@ -41,17 +56,402 @@ class FlameReview(Application):
         # flag to indicate that something was actually submitted
         self._submission_done = False
 
+        # bitrate of the export preset used for the current session
+        self._export_bitrate = 0
+
+        # progress of the assets of the current session and the panel showing it
+        self._progress = tk_flame_review.SessionProgress()
+        self._progress_panel = None
+
+        # assets of the current session and their outcome, kept on disk. It
+        # also holds the assets waiting for the end of the export.
+        self._manifest = tk_flame_review.SessionManifest(
+            os.path.join(self.cache_location, "session_manifests")
+        )
+
+        # central retry policy for all calls made to Flow Production Tracking
+        self._retry = tk_flame_review.RetryPolicy(
+            max_attempts=self.get_setting("retry_max_attempts"),
+            backoff_base=self.get_setting("retry_backoff_base"),
+            backoff_max=self.get_setting("retry_backoff_max"),
+            session_budget=self.get_setting("retry_session_budget"),
+            breaker_threshold=self.get_setting("circuit_breaker_threshold"),
+            breaker_cooldown=self.get_setting("circuit_breaker_cooldown"),
+            logger=self.log_debug,
+        )
+
+        # record of the steps completed for each submission, used to resume
+        # failed submissions without creating duplicate versions.
+        self._ledger = tk_flame_review.SubmissionLedger(
+            os.path.join(self.cache_location, "submission_ledger.db")
+        )
+
+        # average throughput of the uploads made from this host
+        self._uplink = tk_flame_review.UplinkMonitor(
+            os.path.join(self.cache_location, "uplink.json")
+        )
+
+        # index of the temporary movies written by the app, used to reclaim
+        # the ones left behind by failed or cancelled jobs.
+        self._janitor = tk_flame_review.TempJanitor(
+            os.path.join(self.cache_location, "temp_files.db"),
+            max_age=self.get_setting("temp_max_age") * 3600,
+            quota=int(self.get_setting("temp_quota") * 1024**3),
+            logger=self.log_debug,
+        )
+
+        # movies of previous submissions, reused by identical resubmissions.
+        self._render_cache = tk_flame_review.RenderCache(
+            os.path.join(self.cache_location, "render_cache"),
+            int(self.get_setting("render_cache_size") * 1024**3),
+            logger=self.log_debug,
+        )
+        # hash of the export preset of the current session
+        self._preset_hash = None
+
+        # task template new entities are created with, looked up on first use
+        self._task_template = None
+
+        # picks Version codes which don't collide with existing ones
+        self._version_namer = tk_flame_review.VersionNamer(self._find_version_codes)
+
+        # durable spool holding submissions which couldn't reach the site.
+        # It is drained by a background worker in the interactive Flame
+        # process, backburner jobs only ever add to it.
+        self._spool = None
+        self._spool_worker = None
+        self._upload_daemon = None
+        if self.get_setting("spool_deferred_submissions"):
+            self._spool = tk_flame_review.SubmissionSpool(
+                os.path.join(self.cache_location, "submission_spool.db")
+            )
+            if self.engine.has_ui:
+                self._start_spool_worker()
+
+        # metrics of the app, exported to the node-exporter of the host
+        self._metrics = tk_flame_review.MetricsRegistry("tk_flame_review")
+        self._declare_metrics()
+        self._metrics_flusher = None
+        if self.get_setting("metrics_textfile_dir") and self.engine.has_ui:
+            self._metrics_flusher = tk_flame_review.MetricsFlusher(
+                self._metrics, *self._get_metrics_paths(), logger=self.log_debug
+            )
+            self._metrics_flusher.start()
+
+        # spans of the submissions, followed from the export session to the
+        # upload jobs and written as OTLP/JSON files.
+        self._tracer = tk_flame_review.Tracer(
+            (
+                os.path.join(self.cache_location, "traces")
+                if self.get_setting("record_traces")
+                else None
+            ),
+            "tk-flame-review",
+            logger=self.log_debug,
+        )
+        self._session_span = None
+
+        # id of the current export session
+        self._session_id = None
+
+        # opt-in profiling of the callbacks and of the upload jobs
+        self._profiler = tk_flame_review.CallbackProfiler(
+            (
+                self.get_setting("profile_dir")
+                or os.path.join(self.cache_location, "profiles")
+                if self.get_setting("profile_callbacks")
+                else None
+            ),
+            int(self.get_setting("profile_max_size") * 1024**2),
+            logger=self.log_debug,
+        )
+
         # set up callbacks for the engine to trigger
         # when this profile is being triggered
         callbacks = {}
-        callbacks["preCustomExport"] = self.pre_custom_export
-        callbacks["preExportAsset"] = self.adjust_path
-        callbacks["postExportAsset"] = self.populate_shotgun
-        callbacks["postCustomExport"] = self.display_summary
+        callbacks["preCustomExport"] = self._profiler.wrap(
+            "preCustomExport", self.pre_custom_export
+        )
+        callbacks["preExportAsset"] = self._profiler.wrap(
+            "preExportAsset", self.adjust_path
+        )
+        callbacks["postExportAsset"] = self._profiler.wrap(
+            "postExportAsset", self.populate_shotgun
+        )
+        callbacks["postCustomExport"] = self._profiler.wrap(
+            "postCustomExport", self.display_summary
+        )
 
         # register with the engine
         self.engine.register_export_hook(menu_caption, callbacks)
 
+    @property
+    def shotgun(self):
+        """
+        Flow Production Tracking API connection of the app. Its calls are
+        recorded to, or replayed from, a cassette when the api_cassette_mode
+        setting asks for it, in which case the site is never reached.
+        """
+        cassette = getattr(self, "_cassette", None)
+        if cassette is None or cassette.mode == "off":
+            return super(FlameReview, self).shotgun
+        if cassette.mode == "replay":
+            return cassette.wrap(None)
+        return cassette.wrap(super(FlameReview, self).shotgun)
+
+    def destroy_app(self):
+        """
+        Called when the app is being torn down.
+        """
+        self.log_debug("%s: Destroying" % self)
+        if self._spool_worker:
+            self._spool_worker.stop()
+            self._spool_worker = None
+        if self._upload_daemon:
+            self._upload_daemon.stop()
+            self._upload_daemon = None
+        if self._metrics_flusher:
+            self._metrics_flusher.stop()
+            self._metrics_flusher = None
+
+    def _declare_metrics(self):
+        """
+        Declares the metrics recorded by the app.
+        """
+        tk_flame_review = self.import_module("tk_flame_review")
+        self._metrics.counter("sessions_total", "Export sessions started.")
+        self._metrics.counter(
+            "assets_total", "Sequences processed, by final state of their submission."
+        )
+        self._metrics.counter("uploaded_bytes_total", "Bytes of quicktimes uploaded.")
+        self._metrics.counter("failures_total", "Failures, by stage.")
+        self._metrics.histogram(
+            "phase_seconds", "Time spent submitting a sequence, by phase."
+        )
+        self._metrics.histogram(
+            "upload_seconds",
+            "Time taken by quicktime uploads.",
+            tk_flame_review.DURATION_BUCKETS + (1200, 1800, 3600),
+        )
+        self._metrics.histogram(
+            "upload_throughput_bytes_per_second",
+            "Throughput of quicktime uploads.",
+            (1e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 2.5e7, 5e7, 1e8, 2.5e8),
+        )
+
+    def _get_metrics_paths(self):
+        """
+        :returns: Tuple with the path of the file holding the metric totals of
+                  this host and the path of the textfile exporting them.
+        """
+        return (
+            os.path.join(self.cache_location, "metrics", "totals.json"),
+            os.path.join(
+                self.get_setting("metrics_textfile_dir"), "tk_flame_review.prom"
+            ),
+        )
+
+    def _flush_metrics(self):
+        """
+        Writes the metrics recorded so far, in the background if possible.
+        """
+        if not self.get_setting("metrics_textfile_dir"):
+            return
+        if self._metrics_flusher:
+            self._metrics_flusher.wake()
+            return
+        # backburner jobs end right after their work, flush before that.
+        try:
+            self._metrics.flush(*self._get_metrics_paths())
+        except Exception as e:
+            self.log_warning("Could not write metrics: %s" % e)
+
+    def _get_upload_daemon_socket_path(self):
+        """
+        Returns the path of the Unix socket the upload daemon of this host
+        listens on. This is kept short and local, Unix socket paths are limited
+        to about a hundred characters. The folder holding it is only accessible
+        by the user, see UploadDaemon.
+
+        :returns: Path to the socket.
+        """
+        return os.path.join(
+            tempfile.gettempdir(), "tk_flame_review_%d" % os.getuid(), "upload.sock"
+        )
+
+    def _uses_upload_daemon(self):
+        """
+        Checks if the uploads are handed over to the upload daemon. Uploading
+        the shortest movies first needs it: backburner runs the upload jobs in
+        the order their renders end, only the daemon can reorder the uploads
+        waiting for their turn.
+
+        :returns: True if the upload daemon is used.
+        """
+        return (
+            self.get_setting("upload_daemon")
+            or self.get_setting("upload_order") == "shortest_first"
+        )
+
+    def _start_upload_daemon(self):
+        """
+        Starts the upload daemon in this process if it isn't running on this
+        host already, e.g. because it stopped after being idle.
+        """
+        if self._upload_daemon is not None and self._upload_daemon.is_running:
+            return
+        tk_flame_review = self.import_module("tk_flame_review")
+        self._upload_daemon = tk_flame_review.UploadDaemon(
+            self._get_upload_daemon_socket_path(),
+            self._run_daemon_job,
+            idle_timeout=self.get_setting("upload_daemon_idle_timeout"),
+            shortest_first=self.get_setting("upload_order") == "shortest_first",
+            on_cancelled=self._cancel_daemon_job,
+            logger=self.log_debug,
+        )
+        try:
+            started = self._upload_daemon.start()
+        except Exception as e:
+            self.log_warning("Could not start the upload daemon: %s" % e)
+            started = False
+        if not started:
+            # e.g. another Flame process on this host is serving uploads already.
+            self._upload_daemon = None
+
+    def _run_daemon_job(self, job):
+        """
+        Uploads a quicktime handed to the upload daemon.
+
+        :param job: Dictionary with the arguments of backburner_upload_quicktime.
+        """
+        try:
+            with self._tracer.resume(job.get("trace")):
+                with self._tracer.span("upload daemon job"):
+                    self._upload_or_spool(
+                        job["full_path"], job["sg_version_id"], job.get("fingerprint")
+                    )
+        finally:
+            self._tracer.flush()
+
+    def _cancel_daemon_job(self, job):
+        """
+        Handles an upload submitted by this process which the upload daemon
+        cancelled when stopping: it is spooled if possible, otherwise its
+        submission is left for the next export of the asset to resume.
+
+        :param job: Dictionary with the arguments of backburner_upload_quicktime.
+        """
+        self.log_warning(
+            "Upload of '%s' was cancelled when the upload daemon stopped."
+            % job["full_path"]
+        )
+        if self._spool:
+            self._spool.push(
+                "upload",
+                {
+                    "full_path": job["full_path"],
+                    "sg_version_id": job["sg_version_id"],
+                    "fingerprint": job.get("fingerprint"),
+                    "trace": job.get("trace"),
+                },
+            )
+        else:
+            self._ledger.record_upload_failure(job["sg_version_id"])
+
+    def _start_spool_worker(self):
+        """
+        Starts the background worker submitting spooled items once
+        Flow Production Tracking is reachable again.
+        """
+        tk_flame_review = self.import_module("tk_flame_review")
+        self._spool_worker = tk_flame_review.SpoolWorker(
+            self._spool,
+            self._process_spooled_item,
+            self._is_transient_failure,
+            interval=self.get_setting("circuit_breaker_cooldown"),
+            logger=self.log_debug,
+        )
+        self._spool_worker.start()
+
+    def _is_transient_failure(self, exception):
+        """
+        Checks if a submission or an upload which failed with an exception
+        can be tried again later.
+
+        :param exception: Exception instance to classify.
+        :returns: True if the failure is caused by the site being unavailable.
+        """
+        tk_flame_review = self.import_module("tk_flame_review")
+        return isinstance(
+            exception,
+            (tk_flame_review.CircuitOpenError, tk_flame_review.RetryBudgetExceeded),
+        ) or tk_flame_review.is_transient_error(exception)
+
+    def _process_spooled_item(self, kind, payload):
+        """
+        Processes an item drained from the submission spool.
+
+        :param kind: Either "submission" for an asset whose entities still need
+                     to be created or "upload" for a quicktime to upload.
+        :param payload: Dictionary describing the item, as passed to the spool.
+        """
+        if kind not in ("submission", "upload"):
+            raise TankError("Unknown spooled item type '%s'." % kind)
+
+        try:
+            with self._tracer.resume(payload.get("trace")):
+                with self._tracer.span("spooled %s" % kind):
+                    if kind == "submission":
+                        self._submit_spooled_asset(payload["info"], payload["comments"])
+                    else:
+                        self._upload_spooled_quicktime(payload)
+        finally:
+            self._tracer.flush()
+
+    def _upload_spooled_quicktime(self, payload):
+        """
+        Uploads a quicktime drained from the submission spool.
+
+        :param payload: Dictionary with the arguments of _upload_quicktime.
+        """
+        try:
+            self._upload_quicktime(
+                payload["full_path"],
+                payload["sg_version_id"],
+                payload.get("fingerprint"),
+            )
+        except Exception as e:
+            if not self._is_transient_failure(e):
+                # the spool gives up on it, the next export resumes it.
+                self._ledger.record_upload_failure(payload["sg_version_id"])
+            raise
+
+    def _submit_spooled_asset(self, info, comments):
+        """
+        Submits an asset drained from the submission spool.
+
+        :param info: Flame asset info dictionary, as spooled.
+        :param comments: Review comments entered by the user.
+        """
+        tk_flame_review = self.import_module("tk_flame_review")
+
+        record = tk_flame_review.AssetRecord.from_info(info)
+        record.state = self._progress.FAILED
+        try:
+            record.version_id = self._submit_asset(info, comments)
+        except Exception:
+            self._progress.finish(
+                info["resolvedPath"], info["sequenceName"], self._progress.FAILED
+            )
+            raise
+        else:
+            self._progress.finish(
+                info["resolvedPath"], info["sequenceName"], self._progress.SUBMITTED
+            )
+            record.state = self._progress.SUBMITTED
+        finally:
+            self._record_asset(record)
+
     def pre_custom_export(self, session_id, info):
         """
         Flame hook called before a custom export begins. The export will be blocked
@@ -75,6 +475,30 @@ class FlameReview(Application):
 
         # clear our flags
         self._submission_done = False
+        self._session_id = session_id
+        self._retry.reset_session()
+        self._progress.reset()
+        self._manifest.start()
+        self._version_namer.reset()
+
+        # everything done for this session is recorded in a single trace.
+        self._tracer.end(self._session_span)
+        self._tracer.start_trace()
+        self._session_span = self._tracer.begin("export session", session_id=session_id)
+
+        if self._spool and self._spool.pending_count():
+            self.log_debug(
+                "%d submissions are waiting in the spool for Flow Production Tracking."
+                % self._spool.pending_count()
+            )
+            # only the interactive Flame process drains the spool.
+            if self._spool_worker:
+                self._spool_worker.wake()
+
+        self._reclaim_temp_files()
+
+        if self._uses_upload_daemon() and self.engine.has_ui:
+            self._start_upload_daemon()
 
         # pop up a UI asking the user for description
         tk_flame_review = self.import_module("tk_flame_review")
@@ -86,6 +510,7 @@ class FlameReview(Application):
             # user pressed cancel
             info["abort"] = True
             info["abortMessage"] = "User cancelled the operation."
+            self._end_session_trace()
 
         else:
             # get comments from user
@@ -93,12 +518,18 @@ class FlameReview(Application):
 
             # populate the host to use for the export. Currently hard coded to local
             info["destinationHost"] = self.engine.get_server_hostname()
-            # set the (temp) location where media is being output prior to upload.
-            info["destinationPath"] = self.engine.get_backburner_tmp()
             # pick up the xml export profile from the configuration
-            info["presetPath"] = self.execute_hook_method(
-                "settings_hook", "get_export_preset"
+            info["presetPath"] = self._apply_upload_budget(
+                self.execute_hook_method("settings_hook", "get_export_preset")
             )
+            # set the (temp) location where media is being output prior to upload.
+            info["destinationPath"] = self._select_temp_volume(info["presetPath"])
+            self._preset_hash = None
+            if self._render_cache.enabled:
+                try:
+                    self._preset_hash = tk_flame_review.hash_file(info["presetPath"])
+                except Exception as e:
+                    self.log_warning("Could not hash export preset: %s" % e)
             # Is the movie generation for the preview foreground or background
             info["isBackground"] = self.get_setting("background_export")
 
@@ -106,6 +537,7 @@ class FlameReview(Application):
                 "%s: Starting custom export session with preset '%s'"
                 % (self, info["presetPath"])
             )
+            self._metrics.inc("sessions_total")
 
         # Log usage metrics
         try:
@@ -114,6 +546,86 @@ class FlameReview(Application):
             # ingore any errors. ex: metrics logging not supported
             pass
 
+    def _apply_upload_budget(self, preset_path):
+        """
+        Switches to a lower bitrate preset if the movies generated with the given
+        preset are not expected to upload within the upload_time_budget setting.
+
+        The budget is based on the throughput measured by previous uploads from this
+        host and on the expected_export_duration setting, since the sequences being
+        exported are not known yet.
+
+        :param preset_path: Path to the export preset from the settings hook.
+        :returns: Path to the export preset to use.
+        """
+        tk_flame_review = self.import_module("tk_flame_review")
+
+        time_budget = self.get_setting("upload_time_budget")
+        if not time_budget:
+            return preset_path
+
+        throughput = self._uplink.throughput
+        if not throughput:
+            self.log_debug("No upload throughput measured yet, ignoring upload budget.")
+            return preset_path
+
+        max_bitrate = tk_flame_review.get_budget_bitrate(
+            throughput,
+            time_budget * 60,
+            self.get_setting("expected_export_duration") * 60,
+        )
+        # round down to whole megabits so that generated presets can be reused.
+        max_bitrate = max(1000000, max_bitrate - max_bitrate % 1000000)
+
+        bitrate = self.execute_hook_method(
+            "settings_hook", "get_export_bitrate", preset_path=preset_path
+        )
+        if bitrate <= max_bitrate:
+            return preset_path
+
+        budget_preset_path = self.execute_hook_method(
+            "settings_hook",
+            "get_budget_export_preset",
+            preset_path=preset_path,
+            max_bitrate=max_bitrate,
+        )
+        self.log_debug(
+            "Using preset '%s' to upload within %d minutes at %.1f MB/s."
+            % (budget_preset_path, time_budget, throughput / 1e6)
+        )
+        return budget_preset_path
+
+    def _select_temp_volume(self, preset_path):
+        """
+        Picks the folder where the quicktimes are written prior to upload among
+        the ones returned by the settings hook.
+
+        The sequences being exported are only known once the export has started,
+        so the space required is estimated from the expected_export_duration setting.
+
+        :param preset_path: Path to the export preset used for the export.
+        :returns: Path to a folder.
+        """
+        tk_flame_review = self.import_module("tk_flame_review")
+
+        volumes = self.execute_hook_method("settings_hook", "get_temp_volumes")
+        self._export_bitrate = self.execute_hook_method(
+            "settings_hook", "get_export_bitrate", preset_path=preset_path
+        )
+        # the estimate only depends on the duration, use a nominal frame rate.
+        fps = 24
+        required_size = tk_flame_review.estimate_output_size(
+            self._export_bitrate,
+            self.get_setting("expected_export_duration") * 60 * fps,
+            fps,
+        )
+
+        selector = tk_flame_review.TempVolumeSelector(
+            os.path.join(self.cache_location, "temp_volumes.json"),
+            logger=self.log_debug,
+        )
+        return selector.select(volumes, required_size)
+
     def adjust_path(self, session_id, info):
         """
         Flame hook called when an item is about to be exported and a path needs to be computed.
@@ -159,8 +671,16 @@ class FlameReview(Application):
 
         name = info.get("assetName", info.get("name"))  # ensure backward compatibility
 
-        # ensure each quicktime gets a unique name
+        # ensure each quicktime gets a unique name, an earlier export of the
+        # same asset may still be uploading its own.
         info["resolvedPath"] = "%s.%s.mov" % (name, uuid.uuid4().hex)
+        full_path = os.path.join(info["destinationPath"], info["resolvedPath"])
+        self._janitor.track(full_path)
+        self._check_temp_space(full_path, info)
+
+        if self.get_setting("unique_version_codes"):
+            # looked up along with the other codes of the session.
+            self._version_namer.add(self._get_version_title(info))
 
         # If client override DL_PYTHON_HOOK_PATH env var, it changes the order python hook
         # are triggered and can change the value of the global hook useBackburnerPostExportAsset.
@@ -221,6 +741,324 @@ class FlameReview(Application):
             # ignore these.
             return
 
+        tk_flame_review = self.import_module("tk_flame_review")
+        self._show_progress_panel()
+
+        if self._preset_hash:
+            content_id = self.execute_hook_method(
+                "settings_hook", "get_render_identity", info=info
+            )
+            if content_id:
+                # kept in the info so that it is spooled along with it.
+                info["renderFingerprint"] = tk_flame_review.make_fingerprint(
+                    info, self._preset_hash, content_id
+                )
+
+        if self.get_setting("defer_entity_resolution") and info.get("isBackground"):
+            # the upload has to wait for the background render anyway, so the
+            # entity can be resolved along with all the others once the
+            # export is done.
+            record = tk_flame_review.AssetRecord.from_info(info)
+            record.state = record.PENDING
+            if self._record_asset(record):
+                self._report_progress(
+                    info, "Queued", "Waiting for the end of the export"
+                )
+                return
+
+        self._process_asset(info)
+
+    def _end_session_trace(self):
+        """
+        Closes the span of the export session and writes the spans recorded.
+        """
+        self._tracer.end(self._session_span)
+        self._session_span = None
+        self._tracer.flush()
+
+    def _process_asset(self, info, sg_data=None, created=False):
+        """
+        Submits an exported asset and records its outcome.
+
+        :param info: Flame asset info dictionary, as passed to populate_shotgun.
+        :param sg_data: Entity the asset belongs to if it has been resolved
+                        already, None to look it up.
+        :param created: True if sg_data has just been created for the asset.
+        """
+        tk_flame_review = self.import_module("tk_flame_review")
+
+        record = tk_flame_review.AssetRecord.from_info(info)
+        record.state = self._progress.FAILED
+        span = self._tracer.begin("submit asset", sequence=info["sequenceName"])
+        try:
+            if self._retry.breaker.is_open:
+                # the site is down, don't wait on it for every single asset.
+                record.state = self._defer_asset(
+                    info, "Flow Production Tracking is unavailable."
+                )
+                return
+
+            try:
+                record.version_id = self._submit_asset(
+                    info, self._review_comments, sg_data, created
+                )
+            except Exception as e:
+                if self._is_transient_failure(e):
+                    # the site went down or can't be reached, e.g. the first
+                    # submission of an outage failing before the breaker opens.
+                    record.state = self._defer_asset(info, e)
+                    return
+                self._progress.finish(
+                    info["resolvedPath"], info["sequenceName"], self._progress.FAILED
+                )
+                raise
+            else:
+                self._progress.finish(
+                    info["resolvedPath"], info["sequenceName"], self._progress.SUBMITTED
+                )
+                record.state = self._progress.SUBMITTED
+        finally:
+            self._record_asset(record)
+            self._metrics.inc("assets_total", state=record.state)
+            if record.state == self._progress.FAILED:
+                self._metrics.inc("failures_total", stage="submission")
+            if span is not None:
+                span.attributes["state"] = record.state
+            self._tracer.end(
+                span,
+                error=(
+                    "Submission failed."
+                    if record.state == self._progress.FAILED
+                    else None
+                ),
+            )
+
+    def _record_asset(self, record):
+        """
+        Appends an asset to the session manifest, along with the results
+        reported for it so far. Failures are logged.
+
+        :param record: AssetRecord describing the asset and its outcome.
+        :returns: True if the asset was recorded.
+        """
+        result = self._progress.result(record.resolved_path)
+        if result:
+            record.size = result["size"]
+            record.size_estimated = result["size_estimated"]
+            record.phase_times = result["phase_times"]
+        try:
+            self._manifest.append(record)
+        except Exception as e:
+            self.log_warning("Could not update the session manifest: %s" % e)
+            return False
+        return True
+
+    def _defer_asset(self, info, reason):
+        """
+        Spools an asset which could not be submitted to Flow Production Tracking.
+
+        The asset is only reported as deferred once it has been written to the
+        spool. If spooling is disabled or fails, the asset is reported as failed.
+
+        :param info: Flame asset info dictionary, as passed to populate_shotgun.
+        :param reason: Reason why the asset couldn't be submitted.
+        :returns: The state the asset was given, DEFERRED or FAILED.
+        """
+        state = self._progress.FAILED
+        if self._spool:
+            try:
+                self._spool.push(
+                    "submission",
+                    {
+                        "info": self._get_plain_info(info),
+                        "comments": self._review_comments,
+                        "trace": self._tracer.context(),
+                    },
+                )
+            except Exception as e:
+                self.log_error(
+                    "Could not spool the submission of '%s': %s"
+                    % (info.get("sequenceName"), e)
+                )
+            else:
+                state = self._progress.DEFERRED
+
+        if state == self._progress.DEFERRED:
+            self.log_warning(
+                "Deferring submission of '%s', it will be sent once Flow "
+                "Production Tracking is reachable: %s"
+                % (info.get("sequenceName"), reason)
+            )
+        else:
+            self.log_error(
+                "Could not submit '%s': %s" % (info.get("sequenceName"), reason)
+            )
+        self._progress.finish(info["resolvedPath"], info["sequenceName"], state)
+        return state
+
+    def _get_plain_info(self, info):
+        """
+        Copies the plain values of an asset info dictionary, this is all a
+        submission needs.
+
+        :param info: Flame asset info dictionary.
+        :returns: Dictionary which can be serialized.
+        """
+        return dict(
+            (key, value)
+            for (key, value) in info.items()
+            if isinstance(value, (str, int, float, bool, type(None)))
+        )
+
+    def _submit_buffered_assets(self):
+        """
+        Submits the assets recorded as pending in the session manifest while
+        the export was running.
+
+        Their entities are all looked up with a single query and the missing
+        ones are created in a single batch. If this fails, each asset falls
+        back to looking up its own entity.
+        """
+        tk_flame_review = self.import_module("tk_flame_review")
+        assets = [
+            record.to_info()
+            for record in self._manifest.latest()
+            if record.state == tk_flame_review.AssetRecord.PENDING
+        ]
+        if not assets:
+            return
+
+        entity_type = self.get_setting("shotgun_entity_type")
+        entities = {}
+        created = set()
+        if not self._retry.breaker.is_open:
+            try:
+                with self._tracer.span(
+                    "bulk find or create entities", count=len(assets)
+                ):
+                    entities, created = tk_flame_review.bulk_find_or_create(
+                        self.shotgun,
+                        self._retry.call,
+                        entity_type,
+                        self.context.project,
+                        [info["sequenceName"] for info in assets],
+                        self._get_entity_data,
+                        os.path.join(self.cache_location, "locks"),
+                        logger=self.log_debug,
+                    )
+            except Exception as e:
+                self.log_warning(
+                    "Could not resolve %s entities in bulk, resolving them one "
+                    "by one: %s" % (entity_type, e)
+                )
+
+        for info in assets:
+            name = info["sequenceName"]
+            try:
+                # only the first asset of a new entity generates its thumbnail.
+                self._process_asset(info, entities.get(name), name in created)
+            except Exception as e:
+                self.log_error("Could not submit '%s': %s" % (name, e))
+            created.discard(name)
+
+    def _check_temp_space(self, full_path, info):
+        """
+        Warns if the volume an asset is exported to doesn't have enough free
+        space for it.
+
+        :param full_path: Path the asset will be written to.
+        :param info: Flame asset info dictionary, as passed to adjust_path.
+        """
+        tk_flame_review = self.import_module("tk_flame_review")
+
+        required_size = tk_flame_review.estimate_output_size(
+            self._export_bitrate,
+            info.get("sourceOut", 0) - info.get("sourceIn", 0),
+            info.get("fps"),
+        )
+        try:
+            free_space = shutil.disk_usage(os.path.dirname(full_path)).free
+        except OSError:
+            return
+        if free_space < required_size:
+            self.log_warning(
+                "'%s' needs about %d bytes but only %d bytes are free in '%s'."
+                % (info.get("sequenceName"), required_size, free_space, full_path)
+            )
+
+    def _get_submission_key(self, info):
+        """
+        Computes the key identifying the submission of an exported asset.
+
+        The Flame session id changes every time an export is run, so the
+        project is used to scope the key instead.
+
+        :param info: Flame asset info dictionary.
+        :returns: Submission key, as a string.
+        """
+        tk_flame_review = self.import_module("tk_flame_review")
+        return tk_flame_review.SubmissionLedger.make_key(
+            self.context.project["id"],
+            self.get_setting("shotgun_entity_type"),
+            info.get("sequenceName"),
+            info.get("versionNumber"),
+            info.get("recordIn"),
+            info.get("recordOut"),
+        )
+
+    def _show_progress_panel(self):
+        """
+        Opens the panel showing the progress of the session, if not already opened.
+        """
+        if self._progress_panel is not None or not self.engine.has_ui:
+            return
+        tk_flame_review = self.import_module("tk_flame_review")
+        self._progress_panel = self.engine.show_dialog(
+            "Updating Flow Production Tracking...",
+            self,
+            tk_flame_review.ProgressPanel,
+            self._progress,
+        )
+
+    def _close_progress_panel(self):
+        """
+        Closes the panel opened by :meth:`_show_progress_panel`.
+        """
+        if self._progress_panel is not None:
+            self._progress_panel.close()
+            self._progress_panel = None
+
+    def _report_progress(self, info, phase, details):
+        """
+        Reports what is being done for an asset. This can be called from any thread.
+
+        :param info: Flame asset info dictionary.
+        :param phase: Short name of the phase the asset is in.
+        :param details: Details about what is being processed.
+        """
+        self._progress.update(
+            info["resolvedPath"], info["sequenceName"], phase, details
+        )
+        if (
+            self._progress_panel is not None
+            and threading.current_thread() is threading.main_thread()
+        ):
+            self._progress_panel.process_updates()
+
+    def _submit_asset(self, info, comments, sg_data=None, created=False):
+        """
+        Creates the Flow Production Tracking entities for an exported asset and
+        submits a backburner job to upload its quicktime.
+
+        :param info: Flame asset info dictionary, as passed to populate_shotgun.
+        :param comments: Review comments entered by the user.
+        :param sg_data: Entity the asset belongs to if it has been resolved
+                        already, None to look it up.
+        :param created: True if sg_data has just been created for the asset.
+        :returns: Id of the Version created for the asset.
+        """
+        tk_flame_review = self.import_module("tk_flame_review")
+
         # now typically quicktimes are generates as background jobs.
         # in that case, make sure our background job that we are submitting
         # to backburner gets executed *after* the quicktime generation has completed!
@@ -229,56 +1067,79 @@ class FlameReview(Application):
         else:
             dependencies = None
 
+        # an identical earlier submission left its movie in the render cache,
+        # use it rather than waiting for the new render. A render already on
+        # disk is always uploaded, it is at least as recent as the cached one.
+        full_path = os.path.join(info["destinationPath"], info["resolvedPath"])
+        fingerprint = info.get("renderFingerprint")
+        cached_path = None
+        if fingerprint and not os.path.exists(full_path):
+            cached_path = self._render_cache.get(fingerprint)
+        if cached_path:
+            self.log_debug("Reusing cached render '%s'" % cached_path)
+            if dependencies:
+                # the background render isn't needed anymore, delete its movie
+                # once it has been written.
+                try:
+                    self._execute_in_main_thread(
+                        self._submit_cleanup_job,
+                        info["sequenceName"],
+                        dependencies,
+                        full_path,
+                        host=info.get("destinationHost"),
+                    )
+                except Exception as e:
+                    self.log_warning(
+                        "Could not submit the cleanup of '%s': %s" % (full_path, e)
+                    )
+            full_path = cached_path
+            dependencies = None
+
         # ensure that the entity exists in Flow Production Tracking
         entity_name = info["sequenceName"]
         entity_type = self.get_setting("shotgun_entity_type")
 
-        sg_data = self.shotgun.find_one(
-            entity_type,
-            [["code", "is", entity_name], ["project", "is", self.context.project]],
-        )
-
-        thumbnail_entities = []
+        # pick up where a previous attempt at the same submission stopped,
+        # unless its upload is still in flight.
+        submission_key = self._get_submission_key(info)
+        submission = self._ledger.claim(submission_key)
+        entry_id = submission["id"] if submission else None
 
         try:
-            if not sg_data:
-                self.engine.show_busy(
-                    "Updating Flow Production Tracking...",
-                    "Creating %s %s" % (entity_type, entity_name),
-                )
-                # Create a new item in Flow Production Tracking
-                # First see if we should assign a task template
-                # this is controlled via the app settings
-                # if no task template is specified in the settings,
-                # the item will be created without tasks.
-                self.log_debug("Creating a new item in Flow Production Tracking...")
-                task_template_name = self.get_setting("task_template")
-                task_template = None
-                if task_template_name:
-                    task_template = self.shotgun.find_one(
-                        "TaskTemplate", [["code", "is", task_template_name]]
+            thumbnail_entities = []
+
+            if submission:
+                sg_data = submission["entity"]
+                self.log_debug("Resuming submission linked to %s" % sg_data)
+            elif sg_data:
+                if created:
+                    thumbnail_entities.append(
+                        {"type": sg_data["type"], "id": sg_data["id"]}
                     )
-                    if not task_template:
-                        raise TankError(
-                            "The task template '%s' specified in the task_template setting "
-                            "does not exist!" % task_template_name
-                        )
-
-                sg_data = self.shotgun.create(
-                    entity_type,
-                    {
-                        "code": entity_name,
-                        "description": "Created by the Flow Production Tracking Flame integration.",
-                        "task_template": task_template,
-                        "project": self.context.project,
-                    },
+            else:
+                self._report_progress(
+                    info, entity_type, "Looking up %s %s" % (entity_type, entity_name)
                 )
+                # serialized with the other processes of this host submitting
+                # the same entity, so that it only gets created once.
+                with self._tracer.span("find or create entity"):
+                    sg_data, created = tk_flame_review.find_or_create(
+                        self.shotgun,
+                        self._retry.call,
+                        entity_type,
+                        self.context.project,
+                        entity_name,
+                        self._get_entity_data,
+                        os.path.join(self.cache_location, "locks"),
+                        logger=self.log_debug,
+                    )
+                if created:
+                    thumbnail_entities.append(
+                        {"type": sg_data["type"], "id": sg_data["id"]}
+                    )
 
-                self.log_debug("Created %s" % sg_data)
-
-                thumbnail_entities.append(
-                    {"type": sg_data["type"], "id": sg_data["id"]}
-                )
+            if not submission:
+                entry_id = self._ledger.record_entity(submission_key, sg_data)
 
             # now start the version creation process
             self.log_debug(
@@ -287,115 +1148,453 @@ class FlameReview(Application):
             )
 
             # create a version in Flow Production Tracking
-            if info["versionNumber"] != 0:
-                title = "%s v%03d" % (info["sequenceName"], info["versionNumber"])
+            title = self._get_version_title(info)
+
+            if submission and submission["version_id"]:
+                # a previous attempt at this submission got as far as creating
+                # the version, reuse it rather than creating a duplicate.
+                sg_version_data = {"type": "Version", "id": submission["version_id"]}
+                self.log_debug(
+                    "Resuming submission with existing version %s" % sg_version_data
+                )
             else:
-                title = info["sequenceName"]
-
-            self.engine.show_busy(
-                "Updating Flow Production Tracking...", "Creating Version %s" % (title)
-            )
-
-            data = {}
-            data["code"] = title
-            data["description"] = self._review_comments
-            data["project"] = self.context.project
-            data["entity"] = sg_data
-            data["created_by"] = self.context.user
-            data["user"] = self.context.user
-
-            # general metadata for the version
-            # for the frame range, there isn't very meaningful metadata we can add
-            # and we don't have corresponding frames on disk
-            # so set the first frame to 1 in order to normalize the frames from Flame
-            # which typically start at 10:00:00.00
-            #
-            # also note that Flame is out-exclusive, meaning that if you have the
-            # frame range 100-111, it corresponds to the frames
-            # 100, 101, 102, 103, 104, 105, 106, 107, 108, 109, 110
-            #
-            # We transform the above frame range (100-111) to be 1-10 in Flow Production Tracking with length 10.
-            #
-            data["sg_first_frame"] = 1
-            data["sg_last_frame"] = info["sourceOut"] - info["sourceIn"]
-            data["frame_count"] = info["sourceOut"] - info["sourceIn"]
-            data["frame_range"] = "%s-%s" % (
-                data["sg_first_frame"],
-                data["sg_last_frame"],
-            )
-            data["sg_frames_have_slate"] = False
-            data["sg_movie_has_slate"] = False
-            data["sg_frames_aspect_ratio"] = info["aspectRatio"]
-            data["sg_movie_aspect_ratio"] = info["aspectRatio"]
-
-            # This is used to find the latest Version from the same department.
-            # todo: make this configurable?
-            data["sg_department"] = "Editorial"
+                if self.get_setting("unique_version_codes"):
+                    title = self._version_namer.claim(title)
+                with self._tracer.span("create version"):
+                    sg_version_data = self._create_version(
+                        info, title, sg_data, comments
+                    )
 
-            sg_version_data = self.shotgun.create("Version", data)
+            # the movie is kept until uploaded, see _reclaim_temp_files
+            self._ledger.record_version(entry_id, sg_version_data["id"], full_path)
 
-            self.log_debug(
-                "Created a version in Flow Production Tracking: %s" % sg_version_data
-            )
             if self.get_setting("bypass_shotgun_transcoding"):
                 thumbnail_entities.append(
                     {"type": sg_version_data["type"], "id": sg_version_data["id"]}
                 )
 
-            full_path = os.path.join(info["destinationPath"], info["resolvedPath"])
+            # background renders haven't written the movie yet, estimate its size.
+            if os.path.exists(full_path):
+                size = os.path.getsize(full_path)
+            else:
+                size = tk_flame_review.estimate_output_size(
+                    self._export_bitrate,
+                    info["sourceOut"] - info["sourceIn"],
+                    info.get("fps"),
+                )
+            self._progress.set_result(
+                info["resolvedPath"],
+                version_id=sg_version_data["id"],
+                size=size,
+                size_estimated=not os.path.exists(full_path),
+            )
 
             if len(thumbnail_entities) > 0:
-                self.engine.show_busy(
-                    "Updating Flow Production Tracking...", "Generating thumbnail"
-                )
-                self.engine.thumbnail_generator.generate(
-                    display_name=title,
-                    path=full_path,
-                    dependencies=dependencies,
-                    target_entities=thumbnail_entities,
-                    asset_info=info,
-                    favor_preview=False,  # No need to generate a movie file.
-                )
-                dependencies = self.engine.thumbnail_generator.finalize()
+                self._report_progress(info, "Thumbnail", "Generating thumbnail")
+
+                def generate_thumbnail():
+                    self.engine.thumbnail_generator.generate(
+                        display_name=title,
+                        path=full_path,
+                        dependencies=dependencies,
+                        target_entities=thumbnail_entities,
+                        asset_info=info,
+                        favor_preview=False,  # No need to generate a movie file.
+                    )
+                    return self.engine.thumbnail_generator.finalize()
+
+                with self._tracer.span("submit thumbnail job"):
+                    dependencies = self._execute_in_main_thread(generate_thumbnail)
                 self.log_debug("New job dependency: %s" % dependencies)
 
-            self.engine.show_busy(
-                "Updating Flow Production Tracking...", "Preparing background job"
-            )
+            self._report_progress(info, "Backburner job", "Preparing background job")
 
             # set up the arguments which we will pass (via backburner) to
             # the target method which gets executed
-            args = {"full_path": full_path, "sg_version_id": sg_version_data["id"]}
-
-            # and populate UI params
-
-            backburner_job_title = "%s %s - Flow Production Tracking Upload" % (
-                self.get_setting("shotgun_entity_type"),
+            args = {
+                "full_path": full_path,
+                "sg_version_id": sg_version_data["id"],
+                "fingerprint": fingerprint,
+                # the upload job records its spans in the trace of this asset.
+                "trace": self._tracer.context(),
+                "session_id": self._session_id,
+                "deadline": self.execute_hook_method(
+                    "settings_hook", "get_upload_deadline", info=info
+                ),
+            }
+
+            self._execute_in_main_thread(
+                self._submit_upload_job,
                 info.get("sequenceName"),
-            )
-            backburner_job_desc = "Creates a new version record in Flow Production Tracking and uploads the associated Quicktime."
-
-            # kick off async job
-            self.engine.create_local_backburner_job(
-                backburner_job_title,
-                backburner_job_desc,
                 dependencies,
-                self,
-                "backburner_upload_quicktime",
                 args,
-                info.get("destinationHost"),
+                size,
+                host=info.get("destinationHost"),
             )
 
             # done!
             self._submission_done = True
-        finally:
-            self.engine.clear_busy()
+            return sg_version_data["id"]
+        except Exception:
+            # nothing is in flight anymore, let the next export resume it.
+            if entry_id is not None:
+                self._ledger.release(entry_id)
+            raise
+
+    def _execute_in_main_thread(self, func, *args, **kwargs):
+        """
+        Calls a function using the thumbnail generator or submitting backburner
+        jobs from the main thread. Spooled submissions are processed by a
+        background worker, their calls must not interleave with the ones of
+        the export running in the main thread.
+
+        :param func: Callable to execute.
+        :returns: The return value of the callable.
+        """
+        if threading.current_thread() is threading.main_thread():
+            return func(*args, **kwargs)
+        return self.engine.execute_in_main_thread(func, *args, **kwargs)
 
-    def backburner_upload_quicktime(self, full_path, sg_version_id):
+    def _submit_upload_job(self, name, dependencies, args, size, host=None):
+        """
+        Submits the job uploading the quicktime of an asset.
+
+        :param name: Name of the sequence the asset is part of.
+        :param dependencies: Backburner jobs the upload has to wait for, or None.
+        :param args: Arguments of backburner_upload_quicktime.
+        :param size: Expected size of the quicktime, in bytes.
+        :param host: Backburner host to run the job on.
+        """
+        # and populate UI params
+
+        backburner_job_title = "%s %s - Flow Production Tracking Upload" % (
+            self.get_setting("shotgun_entity_type"),
+            name,
+        )
+        backburner_job_desc = "Creates a new version record in Flow Production Tracking and uploads the associated Quicktime."
+
+        if (
+            dependencies is None
+            and self._upload_daemon is not None
+            and self._upload_daemon.is_running
+        ):
+            # nothing to wait for, skip the backburner job and its toolkit
+            # startup and hand the upload straight to the daemon.
+            try:
+                self._upload_daemon.submit(dict(args, expected_size=size))
+                return
+            except RuntimeError as e:
+                self.log_debug("%s Submitting a backburner job instead." % e)
+
+        # kick off async job
+        self.engine.create_local_backburner_job(
+            backburner_job_title,
+            backburner_job_desc,
+            dependencies,
+            self,
+            "backburner_upload_quicktime",
+            args,
+            host,
+        )
+
+    def _submit_cleanup_job(self, name, dependencies, full_path, host=None):
+        """
+        Submits the job deleting the movie of a background render once it has
+        been written, see backburner_delete_render.
+
+        :param name: Name of the sequence the asset is part of.
+        :param dependencies: Backburner job of the render.
+        :param full_path: Path of the movie of the render.
+        :param host: Backburner host to run the job on.
+        """
+        self.engine.create_local_backburner_job(
+            "%s %s - Flow Production Tracking Cleanup"
+            % (self.get_setting("shotgun_entity_type"), name),
+            "Deletes a Quicktime which was already uploaded from the render cache.",
+            dependencies,
+            self,
+            "backburner_delete_render",
+            {"full_path": full_path},
+            host,
+        )
+
+    def _get_entity_data(self, code):
+        """
+        Returns the fields of a new review entity.
+
+        :param code: Code of the entity.
+        :returns: Dictionary of fields.
+        """
+        return {
+            "code": code,
+            "description": "Created by the Flow Production Tracking Flame integration.",
+            "task_template": self._get_task_template(),
+            "project": self.context.project,
+        }
+
+    def _get_task_template(self):
+        """
+        Returns the task template new entities are created with. It is only
+        looked up once, the first time it is needed.
+
+        The task template is controlled via the app settings. If none is
+        specified, entities are created without tasks.
+
+        :returns: TaskTemplate entity or None.
+        """
+        task_template_name = self.get_setting("task_template")
+        if not task_template_name:
+            return None
+
+        if self._task_template is None:
+            self._task_template = self._retry.call(
+                self.shotgun.find_one,
+                "TaskTemplate",
+                [["code", "is", task_template_name]],
+            )
+            if not self._task_template:
+                raise TankError(
+                    "The task template '%s' specified in the task_template setting "
+                    "does not exist!" % task_template_name
+                )
+        return self._task_template
+
+    def _get_version_title(self, info):
+        """
+        Computes the code of the Version of an exported asset.
+
+        :param info: Flame asset info dictionary.
+        :returns: Version code, without any suffix making it unique.
+        """
+        if info["versionNumber"] != 0:
+            return "%s v%03d" % (info["sequenceName"], info["versionNumber"])
+        return info["sequenceName"]
+
+    def _find_version_codes(self, code_filters):
+        """
+        Finds the codes of the Versions of the current project matching any of
+        the given filters, in a single query.
+
+        :param code_filters: List of filters on the code field.
+        :returns: List of codes.
+        """
+        versions = self._retry.call(
+            self.shotgun.find,
+            "Version",
+            [
+                ["project", "is", self.context.project],
+                {"filter_operator": "any", "filters": code_filters},
+            ],
+            ["code"],
+        )
+        return [version["code"] for version in versions]
+
+    def _create_version(self, info, title, sg_data, comments):
+        """
+        Creates the Version for an exported asset.
+
+        :param info: Flame asset info dictionary, as passed to populate_shotgun.
+        :param title: Code of the Version.
+        :param sg_data: Entity the Version is linked to.
+        :param comments: Review comments entered by the user.
+        :returns: The created Version.
+        """
+        self._report_progress(info, "Version", "Creating Version %s" % (title))
+
+        data = {}
+        data["code"] = title
+        data["description"] = comments
+        data["project"] = self.context.project
+        data["entity"] = sg_data
+        data["created_by"] = self.context.user
+        data["user"] = self.context.user
+
+        # general metadata for the version
+        # for the frame range, there isn't very meaningful metadata we can add
+        # and we don't have corresponding frames on disk
+        # so set the first frame to 1 in order to normalize the frames from Flame
+        # which typically start at 10:00:00.00
+        #
+        # also note that Flame is out-exclusive, meaning that if you have the
+        # frame range 100-111, it corresponds to the frames
+        # 100, 101, 102, 103, 104, 105, 106, 107, 108, 109, 110
+        #
+        # We transform the above frame range (100-111) to be 1-10 in Flow Production Tracking with length 10.
+        #
+        data["sg_first_frame"] = 1
+        data["sg_last_frame"] = info["sourceOut"] - info["sourceIn"]
+        data["frame_count"] = info["sourceOut"] - info["sourceIn"]
+        data["frame_range"] = "%s-%s" % (
+            data["sg_first_frame"],
+            data["sg_last_frame"],
+        )
+        data["sg_frames_have_slate"] = False
+        data["sg_movie_has_slate"] = False
+        data["sg_frames_aspect_ratio"] = info["aspectRatio"]
+        data["sg_movie_aspect_ratio"] = info["aspectRatio"]
+
+        # This is used to find the latest Version from the same department.
+        # todo: make this configurable?
+        data["sg_department"] = "Editorial"
+
+        sg_version_data = self._retry.call(
+            self.shotgun.create, "Version", data, idempotent=False
+        )
+
+        self.log_debug(
+            "Created a version in Flow Production Tracking: %s" % sg_version_data
+        )
+
+        return sg_version_data
+
+    def backburner_upload_quicktime(
+        self,
+        full_path,
+        sg_version_id,
+        fingerprint=None,
+        trace=None,
+        session_id=None,
+        deadline=None,
+    ):
         """
         This method is called via backburner and therefore runs in the background.
         It uploads the quicktime to the version
+
+        If the upload daemon is enabled and running on this host, the upload is
+        handed over to it instead, reusing its warm connection.
+
+        :param trace: Context of the trace of the submission, as returned by
+                      Tracer.context(). None if the submission isn't traced.
+        :param session_id: Id of the export session which submitted the upload,
+                           used to group the profiles of the job with the
+                           ones of its session.
+        :param deadline: Time by which the quicktime should be reviewable, as
+                         returned by the get_upload_deadline hook, or None.
+        """
+        with self._profiler.profile("backburner_upload_quicktime", session_id):
+            try:
+                with self._tracer.resume(trace):
+                    if trace:
+                        # time spent waiting for the render and the thumbnail jobs.
+                        self._tracer.add("queued", trace["created_at"], time.time())
+                    with self._tracer.span("upload job"):
+                        self._run_upload_job(
+                            full_path, sg_version_id, fingerprint, deadline
+                        )
+            finally:
+                self._tracer.flush()
+
+    def backburner_delete_render(self, full_path):
+        """
+        This method is called via backburner and therefore runs in the background.
+        It deletes the movie of a background render which wasn't uploaded, a
+        cached movie of an identical submission having been uploaded instead.
+
+        :param full_path: Path of the movie.
+        """
+        if self._render_cache.contains(full_path):
+            return
+        try:
+            os.remove(full_path)
+            self._janitor.forget(full_path)
+            self.log_debug("Deleted unused render '%s'" % full_path)
+        except OSError as e:
+            self.log_warning("Could not remove unused render '%s': %s" % (full_path, e))
+
+    def _run_upload_job(
+        self, full_path, sg_version_id, fingerprint=None, deadline=None
+    ):
+        """
+        Uploads a quicktime from a backburner job, see backburner_upload_quicktime.
+        """
+        tk_flame_review = self.import_module("tk_flame_review")
+
+        if not os.path.exists(full_path):
+            raise TankError("Cannot find quicktime '%s'! Aborting upload." % full_path)
+
+        if self._uses_upload_daemon():
+            client = tk_flame_review.UploadDaemonClient(
+                self._get_upload_daemon_socket_path()
+            )
+            if client.ping():
+                self.log_debug("Handing upload of %s to the upload daemon." % full_path)
+                # when uploading the shortest movies first, the job doesn't wait
+                # for the upload, so that backburner runs the next render and
+                # the daemon can reorder the uploads waiting for their turn.
+                wait = self.get_setting("upload_order") != "shortest_first"
+                result = client.submit(
+                    {
+                        "full_path": full_path,
+                        "sg_version_id": sg_version_id,
+                        "fingerprint": fingerprint,
+                        "trace": self._tracer.context(),
+                        "deadline": deadline,
+                        "expected_size": os.path.getsize(full_path),
+                    },
+                    wait=wait,
+                )
+                if not wait and result.get("ok"):
+                    return
+                if result.get("state") == "done":
+                    return
+                if result.get("state") == "failed":
+                    raise TankError(
+                        "Upload daemon failed to upload '%s': %s"
+                        % (full_path, result.get("error"))
+                    )
+                # cancelled or refused, e.g. because the daemon is stopping.
+                self.log_debug("%s Uploading from this job." % result.get("error"))
+            else:
+                self.log_debug("Upload daemon not running, uploading from this job.")
+
+        try:
+            self._upload_or_spool(full_path, sg_version_id, fingerprint)
+        finally:
+            self._flush_metrics()
+
+    def _upload_or_spool(self, full_path, sg_version_id, fingerprint=None):
+        """
+        Uploads a quicktime to a version.
+
+        If Flow Production Tracking can't be reached, the upload is added to the
+        submission spool so that it is retried once the site is back.
+
+        :param full_path: Path to the quicktime to upload.
+        :param sg_version_id: Id of the Version to upload the quicktime to.
+        :param fingerprint: Fingerprint of the render, see _upload_quicktime.
+        """
+        try:
+            self._upload_quicktime(full_path, sg_version_id, fingerprint)
+        except Exception as e:
+            self._metrics.inc("failures_total", stage="upload")
+            if not self._spool or not self._is_transient_failure(e):
+                # let the next export of the asset resume its submission.
+                self._ledger.record_upload_failure(sg_version_id)
+                raise
+            self.log_warning(
+                "Could not upload '%s', it will be uploaded once Flow Production "
+                "Tracking is reachable: %s" % (full_path, e)
+            )
+            self._spool.push(
+                "upload",
+                {
+                    "full_path": full_path,
+                    "sg_version_id": sg_version_id,
+                    "fingerprint": fingerprint,
+                    "trace": self._tracer.context(),
+                },
+            )
+
+    def _upload_quicktime(self, full_path, sg_version_id, fingerprint=None):
+        """
+        Uploads a quicktime to a version and removes the temporary file.
+
+        :param full_path: Path to the quicktime to upload.
+        :param sg_version_id: Id of the Version to upload the quicktime to.
+        :param fingerprint: Fingerprint of the render, used to keep the quicktime
+                            in the render cache. None if it shouldn't be cached.
         """
+        tk_flame_review = self.import_module("tk_flame_review")
 
         if not os.path.exists(full_path):
             raise TankError("Cannot find quicktime '%s'! Aborting upload." % full_path)
@@ -416,19 +1615,110 @@ class FlameReview(Application):
             self.log_debug("Begin upload of quicktime to Flow Production Tracking...")
             field_name = "sg_uploaded_movie"
 
-        self.shotgun.upload("Version", sg_version_id, full_path, field_name)
+        with self._tracer.span(
+            "upload", size=os.path.getsize(full_path), field=field_name
+        ):
+            elapsed = tk_flame_review.upload_quicktime(
+                self.shotgun,
+                sg_version_id,
+                full_path,
+                field_name,
+                os.path.join(self.cache_location, "upload_progress"),
+                retry_policy=self._retry,
+                part_size=int(self.get_setting("upload_part_size") * 1000000) or None,
+                concurrency=self.get_setting("upload_concurrency"),
+                controller=self._get_concurrency_controller(),
+                logger=self.log_debug,
+            )
         self.log_debug("Upload complete!")
+        size = os.path.getsize(full_path)
+        self._metrics.inc("uploaded_bytes_total", size)
+        self._metrics.observe("upload_seconds", elapsed)
+        if elapsed > 0:
+            self._metrics.observe("upload_throughput_bytes_per_second", size / elapsed)
+        try:
+            self._uplink.record(size, elapsed)
+        except Exception as e:
+            self.log_warning("Could not record upload throughput: %s" % e)
+        self._ledger.record_upload(sg_version_id)
+        self._log_retry_stats()
+
+        if self._render_cache.contains(full_path):
+            # reused from the render cache, which owns the file.
+            return
+
+        if fingerprint and self._render_cache.enabled:
+            try:
+                self._render_cache.put(fingerprint, full_path)
+            except Exception as e:
+                self.log_warning("Could not cache render '%s': %s" % (full_path, e))
 
         # clean up
         try:
             self.log_debug("Trying to remove temporary quicktime file...")
             os.remove(full_path)
+            self._janitor.forget(full_path)
             self.log_debug("Temporary quicktime file successfully deleted.")
         except Exception as e:
             self.log_warning(
                 "Could not remove temporary file '%s': %s" % (full_path, e)
             )
 
+        self._reclaim_temp_files()
+
+    def _get_concurrency_controller(self):
+        """
+        Returns the controller adapting the number of parts of a quicktime
+        uploaded at the same time, see the adaptive_upload_concurrency setting.
+
+        :returns: ConcurrencyController, or None if the concurrency is fixed.
+        """
+        if not self.get_setting("adaptive_upload_concurrency"):
+            return None
+        tk_flame_review = self.import_module("tk_flame_review")
+        return tk_flame_review.ConcurrencyController(
+            os.path.join(self.cache_location, "upload_concurrency.json"),
+            initial=self.get_setting("upload_concurrency"),
+            maximum=self.get_setting("upload_concurrency_max"),
+            logger=self.log_debug,
+        )
+
+    def _get_temp_files_in_use(self):
+        """
+        Lists the temporary movies which are still waiting to be uploaded:
+        their upload is in flight, spooled or queued by the upload daemon.
+
+        :returns: Set of paths.
+        """
+        paths = self._ledger.get_in_flight_paths()
+        if self._spool:
+            for _, kind, payload in self._spool.get_pending():
+                if kind == "upload":
+                    paths.add(payload["full_path"])
+                else:
+                    paths.add(
+                        os.path.join(
+                            payload["info"]["destinationPath"],
+                            payload["info"]["resolvedPath"],
+                        )
+                    )
+        return paths
+
+    def _reclaim_temp_files(self):
+        """
+        Deletes temporary movies left behind by failed or cancelled jobs.
+        This is opportunistic, failures are logged but never interrupt the caller.
+        """
+        try:
+            reclaimed = self._janitor.reclaim(self._get_temp_files_in_use())
+        except Exception as e:
+            self.log_warning("Could not reclaim temporary movies: %s" % e)
+        else:
+            if reclaimed:
+                self.log_debug(
+                    "Reclaimed %d bytes of orphaned temporary movies." % reclaimed
+                )
+
     def display_summary(self, session_id, info):
         """
         Flame hook which is used to show summary UI to user
@@ -444,11 +1734,45 @@ class FlameReview(Application):
                      - presetPath: Path to the preset used for the export.
 
         """
+        self._submit_buffered_assets()
+        self._end_session_trace()
+        self._log_retry_stats()
+        self._close_progress_panel()
+
+        # the summary is read back from the session manifest.
+        results = [record.to_result() for record in self._manifest.latest()]
+        for result in results:
+            for phase, seconds in result["phase_times"].items():
+                self._metrics.observe("phase_seconds", seconds, phase=phase)
+        self._flush_metrics()
+
+        # assets which couldn't be submitted nor spooled are failures.
+        success = self._submission_done and not any(
+            result["state"] == self._progress.FAILED for result in results
+        )
+
         # pop up a UI asking the user for description
         tk_flame_review = self.import_module("tk_flame_review")
         self.engine.show_modal(
             "Submission Summary",
             self,
             tk_flame_review.SummaryDialog,
-            self._submission_done,
+            success,
+            results,
+        )
+
+    def _log_retry_stats(self):
+        """
+        Logs how many calls had to be retried and how long was spent waiting.
+        """
+        stats = self._retry.stats
+        self.log_debug(
+            "Flow Production Tracking calls: %d, attempts: %d, retries: %d, "
+            "time spent waiting: %.1fs"
+            % (
+                stats["calls"],
+                stats["attempts"],
+                stats["retries"],
+                stats["wait_time"],
+            )
         )
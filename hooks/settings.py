@@ -10,6 +10,7 @@
 
 import sgtk
 import os
+import re
 
 HookBaseClass = sgtk.get_hook_baseclass()
 
@@ -45,3 +46,96 @@ class ExportSettings(HookBaseClass):
             "movie_file",
             "QuickTime (H.264 720p 8Mbits).xml",
         )
+
+    def get_export_bitrate(self, preset_path):
+        """
+        Return the bitrate of the movies generated by an export preset. This is
+        used to estimate how much space an export will need.
+
+        :param preset_path: Path to the Flame export preset, as returned by
+                            :meth:`get_export_preset`.
+        :returns: Bitrate in bits per second.
+        """
+        # the presets that ship with Flame carry their bitrate in their name,
+        # e.g. "QuickTime (H.264 720p 8Mbits).xml"
+        match = re.search(r"(\d+)\s*Mbits", os.path.basename(preset_path))
+        if match:
+            return int(match.group(1)) * 1000000
+
+        # assume the same bitrate as the fallback preset
+        return 8000000
+
+    def get_budget_export_preset(self, preset_path, max_bitrate):
+        """
+        Return the path to a Flame export preset generating movies which can be
+        uploaded within the upload_time_budget setting. This is only called when
+        the preset returned by :meth:`get_export_preset` exceeds the budget.
+
+        :param preset_path: Path to the preset returned by :meth:`get_export_preset`.
+        :param max_bitrate: Highest bitrate fitting the budget, in bits per second.
+        :returns: Path on disk to Flame export preset
+        """
+        tk_flame_review = self.parent.import_module("tk_flame_review")
+
+        # prefer one of the presets which ship with Flame, at the same resolution
+        budget_preset_path = tk_flame_review.find_preset_for_bitrate(
+            preset_path, max_bitrate
+        )
+        if budget_preset_path:
+            return budget_preset_path
+
+        # otherwise generate a copy of the preset with a lower bitrate
+        try:
+            budget_preset_path = tk_flame_review.derive_preset(
+                preset_path,
+                max_bitrate,
+                os.path.join(self.parent.cache_location, "export_presets"),
+                self.parent.get_setting("preset_bitrate_unit"),
+            )
+        except ValueError as e:
+            self.parent.log_warning(
+                "Could not lower the bitrate of the export preset, "
+                "check the preset_bitrate_unit setting: %s" % e
+            )
+            return preset_path
+        return budget_preset_path or preset_path
+
+    def get_temp_volumes(self):
+        """
+        Return the folders where the quicktimes can be written before they are
+        uploaded. When several folders are returned, the one with enough free
+        space and the best write throughput is used for each export.
+
+        :returns: List of paths on disk
+        """
+        return [self.parent.engine.get_backburner_tmp()]
+
+    def get_upload_deadline(self, info):
+        """
+        Return the time by which the quicktime of an exported asset should be
+        reviewable. When the upload_order setting is "shortest_first", the
+        upload service starts the uploads waiting for their turn with a
+        deadline first, earliest deadline first.
+
+        :param info: Flame asset info dictionary, as passed to the postExportAsset hook.
+        :returns: Time in seconds since the epoch, or None for no deadline.
+        """
+        return None
+
+    def get_render_identity(self, info):
+        """
+        Return an identifier of the content of the movie rendered for an
+        exported asset, for instance a hash of the timeline segments it is
+        made of.
+
+        When the render_cache_size setting is set, an asset rendered in the
+        background with the same range, resolution, frame rate, export preset
+        and identity as an earlier one uploads the movie cached for it instead
+        of waiting for the new render. The range alone doesn't tell if the
+        sequence has been edited since, so the cache is only used for assets
+        which have an identity.
+
+        :param info: Flame asset info dictionary, as passed to the postExportAsset hook.
+        :returns: String, or None if the content of the asset can't be identified.
+        """
+        return None
@@ -10,3 +10,39 @@
 
 from .submit_dialog import SubmitDialog
 from .summary_dialog import SummaryDialog
+from .spool import SubmissionSpool, SpoolWorker
+from .ledger import SubmissionLedger
+from .janitor import TempJanitor
+from .volumes import TempVolumeSelector, estimate_output_size
+from .budget import (
+    UplinkMonitor,
+    get_budget_bitrate,
+    find_preset_for_bitrate,
+    derive_preset,
+)
+from .progress import SessionProgress, ProgressPanel
+from .manifest import AssetRecord, SessionManifest
+from .render_cache import RenderCache, hash_file, make_fingerprint
+from .naming import VersionNamer
+from .entities import find_or_create, bulk_find_or_create, host_lock
+from .metrics import MetricsRegistry, MetricsFlusher, DURATION_BUCKETS
+from .upload_daemon import UploadDaemon, UploadDaemonClient
+from .tracing import Tracer
+from .profiling import CallbackProfiler
+from .scheduling import get_upload_priority
+from .cassette import Cassette, CassetteError
+
+# the upload code lives in a package without any UI dependency so that it can
+# also be used on its own, see tk_flame_review_upload.
+from ..tk_flame_review_upload import (
+    RetryPolicy,
+    CircuitOpenError,
+    RetryBudgetExceeded,
+    is_transient_error,
+    UploadProgress,
+    remove_old_status_files,
+    upload,
+    UploadError,
+    upload_quicktime,
+    ConcurrencyController,
+)
@@ -0,0 +1,237 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import xml.etree.ElementTree as ET
+
+# bits per second in each unit the bitrate of an export preset can be stored in.
+BITRATE_UNITS = {"bps": 1, "kbps": 1000, "Mbps": 1000000}
+
+# range of the bitrates, in bits per second, a movie preset can plausibly use.
+MIN_PRESET_BITRATE = 100000
+MAX_PRESET_BITRATE = 10000000000
+
+
+def get_budget_bitrate(throughput, time_budget, duration):
+    """
+    Computes the highest bitrate at which a movie can be uploaded in time.
+
+    :param throughput: Uplink throughput, in bytes per second.
+    :param time_budget: Time the upload should take at most, in seconds.
+    :param duration: Duration of the movie, in seconds.
+    :returns: Bitrate in bits per second.
+    """
+    return int(throughput * 8 * time_budget / float(duration))
+
+
+class UplinkMonitor(object):
+    """
+    Keeps a moving average of the throughput achieved by uploads from this host.
+
+    The average is stored in a small JSON file so that it is shared between the
+    upload jobs, which measure it, and the Flame sessions, which use it.
+    """
+
+    # weight of the latest measurement in the moving average.
+    SMOOTHING = 0.3
+
+    def __init__(self, path):
+        """
+        Constructor
+
+        :param path: Path to the JSON file holding the average.
+        """
+        self._path = path
+
+    @property
+    def throughput(self):
+        """
+        Average throughput in bytes per second, or None if nothing was measured yet.
+        """
+        try:
+            with open(self._path) as fh:
+                return json.load(fh)["throughput"]
+        except (IOError, ValueError, KeyError):
+            return None
+
+    def record(self, size, elapsed):
+        """
+        Records the throughput of an upload.
+
+        :param size: Number of bytes uploaded.
+        :param elapsed: Time the upload took, in seconds.
+        """
+        if elapsed <= 0:
+            return
+        measured = size / elapsed
+        previous = self.throughput
+        if previous is not None:
+            measured = self.SMOOTHING * measured + (1 - self.SMOOTHING) * previous
+
+        folder = os.path.dirname(self._path)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        fd, tmp_path = tempfile.mkstemp(dir=folder)
+        with os.fdopen(fd, "w") as fh:
+            json.dump({"throughput": measured}, fh)
+        os.replace(tmp_path, self._path)
+
+
+def get_preset_resolution(preset_path):
+    """
+    Reads the resolution of the movies generated by a Flame export preset,
+    either from its settings or from its name, e.g. "QuickTime (H.264 720p 8Mbits).xml".
+
+    :param preset_path: Path to the preset.
+    :returns: Tuple (width, height), where width is None if only the height is
+              known, or None if the resolution is unknown.
+    """
+    try:
+        tree = ET.parse(preset_path)
+    except (IOError, ET.ParseError):
+        tree = None
+    if tree is not None:
+        width = tree.findtext(".//width")
+        height = tree.findtext(".//height")
+        if width and height and width.isdigit() and height.isdigit():
+            return int(width), int(height)
+
+    name = os.path.basename(preset_path)
+    match = re.search(r"(\d+)x(\d+)", name)
+    if match:
+        return int(match.group(1)), int(match.group(2))
+    match = re.search(r"\b(\d{3,4})p\b", name)
+    if match:
+        return None, int(match.group(1))
+    return None
+
+
+def _is_same_resolution(resolution, other):
+    """
+    :returns: True if two resolutions returned by :func:`get_preset_resolution`
+              are known and identical.
+    """
+    if resolution is None or other is None or resolution[1] != other[1]:
+        return False
+    return None in (resolution[0], other[0]) or resolution[0] == other[0]
+
+
+def find_preset_for_bitrate(preset_path, max_bitrate):
+    """
+    Looks for the Flame movie preset with the highest bitrate not exceeding a
+    limit, next to a preset and with the same resolution.
+
+    Only presets carrying their bitrate in their name, like the ones which ship
+    with Flame, e.g. "QuickTime (H.264 720p 8Mbits).xml", are considered.
+
+    :param preset_path: Path to the preset to replace.
+    :param max_bitrate: Maximum bitrate, in bits per second.
+    :returns: Path to a preset or None, e.g. if the resolution of the preset
+              to replace is unknown.
+    """
+    resolution = get_preset_resolution(preset_path)
+    if resolution is None:
+        return None
+
+    presets_folder = os.path.dirname(preset_path)
+    best = None
+    best_bitrate = 0
+    try:
+        names = os.listdir(presets_folder)
+    except OSError:
+        return None
+
+    for name in names:
+        match = re.search(r"H\.264.*?(\d+)\s*Mbits\)?\.xml$", name)
+        if not match:
+            continue
+        bitrate = int(match.group(1)) * 1000000
+        if not best_bitrate < bitrate <= max_bitrate:
+            continue
+        path = os.path.join(presets_folder, name)
+        # a lower bitrate must not change the size of the movies.
+        if _is_same_resolution(resolution, get_preset_resolution(path)):
+            best = path
+            best_bitrate = bitrate
+    return best
+
+
+def derive_preset(base_preset, bitrate, cache_folder, unit):
+    """
+    Generates a copy of an export preset with a different bitrate.
+
+    Derived presets are cached on disk, keyed by a hash of the base preset and
+    the bitrate, so that they are only generated once and reused by later sessions.
+
+    :param base_preset: Path to the preset to derive from.
+    :param bitrate: Bitrate of the derived preset, in bits per second.
+    :param cache_folder: Folder where derived presets are stored.
+    :param unit: Unit of the bitrate settings of the preset, one of the keys of
+                 :data:`BITRATE_UNITS`.
+    :returns: Path to the derived preset, or None if the base preset doesn't
+              have any bitrate setting to change.
+    :raises ValueError: If the unit is unknown, or if a bitrate of the base
+                        preset isn't a plausible movie bitrate in that unit.
+    """
+    if unit not in BITRATE_UNITS:
+        raise ValueError(
+            "Unknown bitrate unit '%s', expected one of %s."
+            % (unit, ", ".join(sorted(BITRATE_UNITS)))
+        )
+    factor = BITRATE_UNITS[unit]
+
+    with open(base_preset, "rb") as fh:
+        content = fh.read()
+
+    key = hashlib.sha1(
+        content + ("%d %s" % (bitrate, unit)).encode("utf-8")
+    ).hexdigest()
+    # carry the new bitrate in the name, the same way the Flame presets do.
+    name = os.path.splitext(os.path.basename(base_preset))[0]
+    mbits = "%dMbits" % (bitrate // 1000000)
+    name, count = re.subn(r"\d+\s*Mbits", mbits, name)
+    if not count:
+        name = "%s %s" % (name, mbits)
+    path = os.path.join(cache_folder, "%s.%s.xml" % (name, key[:12]))
+    if os.path.exists(path):
+        return path
+
+    tree = ET.ElementTree(ET.fromstring(content))
+    changed = False
+    for element in tree.iter():
+        if "bitrate" not in element.tag.lower():
+            continue
+        try:
+            value = float(element.text)
+        except (TypeError, ValueError):
+            continue
+        # a value out of range means the unit doesn't match the preset.
+        if not MIN_PRESET_BITRATE <= value * factor <= MAX_PRESET_BITRATE:
+            raise ValueError(
+                "Bitrate %s of '%s' isn't a movie bitrate in %s."
+                % (element.text, base_preset, unit)
+            )
+        element.text = ("%f" % (bitrate / float(factor))).rstrip("0").rstrip(".")
+        changed = True
+
+    if not changed:
+        return None
+
+    if not os.path.isdir(cache_folder):
+        os.makedirs(cache_folder)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_folder)
+    with os.fdopen(fd, "wb") as fh:
+        tree.write(fh, encoding="utf-8", xml_declaration=True)
+    os.replace(tmp_path, path)
+    return path
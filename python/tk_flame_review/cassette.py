@@ -0,0 +1,284 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Record and replay of the calls made to Flow Production Tracking.
+
+A cassette is a JSON lines file with one call per line: the method, its
+arguments, how long it took and its response or error. Recording a session
+against a site and replaying it later, without the site, makes it possible
+to measure the app on realistic traffic offline.
+"""
+
+import builtins
+import datetime
+import json
+import os
+import threading
+import time
+
+# cassette modes
+OFF = "off"
+RECORD = "record"
+REPLAY = "replay"
+
+
+class CassetteError(Exception):
+    """
+    Raised when a call being replayed was not recorded.
+    """
+
+
+def _encode(value):
+    """
+    JSON encoder for the values found in API calls which JSON doesn't support.
+    """
+    if isinstance(value, datetime.datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"__date__": value.isoformat()}
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    if isinstance(value, bytes):
+        return {"__bytes__": value.decode("latin-1")}
+    # e.g. file objects, only their description matters
+    return {"__repr__": repr(value)}
+
+
+def _decode(value):
+    """
+    JSON object hook reverting :func:`_encode`.
+    """
+    if "__datetime__" in value:
+        return datetime.datetime.fromisoformat(value["__datetime__"])
+    if "__date__" in value:
+        return datetime.date.fromisoformat(value["__date__"])
+    if "__bytes__" in value:
+        return value["__bytes__"].encode("latin-1")
+    return value
+
+
+def _get_key(method, args, kwargs):
+    """
+    :returns: String identifying a call by its method and arguments.
+    """
+    return json.dumps([method, args, kwargs], default=_encode, sort_keys=True)
+
+
+class Cassette(object):
+    """
+    File holding recorded API calls, see :meth:`wrap`.
+
+    When replaying, a call gets the response recorded for the same method
+    and arguments. Identical calls get their responses in the order they
+    were recorded. A call whose arguments weren't recorded, e.g. because
+    they hold a temporary path, gets the next unused response recorded for
+    its method.
+    """
+
+    def __init__(self, path, mode, latency_scale=1.0, logger=None):
+        """
+        Constructor
+
+        :param path: Path of the cassette file. Recorded calls are appended to it.
+        :param mode: One of :data:`OFF`, :data:`RECORD` or :data:`REPLAY`.
+        :param latency_scale: Factor applied to the recorded duration of the
+                              calls when replaying them, 0 to replay them
+                              without waiting.
+        :param logger: Optional callable used to log debug messages.
+        """
+        if mode not in (OFF, RECORD, REPLAY):
+            raise ValueError("Unknown cassette mode '%s'." % mode)
+        self._path = path
+        self._mode = mode if path else OFF
+        self._latency_scale = latency_scale
+        self._log = logger or (lambda msg: None)
+        self._lock = threading.Lock()
+        self._by_key = None
+        self._by_method = None
+
+    @property
+    def mode(self):
+        """
+        Mode of the cassette.
+        """
+        return self._mode
+
+    def wrap(self, sg):
+        """
+        Wraps a connection so that its calls are recorded or replayed.
+
+        Only the public methods of the API are recorded, private attributes
+        aren't available on the wrapper, so uploads go through
+        ``Shotgun.upload``.
+
+        :param sg: Shotgun API connection, or None when replaying.
+        :returns: The connection itself if the cassette is off, otherwise a proxy.
+        """
+        if self._mode == OFF:
+            return sg
+        return _ShotgunProxy(self, sg)
+
+    def record(self, method, args, kwargs, duration, response=None, error=None):
+        """
+        Appends a call to the cassette.
+
+        :param method: Name of the method called.
+        :param args: Positional arguments of the call.
+        :param kwargs: Keyword arguments of the call.
+        :param duration: Time the call took, in seconds.
+        :param response: Value returned by the call.
+        :param error: Exception raised by the call, if any.
+        """
+        entry = {
+            "method": method,
+            "args": args,
+            "kwargs": kwargs,
+            "duration": duration,
+            "time": time.time(),
+            "pid": os.getpid(),
+        }
+        if error is None:
+            entry["response"] = response
+        else:
+            entry["error"] = {
+                "type": type(error).__name__,
+                "message": str(error),
+                "errcode": getattr(error, "errcode", None),
+            }
+        line = json.dumps(entry, default=_encode) + "\n"
+        with self._lock:
+            folder = os.path.dirname(self._path)
+            if folder and not os.path.isdir(folder):
+                os.makedirs(folder)
+            # a single write per call, so that the lines of the processes
+            # recording to the same cassette don't interleave.
+            with open(self._path, "a") as fh:
+                fh.write(line)
+
+    def _load(self):
+        """
+        Indexes the recorded calls. Must be called with the lock held.
+        """
+        self._by_key = {}
+        self._by_method = {}
+        with open(self._path) as fh:
+            for line in fh:
+                if not line.strip():
+                    continue
+                entry = json.loads(line, object_hook=_decode)
+                entry["used"] = False
+                key = _get_key(entry["method"], entry["args"], entry["kwargs"])
+                self._by_key.setdefault(key, []).append(entry)
+                self._by_method.setdefault(entry["method"], []).append(entry)
+        self._log(
+            "Loaded %d recorded calls from '%s'."
+            % (sum(len(entries) for entries in self._by_method.values()), self._path)
+        )
+
+    def replay(self, method, args, kwargs):
+        """
+        Replays a recorded call.
+
+        :param method: Name of the method called.
+        :param args: Positional arguments of the call.
+        :param kwargs: Keyword arguments of the call.
+        :returns: The recorded response.
+        :raises CassetteError: If no response was recorded for the call.
+        """
+        key = _get_key(method, args, kwargs)
+        with self._lock:
+            if self._by_key is None:
+                self._load()
+            entry = next(
+                (entry for entry in self._by_key.get(key, []) if not entry["used"]),
+                None,
+            )
+            if entry is None:
+                entry = next(
+                    (
+                        entry
+                        for entry in self._by_method.get(method, [])
+                        if not entry["used"]
+                    ),
+                    None,
+                )
+                if entry is None:
+                    raise CassetteError(
+                        "No recorded call left for %s in '%s'." % (method, self._path)
+                    )
+                self._log("Replaying %s with different arguments." % method)
+            entry["used"] = True
+
+        if self._latency_scale > 0:
+            time.sleep(entry["duration"] * self._latency_scale)
+
+        if "error" in entry:
+            raise _rebuild_error(entry["error"])
+        return entry["response"]
+
+
+def _rebuild_error(error):
+    """
+    Recreates a recorded exception. Exceptions which aren't builtins, e.g. the
+    ones of the Shotgun API, are recreated as classes of the same name, which
+    is how the retry policy identifies them.
+
+    :param error: Dictionary describing the exception.
+    :returns: Exception instance.
+    """
+    error_class = getattr(builtins, error["type"], None)
+    if not (isinstance(error_class, type) and issubclass(error_class, Exception)):
+        error_class = type(str(error["type"]), (Exception,), {})
+    exception = error_class(error["message"])
+    if error.get("errcode") is not None:
+        exception.errcode = error["errcode"]
+    return exception
+
+
+class _ShotgunProxy(object):
+    """
+    Stands for a Shotgun API connection, recording or replaying its calls.
+    """
+
+    def __init__(self, cassette, sg):
+        self._cassette = cassette
+        self._sg = sg
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        if self._cassette.mode == REPLAY:
+
+            def replay(*args, **kwargs):
+                return self._cassette.replay(name, list(args), kwargs)
+
+            return replay
+
+        attribute = getattr(self._sg, name)
+        if not callable(attribute):
+            return attribute
+
+        def record(*args, **kwargs):
+            start = time.time()
+            try:
+                response = attribute(*args, **kwargs)
+            except Exception as e:
+                self._cassette.record(
+                    name, list(args), kwargs, time.time() - start, error=e
+                )
+                raise
+            self._cassette.record(
+                name, list(args), kwargs, time.time() - start, response=response
+            )
+            return response
+
+        return record
@@ -0,0 +1,243 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import contextlib
+import fcntl
+import hashlib
+import os
+import time
+
+
+@contextlib.contextmanager
+def host_lock(folder, key, timeout=30.0, logger=None):
+    """
+    Holds an exclusive lock shared by all the processes of this host.
+
+    The lock is only a claim: if it can't be acquired within the timeout,
+    e.g. because its holder hangs, the caller proceeds without it.
+
+    :param folder: Folder holding the lock files.
+    :param key: Name of the lock.
+    :param timeout: Seconds to wait for the lock.
+    :param logger: Optional callable used to log debug messages.
+    :returns: Context manager yielding True if the lock is held.
+    """
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    path = os.path.join(
+        folder, "%s.lock" % hashlib.sha1(key.encode("utf-8")).hexdigest()
+    )
+
+    with open(path, "a") as fh:
+        deadline = time.time() + timeout
+        locked = False
+        while True:
+            try:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                locked = True
+                break
+            except (IOError, OSError):
+                if time.time() > deadline:
+                    break
+                time.sleep(0.05)
+        if not locked and logger:
+            logger("Could not lock '%s' within %ds, proceeding." % (key, timeout))
+        try:
+            yield locked
+        finally:
+            if locked:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+# order in which entities with the same code are looked up
+_OLDEST_FIRST = [{"field_name": "id", "direction": "asc"}]
+
+# maximum number of codes, and so of host locks held, per bulk request
+BULK_BATCH_SIZE = 50
+
+
+def find_or_create(
+    sg, call, entity_type, project, code, get_data, lock_folder, logger=None
+):
+    """
+    Finds the entity of a project with the given code, creating it if needed.
+
+    Concurrent calls for the same entity are serialized on this host by a
+    lock, which saves the processes of the host from creating duplicates.
+    Processes on other hosts aren't serialized, so the entities with the code
+    are always looked up again after the creation: the oldest one wins and
+    the one just created is deleted if it isn't it. The oldest entity is also
+    the one found first, so that all the processes end up using the same one.
+
+    :param sg: Shotgun API connection.
+    :param call: Callable making the calls to the site, e.g. :meth:`RetryPolicy.call`.
+                 It must accept an ``idempotent`` keyword argument.
+    :param entity_type: Type of the entity.
+    :param project: Project the entity belongs to.
+    :param code: Code of the entity.
+    :param get_data: Callable accepting a code and returning the fields of the
+                     entity to create. It is only called when the entity
+                     needs to be created.
+    :param lock_folder: Folder holding the host locks.
+    :param logger: Optional callable used to log debug messages.
+    :returns: Tuple (entity, created).
+    """
+    log = logger or (lambda msg: None)
+    filters = [["code", "is", code], ["project", "is", project]]
+    key = _get_lock_key(entity_type, project, code)
+
+    with host_lock(lock_folder, key, logger=log):
+        entity = call(sg.find_one, entity_type, filters, order=_OLDEST_FIRST)
+        if entity:
+            return entity, False
+
+        entity = call(sg.create, entity_type, get_data(code), idempotent=False)
+        log("Created %s" % entity)
+
+        matches = call(sg.find, entity_type, filters, order=_OLDEST_FIRST)
+        if matches and matches[0]["id"] != entity["id"]:
+            # created by another process at the same time.
+            log("%s was created concurrently, using it instead." % matches[0])
+            call(sg.delete, entity_type, entity["id"])
+            return matches[0], False
+
+    return entity, True
+
+
+def bulk_find_or_create(
+    sg, call, entity_type, project, codes, get_data, lock_folder, logger=None
+):
+    """
+    Finds the entities of a project with the given codes, creating the missing ones.
+
+    This is the same as calling :func:`find_or_create` for every code, but
+    the codes are handled in batches of at most :data:`BULK_BATCH_SIZE`: the
+    codes of a batch are looked up in a single query, and the missing
+    entities are created, and checked again, in a single batch. Only the
+    locks of the codes of the current batch are held.
+
+    :param sg: Shotgun API connection.
+    :param call: Callable making the calls to the site, e.g. :meth:`RetryPolicy.call`.
+                 It must accept an ``idempotent`` keyword argument.
+    :param entity_type: Type of the entities.
+    :param project: Project the entities belong to.
+    :param codes: Codes of the entities.
+    :param get_data: Callable accepting a code and returning the fields of the
+                     entity to create.
+    :param lock_folder: Folder holding the host locks.
+    :param logger: Optional callable used to log debug messages.
+    :returns: Tuple (dictionary of entities by code, set of the codes created).
+    """
+    log = logger or (lambda msg: None)
+    codes = sorted(set(codes))
+    entities = {}
+    created = set()
+
+    for index in range(0, len(codes), BULK_BATCH_SIZE):
+        batch_entities, batch_created = _find_or_create_batch(
+            sg,
+            call,
+            entity_type,
+            project,
+            codes[index : index + BULK_BATCH_SIZE],
+            get_data,
+            lock_folder,
+            log,
+        )
+        entities.update(batch_entities)
+        created.update(batch_created)
+
+    return entities, created
+
+
+def _find_or_create_batch(
+    sg, call, entity_type, project, codes, get_data, lock_folder, log
+):
+    """
+    Finds the entities with the given sorted codes, creating the missing ones.
+
+    See :func:`bulk_find_or_create` for the parameters.
+
+    :returns: Tuple (dictionary of entities by code, set of the codes created).
+    """
+
+    def find(codes):
+        entities = {}
+        for entity in call(
+            sg.find,
+            entity_type,
+            [["project", "is", project], ["code", "in", codes]],
+            ["code"],
+            order=_OLDEST_FIRST,
+        ):
+            # the oldest entity wins if there are several.
+            entities.setdefault(entity["code"], entity)
+        return entities
+
+    with contextlib.ExitStack() as stack:
+        # always locked in the same order so that bulk callers can't deadlock.
+        for code in codes:
+            stack.enter_context(
+                host_lock(
+                    lock_folder,
+                    _get_lock_key(entity_type, project, code),
+                    logger=log,
+                )
+            )
+
+        entities = find(codes)
+        missing = [code for code in codes if code not in entities]
+        if not missing:
+            return entities, set()
+
+        created = call(
+            sg.batch,
+            [
+                {
+                    "request_type": "create",
+                    "entity_type": entity_type,
+                    "data": get_data(code),
+                }
+                for code in missing
+            ],
+            idempotent=False,
+        )
+        log("Created %s" % created)
+
+        winners = find(missing)
+        losers = [
+            entity
+            for entity in created
+            if winners.get(entity["code"], entity)["id"] != entity["id"]
+        ]
+        if losers:
+            # other processes created some of the entities at the same time.
+            log("%s were created concurrently, deleting them." % losers)
+            call(
+                sg.batch,
+                [
+                    {
+                        "request_type": "delete",
+                        "entity_type": entity_type,
+                        "entity_id": entity["id"],
+                    }
+                    for entity in losers
+                ],
+            )
+        entities.update(winners)
+
+    return entities, set(missing) - set(entity["code"] for entity in losers)
+
+
+def _get_lock_key(entity_type, project, code):
+    """
+    :returns: Name of the host lock serializing the creation of an entity.
+    """
+    return "%s/%s/%s" % (project["id"], entity_type, code)
@@ -0,0 +1,150 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import contextlib
+import os
+import sqlite3
+import time
+
+
+class TempJanitor(object):
+    """
+    Keeps track of the temporary movies written by the app and reclaims the
+    ones left behind by failed or cancelled jobs.
+
+    Every movie is registered in a small SQLite index when its path is
+    computed and forgotten once it has been uploaded and deleted. Reclaiming
+    only looks at the indexed files, so it never has to scan the temp folder.
+    """
+
+    # files younger than this are never reclaimed to honour the quota,
+    # they are most likely still being rendered or waiting to be uploaded.
+    QUOTA_GRACE_PERIOD = 3600
+
+    # seconds after which a movie which doesn't exist is no longer tracked,
+    # when there is no maximum age.
+    MISSING_FILE_EXPIRY = 7 * 24 * 3600
+
+    def __init__(self, path, max_age, quota, logger=None):
+        """
+        Constructor
+
+        :param path: Path to the SQLite index file. Created if needed.
+        :param max_age: Age in seconds after which a movie is considered orphaned.
+                        0 for no limit.
+        :param quota: Maximum number of bytes of temporary movies to keep. 0 for no limit.
+        :param logger: Optional callable used to log debug messages.
+        """
+        self._path = path
+        self._max_age = max_age
+        self._quota = quota
+        self._log = logger or (lambda msg: None)
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS temp_files ("
+                "path TEXT PRIMARY KEY, "
+                "created_at REAL NOT NULL)"
+            )
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """
+        Opens a connection to the index database and commits on exit.
+        """
+        conn = sqlite3.connect(self._path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def track(self, path):
+        """
+        Registers a temporary movie.
+
+        :param path: Full path to the movie.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO temp_files (path, created_at) VALUES (?, ?)",
+                (path, time.time()),
+            )
+
+    def forget(self, path):
+        """
+        Removes a movie from the index, typically once it has been deleted.
+
+        :param path: Full path to the movie.
+        """
+        with self._connect() as conn:
+            conn.execute("DELETE FROM temp_files WHERE path = ?", (path,))
+
+    def reclaim(self, in_use=()):
+        """
+        Deletes orphaned movies.
+
+        Movies older than the maximum age are deleted first. If the remaining
+        movies still exceed the quota, the oldest ones are deleted until it
+        is met again.
+
+        :param in_use: Paths of the movies which are still waiting to be
+                       uploaded, e.g. spooled or queued, and must be kept
+                       whatever their age.
+        :returns: Number of bytes reclaimed.
+        """
+        in_use = set(in_use)
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT path, created_at FROM temp_files ORDER BY created_at"
+            ).fetchall()
+
+        now = time.time()
+        entries = []
+        for path, created_at in rows:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                # not rendered yet, or already uploaded by a job which
+                # couldn't update the index. Stop tracking it eventually.
+                if now - created_at > (self._max_age or self.MISSING_FILE_EXPIRY):
+                    self.forget(path)
+                continue
+            entries.append((path, size, created_at))
+
+        reclaimed = 0
+        total = sum(size for (_, size, _) in entries)
+        for path, size, created_at in entries:
+            age = now - created_at
+            if path in in_use:
+                continue
+            elif self._max_age and age > self._max_age:
+                reason = "older than %d hours" % (self._max_age // 3600)
+            elif self._quota and total > self._quota and age > self.QUOTA_GRACE_PERIOD:
+                reason = "over the temp storage quota"
+            else:
+                continue
+
+            try:
+                os.remove(path)
+            except OSError as e:
+                self._log("Could not remove orphaned movie '%s': %s" % (path, e))
+                continue
+
+            self._log("Removed orphaned movie '%s' (%s)." % (path, reason))
+            self.forget(path)
+            reclaimed += size
+            total -= size
+
+        return reclaimed
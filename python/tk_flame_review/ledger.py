@@ -0,0 +1,223 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+class SubmissionLedger(object):
+    """
+    Local record of the steps completed for each submission.
+
+    Submissions are identified by a deterministic key, so that re-running an
+    export which failed part way through picks up the entity and Version that
+    were already created instead of creating new ones.
+
+    A submission is only resumed once nothing is working on it anymore: while
+    its upload job is in flight, exporting the same asset again starts a new
+    submission. Once a submission has been fully uploaded it is marked
+    complete and is no longer reused: exporting the same sequence again after
+    that is a new submission, not a retry.
+    """
+
+    # seconds after which a submission still in flight is considered
+    # abandoned, e.g. because its job was killed, and can be resumed.
+    IN_FLIGHT_TIMEOUT = 24 * 3600
+
+    def __init__(self, path):
+        """
+        Constructor
+
+        :param path: Path to the SQLite database file. Created if needed.
+        """
+        self._path = path
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(ledger)")]
+            if columns and "path" not in columns:
+                # written by an earlier version of the app, which keyed
+                # submissions uniquely. It only holds what can be resumed.
+                conn.execute("DROP TABLE ledger")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ledger ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "key TEXT NOT NULL, "
+                "entity_type TEXT, "
+                "entity_id INTEGER, "
+                "version_id INTEGER, "
+                "path TEXT, "
+                "in_flight INTEGER NOT NULL DEFAULT 1, "
+                "completed INTEGER NOT NULL DEFAULT 0, "
+                "updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ledger_key ON ledger (key)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ledger_version ON ledger (version_id)"
+            )
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """
+        Opens a connection to the ledger database and commits on exit.
+        """
+        conn = sqlite3.connect(self._path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(
+        project_id, entity_type, sequence_name, version_number, record_in, record_out
+    ):
+        """
+        Computes the key identifying a submission.
+
+        :param project_id: Id of the project the submission belongs to.
+        :param entity_type: Entity type the Version is linked to.
+        :param sequence_name: Name of the Flame sequence.
+        :param version_number: Flame version number of the export.
+        :param record_in: Record in point of the exported asset.
+        :param record_out: Record out point of the exported asset.
+        :returns: Hexadecimal digest.
+        """
+        data = json.dumps(
+            [
+                project_id,
+                entity_type,
+                sequence_name,
+                version_number,
+                record_in,
+                record_out,
+            ]
+        )
+        return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+    def claim(self, key):
+        """
+        Claims the steps recorded for a submission which hasn't completed and
+        isn't in flight, marking it in flight again.
+
+        :param key: Submission key, as returned by :meth:`make_key`.
+        :returns: Dictionary with the keys ``id``, ``entity`` and ``version_id``,
+                  either of the last two may be None, or None if there is
+                  nothing to resume.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            # taken before reading so that two processes can't claim the
+            # same submission.
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, entity_type, entity_id, version_id FROM ledger "
+                "WHERE key = ? AND completed = 0 "
+                "AND (in_flight = 0 OR updated_at < ?) "
+                "ORDER BY updated_at DESC LIMIT 1",
+                (key, now - self.IN_FLIGHT_TIMEOUT),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE ledger SET in_flight = 1, updated_at = ? WHERE id = ?",
+                (now, row[0]),
+            )
+        entity = {"type": row[1], "id": row[2]} if row[2] else None
+        return {"id": row[0], "entity": entity, "version_id": row[3]}
+
+    def record_entity(self, key, entity):
+        """
+        Records the entity a submission is linked to, starting a new entry in flight.
+
+        :param key: Submission key.
+        :param entity: Entity dictionary with type and id.
+        :returns: Id of the entry.
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO ledger (key, entity_type, entity_id, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, entity["type"], entity["id"], time.time()),
+            )
+            return cursor.lastrowid
+
+    def record_version(self, entry_id, version_id, path=None):
+        """
+        Records the Version created for a submission.
+
+        :param entry_id: Id of the entry, as returned by :meth:`record_entity`.
+        :param version_id: Id of the created Version.
+        :param path: Path of the movie to upload to the Version.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE ledger SET version_id = ?, path = ?, updated_at = ? "
+                "WHERE id = ?",
+                (version_id, path, time.time(), entry_id),
+            )
+
+    def get_in_flight_paths(self):
+        """
+        :returns: Set of the paths of the movies which are waiting to be uploaded.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT path FROM ledger WHERE path IS NOT NULL AND completed = 0 "
+                "AND in_flight = 1 AND updated_at >= ?",
+                (time.time() - self.IN_FLIGHT_TIMEOUT,),
+            ).fetchall()
+        return set(row[0] for row in rows)
+
+    def release(self, entry_id):
+        """
+        Records that nothing is working on a submission anymore, e.g. because
+        it failed, so that the next export of the asset resumes it.
+
+        :param entry_id: Id of the entry.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE ledger SET in_flight = 0, updated_at = ? WHERE id = ?",
+                (time.time(), entry_id),
+            )
+
+    def record_upload_failure(self, version_id):
+        """
+        Releases the submission of a Version whose movie couldn't be uploaded.
+
+        :param version_id: Id of the Version the movie was meant for.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE ledger SET in_flight = 0, updated_at = ? "
+                "WHERE version_id = ? AND completed = 0",
+                (time.time(), version_id),
+            )
+
+    def record_upload(self, version_id):
+        """
+        Marks the submission of a Version as complete once its movie is uploaded.
+
+        :param version_id: Id of the Version the movie was uploaded to.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE ledger SET completed = 1, in_flight = 0, updated_at = ? "
+                "WHERE version_id = ?",
+                (time.time(), version_id),
+            )
@@ -0,0 +1,203 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import json
+import os
+import threading
+import time
+
+
+class AssetRecord(object):
+    """
+    Compact description of an exported asset.
+
+    Flame passes dozens of keys for every asset, this only keeps the ones the
+    app uses, without a per instance dictionary, along with the outcome of
+    its submission.
+    """
+
+    # state of the assets waiting for the end of the export to be submitted
+    PENDING = "pending"
+
+    # attribute name and corresponding key of the Flame asset info dictionary
+    FIELDS = (
+        ("name", "assetName"),
+        ("sequence_name", "sequenceName"),
+        ("source_in", "sourceIn"),
+        ("source_out", "sourceOut"),
+        ("record_in", "recordIn"),
+        ("record_out", "recordOut"),
+        ("fps", "fps"),
+        ("aspect_ratio", "aspectRatio"),
+        ("version_number", "versionNumber"),
+        ("background_job_id", "backgroundJobId"),
+        ("destination_path", "destinationPath"),
+        ("resolved_path", "resolvedPath"),
+        ("destination_host", "destinationHost"),
+        ("is_background", "isBackground"),
+        ("render_fingerprint", "renderFingerprint"),
+    )
+
+    __slots__ = tuple(attribute for (attribute, _) in FIELDS) + (
+        "state",
+        "version_id",
+        "size",
+        "size_estimated",
+        "phase_times",
+    )
+
+    def __init__(self, **fields):
+        """
+        Constructor
+
+        :param fields: Values of the attributes listed in :attr:`FIELDS`, as
+                       well as ``state``, ``version_id``, ``size``,
+                       ``size_estimated`` and ``phase_times``. Missing ones are None.
+        """
+        for attribute in self.__slots__:
+            setattr(self, attribute, fields.get(attribute))
+
+    @classmethod
+    def from_info(cls, info):
+        """
+        Creates a record from a Flame asset info dictionary.
+
+        :param info: Flame asset info dictionary, as passed to the export hooks.
+        :returns: :class:`AssetRecord`
+        """
+        record = cls(
+            **dict((attribute, info.get(key)) for (attribute, key) in cls.FIELDS)
+        )
+        if record.name is None:
+            # ensure backward compatibility
+            record.name = info.get("name")
+        return record
+
+    def to_info(self):
+        """
+        Rebuilds the part of the Flame asset info dictionary the record keeps,
+        which is all a submission needs.
+
+        :returns: Dictionary with the Flame keys of the attributes which are set.
+        """
+        return dict(
+            (key, getattr(self, attribute))
+            for (attribute, key) in self.FIELDS
+            if getattr(self, attribute) is not None
+        )
+
+    def to_result(self):
+        """
+        :returns: Dictionary describing the outcome of the submission, with the
+                  keys of :meth:`SessionProgress.results`.
+        """
+        return {
+            "name": self.sequence_name,
+            "state": self.state,
+            "version_id": self.version_id,
+            "size": self.size,
+            "size_estimated": bool(self.size_estimated),
+            "phase_times": self.phase_times or {},
+        }
+
+    def to_dict(self):
+        """
+        :returns: Serializable dictionary of all the attributes.
+        """
+        return dict(
+            (attribute, getattr(self, attribute)) for attribute in self.__slots__
+        )
+
+
+class SessionManifest(object):
+    """
+    Append only record of the assets of an export session, one JSON line per asset.
+
+    Each asset is written when it is exported and again once it has been
+    processed, so the outcome of a session can be inspected even if Flame
+    didn't exit cleanly. The last record of an asset is the current one: the
+    assets whose submission waits for the end of the export, and the summary
+    of the session, are read back from the manifest rather than kept in
+    memory. Manifests of previous sessions are kept on disk, up to a limit,
+    for reporting.
+    """
+
+    def __init__(self, folder, keep=20):
+        """
+        Constructor
+
+        :param folder: Folder the manifests are stored in.
+        :param keep: Number of session manifests to keep.
+        """
+        self._folder = folder
+        self._keep = keep
+        self._lock = threading.Lock()
+        self.path = None
+
+    def start(self):
+        """
+        Starts the manifest of a new session and deletes the oldest ones.
+        """
+        if not os.path.isdir(self._folder):
+            os.makedirs(self._folder)
+        self.path = os.path.join(
+            self._folder,
+            "%s_%d.jsonl" % (time.strftime("%Y%m%d_%H%M%S"), os.getpid()),
+        )
+
+        names = sorted(
+            name for name in os.listdir(self._folder) if name.endswith(".jsonl")
+        )
+        for name in names[: max(0, len(names) - self._keep + 1)]:
+            try:
+                os.remove(os.path.join(self._folder, name))
+            except OSError:
+                pass
+
+    def append(self, record):
+        """
+        Appends an asset to the manifest of the current session.
+
+        :param record: :class:`AssetRecord` to append.
+        """
+        line = json.dumps(record.to_dict()) + "\n"
+        with self._lock:
+            with open(self.path, "a") as fh:
+                fh.write(line)
+
+    def records(self):
+        """
+        Reads back the manifest of the current session, one record at a time.
+
+        :returns: Generator of :class:`AssetRecord`, in the order they were
+                  appended. A line being written, or left incomplete by a
+                  crash, is skipped.
+        """
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path) as fh:
+            for line in fh:
+                try:
+                    fields = json.loads(line)
+                except ValueError:
+                    continue
+                yield AssetRecord(**fields)
+
+    def latest(self):
+        """
+        Returns the current record of every asset of the session.
+
+        :returns: List of :class:`AssetRecord`, in the order the assets were
+                  first appended.
+        """
+        records = {}
+        for record in self.records():
+            records[record.resolved_path] = record
+        return list(records.values())
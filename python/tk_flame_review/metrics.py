@@ -0,0 +1,313 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+In-process metrics exported to a Prometheus node-exporter textfile.
+
+Recording a metric only updates a dictionary. The Flame session and the
+backburner jobs of a host all record their own metrics, which are merged into
+a shared state file when flushed, so that the textfile always holds the totals
+for the host.
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+from .entities import host_lock
+
+# default histogram buckets for durations, in seconds
+DURATION_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _format_labels(labels):
+    """
+    :param labels: Tuple of (name, value) pairs.
+    :returns: Labels in the Prometheus exposition format.
+    """
+    if not labels:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"'
+        % (
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for (name, value) in labels
+    )
+
+
+class MetricsRegistry(object):
+    """
+    Counters and histograms recorded by this process since the last flush.
+    """
+
+    def __init__(self, prefix):
+        """
+        Constructor
+
+        :param prefix: Prefix of the names of all the metrics.
+        """
+        self._prefix = prefix
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._series = {}
+
+    def counter(self, name, description):
+        """
+        Declares a counter.
+
+        :param name: Name of the counter, without prefix.
+        :param description: Help text of the counter.
+        """
+        self._metrics[name] = {"type": "counter", "help": description}
+
+    def histogram(self, name, description, buckets=DURATION_BUCKETS):
+        """
+        Declares a histogram.
+
+        :param name: Name of the histogram, without prefix.
+        :param description: Help text of the histogram.
+        :param buckets: Upper bounds of the buckets, in increasing order.
+        """
+        self._metrics[name] = {
+            "type": "histogram",
+            "help": description,
+            "buckets": list(buckets),
+        }
+
+    @property
+    def dirty(self):
+        """
+        True if something was recorded since the last flush.
+        """
+        return bool(self._series)
+
+    def _get_series(self, name, labels):
+        """
+        Returns the values recorded for a metric and a set of labels.
+        Must be called with the lock held.
+        """
+        key = json.dumps([name, sorted(labels.items())])
+        series = self._series.get(key)
+        if series is None:
+            metric = self._metrics[name]
+            if metric["type"] == "counter":
+                series = {"value": 0}
+            else:
+                series = {
+                    "buckets": [0] * (len(metric["buckets"]) + 1),
+                    "sum": 0,
+                    "count": 0,
+                }
+            self._series[key] = series
+        return series
+
+    def inc(self, name, value=1, **labels):
+        """
+        Increments a counter.
+
+        :param name: Name of the counter.
+        :param value: Amount to add.
+        :param labels: Labels of the series to increment.
+        """
+        with self._lock:
+            self._get_series(name, labels)["value"] += value
+
+    def observe(self, name, value, **labels):
+        """
+        Records a value in a histogram.
+
+        :param name: Name of the histogram.
+        :param value: Value to record.
+        :param labels: Labels of the series to record in.
+        """
+        bounds = self._metrics[name]["buckets"]
+        index = len(bounds)
+        for i, bound in enumerate(bounds):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            series = self._get_series(name, labels)
+            series["buckets"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def flush(self, state_path, textfile_path):
+        """
+        Adds the values recorded since the last flush to the totals of the host
+        and rewrites the textfile.
+
+        :param state_path: Path of the JSON file holding the totals of the host.
+        :param textfile_path: Path of the textfile read by the node-exporter.
+        """
+        with self._lock:
+            recorded, self._series = self._series, {}
+
+        try:
+            with host_lock(os.path.dirname(state_path), state_path):
+                try:
+                    with open(state_path) as fh:
+                        totals = json.load(fh)
+                except (IOError, ValueError):
+                    totals = {}
+
+                for key, series in recorded.items():
+                    total = totals.setdefault(key, series)
+                    if total is series:
+                        continue
+                    if "value" in series:
+                        total["value"] += series["value"]
+                    else:
+                        total["buckets"] = [
+                            a + b for (a, b) in zip(total["buckets"], series["buckets"])
+                        ]
+                        total["sum"] += series["sum"]
+                        total["count"] += series["count"]
+
+                _write_atomically(state_path, json.dumps(totals))
+        except Exception:
+            # put the values back so that they are part of the next flush.
+            with self._lock:
+                for key, series in recorded.items():
+                    self._series.setdefault(key, series)
+            raise
+
+        _write_atomically(textfile_path, self.render(totals))
+
+    def render(self, totals):
+        """
+        Formats totals in the Prometheus text exposition format.
+
+        :param totals: Dictionary of series, as stored in the state file.
+        :returns: Text to write to the textfile.
+        """
+        by_name = {}
+        for key, series in totals.items():
+            name, labels = json.loads(key)
+            by_name.setdefault(name, []).append((tuple(map(tuple, labels)), series))
+
+        lines = []
+        for name in sorted(by_name):
+            metric = self._metrics.get(name)
+            if metric is None:
+                # declared by a newer version of the app, skip it.
+                continue
+            full_name = "%s_%s" % (self._prefix, name)
+            lines.append("# HELP %s %s" % (full_name, metric["help"]))
+            lines.append("# TYPE %s %s" % (full_name, metric["type"]))
+            for labels, series in sorted(by_name[name]):
+                if metric["type"] == "counter":
+                    lines.append(
+                        "%s%s %s" % (full_name, _format_labels(labels), series["value"])
+                    )
+                    continue
+                cumulated = 0
+                bounds = [repr(float(b)) for b in metric["buckets"]] + ["+Inf"]
+                for bound, count in zip(bounds, series["buckets"]):
+                    cumulated += count
+                    lines.append(
+                        "%s_bucket%s %d"
+                        % (
+                            full_name,
+                            _format_labels(labels + (("le", bound),)),
+                            cumulated,
+                        )
+                    )
+                lines.append(
+                    "%s_sum%s %s" % (full_name, _format_labels(labels), series["sum"])
+                )
+                lines.append(
+                    "%s_count%s %d"
+                    % (full_name, _format_labels(labels), series["count"])
+                )
+        return "\n".join(lines) + "\n"
+
+
+class MetricsFlusher(threading.Thread):
+    """
+    Background thread flushing a :class:`MetricsRegistry` at a fixed interval,
+    so that recording metrics never waits on the disk.
+    """
+
+    def __init__(self, registry, state_path, textfile_path, interval=15.0, logger=None):
+        """
+        Constructor
+
+        :param registry: :class:`MetricsRegistry` to flush.
+        :param state_path: Path of the JSON file holding the totals of the host.
+        :param textfile_path: Path of the textfile read by the node-exporter.
+        :param interval: Seconds between two flushes.
+        :param logger: Optional callable used to log debug messages.
+        """
+        threading.Thread.__init__(self, name="tk-flame-review-metrics")
+        self.daemon = True
+        self._registry = registry
+        self._state_path = state_path
+        self._textfile_path = textfile_path
+        self._interval = interval
+        self._log = logger or (lambda msg: None)
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self._interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """
+        Flushes the registry if anything was recorded. Errors are logged.
+        """
+        if not self._registry.dirty:
+            return
+        try:
+            self._registry.flush(self._state_path, self._textfile_path)
+        except Exception as e:
+            self._log("Could not write metrics to '%s': %s" % (self._textfile_path, e))
+
+    def wake(self):
+        """
+        Requests a flush without waiting for the interval.
+        """
+        self._wake.set()
+
+    def stop(self):
+        """
+        Stops the thread, flushing what is left.
+        """
+        self._stopping.set()
+        self._wake.set()
+        self.join(5)
+        self.flush()
+
+
+def _write_atomically(path, content):
+    """
+    Replaces a file so that readers never see it partially written.
+
+    :param path: Path of the file.
+    :param content: Text to write.
+    """
+    folder = os.path.dirname(path)
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as fh:
+            fh.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
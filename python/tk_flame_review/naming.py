@@ -0,0 +1,99 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import re
+import threading
+
+
+class VersionNamer(object):
+    """
+    Picks Version codes which are not used yet, adding a numbered suffix,
+    e.g. "seq010 (2)", to codes which already exist.
+
+    Codes expected in a session are registered up front with :meth:`add`. The
+    first :meth:`claim` looks all of them up in a single query, later claims
+    are resolved locally and reserve the code they return, so that assets of
+    the same session never get the same code either.
+    """
+
+    # format of a code with its suffix
+    SUFFIX_FORMAT = "%s (%d)"
+
+    def __init__(self, find_codes):
+        """
+        Constructor
+
+        :param find_codes: Callable accepting a list of filters for the Version
+                           code field and returning the codes of the matching
+                           Versions. Filters are combined with "any".
+        """
+        self._find_codes = find_codes
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the codes looked up, for a new session.
+        """
+        with self._lock:
+            self._pending = set()
+            self._used = {}
+
+    def add(self, code):
+        """
+        Registers a code which will be claimed later in the session.
+
+        :param code: Code without suffix.
+        """
+        with self._lock:
+            if code not in self._used:
+                self._pending.add(code)
+
+    def claim(self, code):
+        """
+        Returns a free code for a new Version and reserves it.
+
+        :param code: Desired code.
+        :returns: The code itself if it's free, otherwise the code with the
+                  next free suffix.
+        """
+        with self._lock:
+            if code not in self._used:
+                self._pending.add(code)
+                self._lookup(sorted(self._pending))
+
+            numbers = self._used[code]
+            number = max(numbers) + 1 if numbers else 1
+            numbers.add(number)
+
+        if number == 1:
+            return code
+        return self.SUFFIX_FORMAT % (code, number)
+
+    def _lookup(self, codes):
+        """
+        Fetches the existing codes, suffixed or not, for a list of codes.
+        Must be called with the lock held.
+
+        :param codes: Codes without suffix.
+        """
+        filters = [["code", "in", codes]]
+        filters.extend(["code", "starts_with", "%s (" % code] for code in codes)
+        existing = self._find_codes(filters)
+
+        for code in codes:
+            pattern = re.compile(r"^%s(?: \((\d+)\))?$" % re.escape(code))
+            numbers = set()
+            for other in existing:
+                match = pattern.match(other or "")
+                if match:
+                    numbers.add(int(match.group(1) or 1))
+            self._used[code] = numbers
+        self._pending.clear()
@@ -0,0 +1,170 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import contextlib
+import cProfile
+import functools
+import itertools
+import os
+import re
+import threading
+import tracemalloc
+
+
+class CallbackProfiler(object):
+    """
+    Profiles the CPU time and the memory allocations of calls.
+
+    Each profiled call writes a ``.pstats`` file, which can be loaded with the
+    :mod:`pstats` module or tools like snakeviz, and a text file listing the
+    lines which allocated the most memory. The files are grouped by session in
+    sub folders, and the oldest ones are deleted when the folder gets too large.
+
+    Only one call is profiled at a time, calls made while another one is being
+    profiled, e.g. from another thread, run without being profiled.
+    """
+
+    # number of allocation sites listed in the allocation files
+    TOP_ALLOCATIONS = 30
+
+    def __init__(self, folder, max_size, logger=None):
+        """
+        Constructor
+
+        :param folder: Folder the profiles are written to. None disables profiling.
+        :param max_size: Maximum total size of the profiles, in bytes.
+        :param logger: Optional callable used to log debug messages.
+        """
+        self._folder = folder
+        self._max_size = max_size
+        self._log = logger or (lambda msg: None)
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+
+    @property
+    def enabled(self):
+        """
+        True if calls are profiled.
+        """
+        return bool(self._folder)
+
+    def wrap(self, name, func):
+        """
+        Wraps an export callback so that its calls are profiled.
+
+        :param name: Name of the callback, used to name the profiles.
+        :param func: Callback, taking the session id as its first argument.
+        :returns: The callback itself if profiling is disabled, otherwise a
+                  wrapper profiling it.
+        """
+        if not self.enabled:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(session_id, *args, **kwargs):
+            with self.profile(name, session_id):
+                return func(session_id, *args, **kwargs)
+
+        return wrapper
+
+    @contextlib.contextmanager
+    def profile(self, name, session_id):
+        """
+        Profiles a block of code.
+
+        :param name: Name of the profiled code, used to name the profiles.
+        :param session_id: Id of the export session the code runs for, or None.
+        """
+        if not self.enabled or not self._lock.acquire(False):
+            yield
+            return
+
+        try:
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                snapshot = tracemalloc.take_snapshot()
+                if started_tracing:
+                    tracemalloc.stop()
+                try:
+                    self._write(name, session_id, profiler, snapshot)
+                except Exception as e:
+                    self._log("Could not write profile of %s: %s" % (name, e))
+        finally:
+            self._lock.release()
+
+    def _write(self, name, session_id, profiler, snapshot):
+        """
+        Writes the profile of a call and rotates the profiles.
+        """
+        folder = os.path.join(
+            self._folder, re.sub(r"[^\w.-]", "_", str(session_id or "no_session"))
+        )
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        base_path = os.path.join(
+            folder, "%s.%d.%d" % (name, os.getpid(), next(self._counter))
+        )
+
+        profiler.dump_stats("%s.pstats" % base_path)
+
+        snapshot = snapshot.filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            )
+        )
+        statistics = snapshot.statistics("lineno")
+        with open("%s.allocations.txt" % base_path, "w") as fh:
+            fh.write(
+                "Total: %.1f KiB in %d blocks\n\n"
+                % (
+                    sum(stat.size for stat in statistics) / 1024.0,
+                    sum(stat.count for stat in statistics),
+                )
+            )
+            for stat in statistics[: self.TOP_ALLOCATIONS]:
+                fh.write("%s\n" % stat)
+
+        self._log("Wrote profile of %s to '%s.*'." % (name, base_path))
+        self.rotate()
+
+    def rotate(self):
+        """
+        Deletes the oldest profiles until the folder fits its maximum size.
+        """
+        files = []
+        for root, dirs, names in os.walk(self._folder):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for (_, size, _) in files)
+        for mtime, size, path in sorted(files):
+            if total <= self._max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            folder = os.path.dirname(path)
+            if folder != self._folder and not os.listdir(folder):
+                os.rmdir(folder)
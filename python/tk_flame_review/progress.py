@@ -0,0 +1,274 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import threading
+import time
+
+from sgtk.platform.qt import QtCore, QtGui
+
+
+class SessionProgress(object):
+    """
+    Progress and results of all the assets of an export session.
+
+    Updates only take a lock and bump a counter, so they are cheap enough to be
+    made from any thread and as often as needed. Displaying the progress is
+    left to :class:`ProgressPanel`, which polls it at a fixed rate.
+    """
+
+    # final states of an asset
+    SUBMITTED = "submitted"
+    DEFERRED = "deferred"
+    FAILED = "failed"
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Clears the progress for a new session.
+        """
+        with self._lock:
+            self._assets = {}
+            self._current = None
+            self.revision = 0
+
+    def _get_asset(self, key, name=None):
+        """
+        Returns the record of an asset, creating it if needed.
+        Must be called with the lock held.
+
+        :param key: Unique identifier of the asset in the session.
+        :param name: Display name of the asset.
+        :returns: Dictionary describing the asset.
+        """
+        asset = self._assets.get(key)
+        if asset is None:
+            asset = {
+                "name": name or key,
+                "phase": None,
+                "details": None,
+                "phase_start": time.time(),
+                "phase_times": {},
+                "state": None,
+                "version_id": None,
+                "size": None,
+                "size_estimated": False,
+            }
+            self._assets[key] = asset
+        return asset
+
+    def _end_phase(self, asset):
+        """
+        Accumulates the time spent in the current phase of an asset.
+        Must be called with the lock held.
+
+        :param asset: Asset record.
+        """
+        now = time.time()
+        if asset["phase"] is not None:
+            asset["phase_times"][asset["phase"]] = (
+                asset["phase_times"].get(asset["phase"], 0) + now - asset["phase_start"]
+            )
+        asset["phase_start"] = now
+
+    def update(self, key, name, phase, details):
+        """
+        Records the phase an asset is in.
+
+        :param key: Unique identifier of the asset in the session.
+        :param name: Display name of the asset.
+        :param phase: Short name of the phase, used to report the time spent in it.
+        :param details: Description of what is being done for the asset.
+        """
+        with self._lock:
+            asset = self._get_asset(key, name)
+            self._end_phase(asset)
+            asset["phase"] = phase
+            asset["details"] = details
+            asset["state"] = None
+            self._current = key
+            self.revision += 1
+
+    def set_result(self, key, **fields):
+        """
+        Records results for an asset.
+
+        :param key: Unique identifier of the asset in the session.
+        :param fields: Any of ``version_id``, ``size`` and ``size_estimated``.
+        """
+        with self._lock:
+            self._get_asset(key).update(fields)
+            self.revision += 1
+
+    def finish(self, key, name, state):
+        """
+        Records that an asset has been processed.
+
+        :param key: Unique identifier of the asset in the session.
+        :param name: Display name of the asset.
+        :param state: One of :attr:`SUBMITTED`, :attr:`DEFERRED` or :attr:`FAILED`.
+        """
+        with self._lock:
+            asset = self._get_asset(key, name)
+            self._end_phase(asset)
+            asset["phase"] = None
+            asset["details"] = None
+            asset["state"] = state
+            self.revision += 1
+
+    def snapshot(self):
+        """
+        Returns a consistent summary of the progress.
+
+        :returns: Dictionary with the keys ``total``, ``finished``, ``failed``,
+                  ``deferred`` and ``current``, the latter being a tuple
+                  (name, details) or None.
+        """
+        with self._lock:
+            states = [asset["state"] for asset in self._assets.values()]
+            current = None
+            if self._current is not None:
+                asset = self._assets[self._current]
+                if asset["state"] is None:
+                    current = (asset["name"], asset["details"])
+            return {
+                "total": len(states),
+                "finished": len([s for s in states if s is not None]),
+                "failed": states.count(self.FAILED),
+                "deferred": states.count(self.DEFERRED),
+                "current": current,
+            }
+
+    def result(self, key):
+        """
+        Returns the result of an asset.
+
+        :param key: Unique identifier of the asset in the session.
+        :returns: Dictionary with the keys listed in :meth:`results`, or None
+                  if the asset hasn't been reported.
+        """
+        with self._lock:
+            asset = self._assets.get(key)
+            return self._get_result(asset) if asset is not None else None
+
+    def results(self):
+        """
+        Returns the results of all the assets of the session, in the order
+        they were first reported.
+
+        :returns: List of dictionaries with the keys ``name``, ``state``,
+                  ``version_id``, ``size``, ``size_estimated`` and ``phase_times``,
+                  the latter mapping phase names to seconds.
+        """
+        with self._lock:
+            return [self._get_result(asset) for asset in self._assets.values()]
+
+    def _get_result(self, asset):
+        """
+        Must be called with the lock held.
+
+        :param asset: Asset record.
+        :returns: Dictionary describing the result of the asset.
+        """
+        return {
+            "name": asset["name"],
+            "state": asset["state"],
+            "version_id": asset["version_id"],
+            "size": asset["size"],
+            "size_estimated": asset["size_estimated"],
+            "phase_times": dict(asset["phase_times"]),
+        }
+
+
+class ProgressPanel(QtGui.QWidget):
+    """
+    Non modal panel showing the progress of an export session.
+
+    The panel redraws itself at most :attr:`REFRESH_RATE` times per second and
+    only when the progress has changed.
+    """
+
+    # maximum number of repaints per second
+    REFRESH_RATE = 5
+
+    def __init__(self, progress):
+        """
+        Constructor
+
+        :param progress: :class:`SessionProgress` to display.
+        """
+        QtGui.QWidget.__init__(self)
+
+        self._progress = progress
+        self._revision = None
+        self._last_refresh = 0
+
+        self._summary = QtGui.QLabel(self)
+        self._bar = QtGui.QProgressBar(self)
+        self._details = QtGui.QLabel(self)
+        self._details.setWordWrap(True)
+
+        layout = QtGui.QVBoxLayout(self)
+        layout.addWidget(self._summary)
+        layout.addWidget(self._bar)
+        layout.addWidget(self._details)
+        self.setMinimumWidth(400)
+
+        # pick up updates made from other threads whenever the event loop runs.
+        self._timer = QtCore.QTimer(self)
+        self._timer.timeout.connect(self.refresh)
+        self._timer.start(int(1000 / self.REFRESH_RATE))
+        self.refresh()
+
+    def refresh(self):
+        """
+        Redraws the panel if the progress changed.
+        """
+        if self._progress.revision == self._revision:
+            return
+        self._revision = self._progress.revision
+        self._last_refresh = time.time()
+
+        snapshot = self._progress.snapshot()
+        summary = "%d of %d sequences processed" % (
+            snapshot["finished"],
+            snapshot["total"],
+        )
+        if snapshot["deferred"]:
+            summary += ", %d deferred" % snapshot["deferred"]
+        if snapshot["failed"]:
+            summary += ", %d failed" % snapshot["failed"]
+        self._summary.setText(summary)
+
+        self._bar.setMaximum(max(snapshot["total"], 1))
+        self._bar.setValue(snapshot["finished"])
+
+        if snapshot["current"]:
+            self._details.setText("%s: %s" % snapshot["current"])
+        else:
+            self._details.setText("")
+
+    def process_updates(self):
+        """
+        Redraws the panel while the main thread is busy.
+
+        Calls made from the main thread block the event loop, so they need to
+        flush pending repaints themselves. This is throttled to the refresh
+        rate so that it can be called after every update.
+        """
+        if time.time() - self._last_refresh < 1.0 / self.REFRESH_RATE:
+            return
+        self.refresh()
+        QtCore.QCoreApplication.processEvents(QtCore.QEventLoop.ExcludeUserInputEvents)
@@ -0,0 +1,173 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import hashlib
+import json
+import os
+import shutil
+
+
+def hash_file(path):
+    """
+    Computes the sha1 of a file.
+
+    :param path: Path to the file.
+    :returns: Hex digest.
+    """
+    sha = hashlib.sha1()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def make_fingerprint(info, preset_hash, content_id):
+    """
+    Computes the fingerprint of the movie rendered for an asset.
+
+    Two assets with the same fingerprint are rendered from the same content
+    and sequence range, at the same resolution and frame rate, with the same
+    preset, so their movies can be used interchangeably.
+
+    :param info: Flame asset info dictionary, as passed to the export hooks.
+    :param preset_hash: Hash of the export preset file, see :func:`hash_file`.
+    :param content_id: Identifier of the content of the asset, see the
+                       get_render_identity method of the settings hook.
+    :returns: Fingerprint, as a string.
+    """
+    values = [
+        info.get(key)
+        for key in (
+            "sequenceName",
+            "versionNumber",
+            "recordIn",
+            "recordOut",
+            "sourceIn",
+            "sourceOut",
+            "width",
+            "height",
+            "fps",
+        )
+    ]
+    values.extend([preset_hash, content_id])
+    return hashlib.sha1(json.dumps(values).encode("utf-8")).hexdigest()
+
+
+class RenderCache(object):
+    """
+    Size bounded directory of rendered movies, keyed by fingerprint.
+
+    Movies are evicted least recently used first, based on their modification
+    time which is refreshed every time a movie is reused. Movies are hard
+    linked into the cache when possible, so adding a movie rendered on the same
+    volume costs no copy.
+    """
+
+    def __init__(self, folder, max_size, logger=None):
+        """
+        Constructor
+
+        :param folder: Folder holding the cached movies.
+        :param max_size: Maximum total size of the cached movies, in bytes.
+                         0 disables the cache.
+        :param logger: Optional callable used to log debug messages.
+        """
+        self._folder = folder
+        self._max_size = max_size
+        self._log = logger or (lambda msg: None)
+
+    @property
+    def enabled(self):
+        """
+        True if movies are cached.
+        """
+        return self._max_size > 0
+
+    def contains(self, path):
+        """
+        Checks if a path is a movie held by the cache.
+
+        :param path: Path to check.
+        :returns: True if the path is in the cache folder.
+        """
+        return os.path.dirname(os.path.abspath(path)) == os.path.abspath(self._folder)
+
+    def get(self, fingerprint):
+        """
+        Looks up a movie, marking it as recently used.
+
+        :param fingerprint: Fingerprint of the movie, see :func:`make_fingerprint`.
+        :returns: Path to the cached movie or None.
+        """
+        path = os.path.join(self._folder, "%s.mov" % fingerprint)
+        try:
+            os.utime(path, None)
+        except OSError:
+            return None
+        return path
+
+    def put(self, fingerprint, path):
+        """
+        Adds a movie to the cache and evicts the least recently used ones
+        if the cache gets too large.
+
+        :param fingerprint: Fingerprint of the movie, see :func:`make_fingerprint`.
+        :param path: Path to the movie, which is left untouched.
+        :returns: Path to the cached movie, or None if it is too large to be cached.
+        """
+        if os.path.getsize(path) > self._max_size:
+            return None
+        if not os.path.isdir(self._folder):
+            os.makedirs(self._folder)
+
+        cached_path = os.path.join(self._folder, "%s.mov" % fingerprint)
+        tmp_path = "%s.%d.tmp" % (cached_path, os.getpid())
+        try:
+            os.link(path, tmp_path)
+        except OSError:
+            # not on the same volume.
+            shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, cached_path)
+        # the render time of the movie doesn't matter, its use does.
+        os.utime(cached_path, None)
+        self._log("Cached render '%s' as '%s'." % (path, cached_path))
+
+        self.evict()
+        return cached_path
+
+    def evict(self):
+        """
+        Deletes the least recently used movies until the cache fits its maximum size.
+        """
+        movies = []
+        try:
+            names = os.listdir(self._folder)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith(".mov"):
+                continue
+            path = os.path.join(self._folder, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            movies.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for (_, size, _) in movies)
+        for mtime, size, path in sorted(movies):
+            if total <= self._max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self._log("Evicted '%s' from the render cache." % path)
@@ -0,0 +1,27 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+
+def get_upload_priority(size, deadline=None):
+    """
+    Computes the priority of an upload, lower values first.
+
+    Uploads with a deadline come first, earliest deadline first. The others
+    follow, smallest first, so that short spots don't wait behind full length
+    reels and the mean time until a movie is reviewable is as low as possible.
+
+    :param size: Expected size of the movie, in bytes.
+    :param deadline: Time by which the movie should be reviewable, in seconds
+                     since the epoch, or None.
+    :returns: Sortable priority.
+    """
+    if deadline is not None:
+        return (0, deadline, size)
+    return (1, 0, size)
@@ -0,0 +1,243 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class SubmissionSpool(object):
+    """
+    Durable queue of submissions which could not reach the site.
+
+    Items are stored in a SQLite database on the local host so that they survive
+    a crash of the Flame or backburner process. They are handed out strictly in
+    the order they were pushed and are only removed once they have been
+    acknowledged, giving at-least-once delivery.
+    """
+
+    # item states
+    PENDING = "pending"
+    FAILED = "failed"
+
+    def __init__(self, path):
+        """
+        Constructor
+
+        :param path: Path to the SQLite database file. Created if needed.
+        """
+        self._path = path
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS spool ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "kind TEXT NOT NULL, "
+                "payload TEXT NOT NULL, "
+                "state TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, "
+                "last_error TEXT, "
+                "created_at REAL NOT NULL)"
+            )
+
+    @property
+    def path(self):
+        """
+        Path to the SQLite database backing the spool.
+        """
+        return self._path
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """
+        Opens a connection to the spool database and commits on exit.
+
+        A connection is opened per operation so that the spool can be shared by
+        several threads and processes.
+        """
+        conn = sqlite3.connect(self._path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def push(self, kind, payload):
+        """
+        Appends an item to the spool.
+
+        :param kind: Type of item, used to dispatch it when draining.
+        :param payload: JSON serializable dictionary describing the work to do.
+        :returns: Id of the spooled item.
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO spool (kind, payload, state, created_at) VALUES (?, ?, ?, ?)",
+                (kind, json.dumps(payload), self.PENDING, time.time()),
+            )
+            return cursor.lastrowid
+
+    def peek(self):
+        """
+        Returns the oldest pending item without removing it.
+
+        :returns: Tuple (id, kind, payload) or None if nothing is pending.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, kind, payload FROM spool WHERE state = ? ORDER BY id LIMIT 1",
+                (self.PENDING,),
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2])
+
+    def get_pending(self):
+        """
+        Returns all the pending items, in order.
+
+        :returns: List of tuples (id, kind, payload).
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, kind, payload FROM spool WHERE state = ? ORDER BY id",
+                (self.PENDING,),
+            ).fetchall()
+        return [(row[0], row[1], json.loads(row[2])) for row in rows]
+
+    def ack(self, item_id):
+        """
+        Removes an item which has been processed successfully.
+
+        :param item_id: Id of the spooled item.
+        """
+        with self._connect() as conn:
+            conn.execute("DELETE FROM spool WHERE id = ?", (item_id,))
+
+    def retry_later(self, item_id, error):
+        """
+        Records a failed attempt on an item, leaving it at the head of the queue.
+
+        :param item_id: Id of the spooled item.
+        :param error: Description of the failure.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE spool SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+                (str(error), item_id),
+            )
+
+    def fail(self, item_id, error):
+        """
+        Marks an item as permanently failed so that it no longer blocks the queue.
+        Failed items are kept in the database for inspection.
+
+        :param item_id: Id of the spooled item.
+        :param error: Description of the failure.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE spool SET state = ?, attempts = attempts + 1, last_error = ? "
+                "WHERE id = ?",
+                (self.FAILED, str(error), item_id),
+            )
+
+    def pending_count(self):
+        """
+        :returns: Number of items waiting to be processed.
+        """
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM spool WHERE state = ?", (self.PENDING,)
+            ).fetchone()[0]
+
+
+class SpoolWorker(threading.Thread):
+    """
+    Background thread draining a :class:`SubmissionSpool`.
+
+    Items are processed one at a time, in order. When the handler fails with an
+    error that ``is_transient`` accepts, the item stays at the head of the queue
+    and the worker waits ``interval`` seconds before trying again. Any other
+    error marks the item as failed so that the rest of the queue can proceed.
+    """
+
+    def __init__(self, spool, handler, is_transient, interval=60.0, logger=None):
+        """
+        Constructor
+
+        :param spool: :class:`SubmissionSpool` to drain.
+        :param handler: Callable accepting (kind, payload) which processes an item.
+        :param is_transient: Callable accepting an exception and returning True if
+                             the item should be tried again later.
+        :param interval: Seconds to wait when the spool is empty or the site is down.
+        :param logger: Optional callable used to log debug messages.
+        """
+        threading.Thread.__init__(self, name="tk-flame-review-spool")
+        self.daemon = True
+        self._spool = spool
+        self._handler = handler
+        self._is_transient = is_transient
+        self._interval = interval
+        self._log = logger or (lambda msg: None)
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def wake(self):
+        """
+        Asks the worker to check the spool right away.
+        """
+        self._wake.set()
+
+    def stop(self):
+        """
+        Asks the worker to exit once the current item has been processed.
+        """
+        self._stopping.set()
+        self._wake.set()
+
+    def run(self):
+        """
+        Drains the spool until stopped.
+        """
+        while not self._stopping.is_set():
+            item = self._spool.peek()
+            if item is None:
+                self._sleep()
+                continue
+
+            item_id, kind, payload = item
+            try:
+                self._handler(kind, payload)
+            except Exception as e:
+                if self._is_transient(e):
+                    self._log("Spooled %s %d postponed: %s" % (kind, item_id, e))
+                    self._spool.retry_later(item_id, e)
+                    self._sleep()
+                else:
+                    self._log("Spooled %s %d failed: %s" % (kind, item_id, e))
+                    self._spool.fail(item_id, e)
+            else:
+                self._log("Spooled %s %d processed." % (kind, item_id))
+                self._spool.ack(item_id)
+
+    def _sleep(self):
+        """
+        Waits for the polling interval or until woken up.
+        """
+        self._wake.wait(self._interval)
+        self._wake.clear()
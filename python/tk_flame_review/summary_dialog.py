@@ -9,7 +9,7 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 import sgtk
-from sgtk.platform.qt import QtGui
+from sgtk.platform.qt import QtCore, QtGui
 
 from .ui.summary_dialog import Ui_SummaryDialog
 
@@ -19,11 +19,13 @@ class SummaryDialog(QtGui.QWidget):
     Status popup that shows after the review submission has completed.
     """
 
-    def __init__(self, success):
+    def __init__(self, success, results=None):
         """
         Constructor
 
         :param success: If true, show the success screen else the failure screen.
+        :param results: Optional list of per asset results, as returned by
+                        :meth:`SessionProgress.results`, to show below the status.
         """
         # first, call the base class and let it do its thing.
         QtGui.QWidget.__init__(self)
@@ -39,6 +41,18 @@ class SummaryDialog(QtGui.QWidget):
             # show fail screen
             self.ui.stackedWidget.setCurrentIndex(1)
 
+        if results:
+            # rows are only formatted when the view paints them, which keeps
+            # the dialog responsive for sessions with hundreds of sequences.
+            self._results_model = AssetResultsModel(results, self)
+            self._results_view = QtGui.QTableView(self)
+            self._results_view.setModel(self._results_model)
+            self._results_view.verticalHeader().hide()
+            self._results_view.setSelectionMode(QtGui.QAbstractItemView.NoSelection)
+            self._results_view.horizontalHeader().setStretchLastSection(True)
+            self.ui.verticalLayout.insertWidget(1, self._results_view)
+            self.resize(self.width() + 200, self.height() + 250)
+
         # with the tk dialogs, we need to hook up our modal
         # dialog signals in a special way
         self.__exit_code = QtGui.QDialog.Rejected
@@ -66,3 +80,92 @@ class SummaryDialog(QtGui.QWidget):
         """
         self.__exit_code = QtGui.QDialog.Accepted
         self.close()
+
+
+class AssetResultsModel(QtCore.QAbstractTableModel):
+    """
+    Read only table model presenting the results of the assets of a session.
+    """
+
+    COLUMNS = ["Sequence", "Status", "Version", "Movie size", "Time"]
+
+    STATUS_LABELS = {
+        "submitted": "Submitted",
+        "deferred": "Queued",
+        "failed": "Failed",
+        "pending": "In progress",
+        None: "In progress",
+    }
+
+    def __init__(self, results, parent=None):
+        """
+        Constructor
+
+        :param results: List of per asset results.
+        :param parent: Parent object.
+        """
+        QtCore.QAbstractTableModel.__init__(self, parent)
+        self._results = results
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        """
+        :returns: Number of assets.
+        """
+        if parent.isValid():
+            return 0
+        return len(self._results)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        """
+        :returns: Number of columns.
+        """
+        if parent.isValid():
+            return 0
+        return len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        """
+        :returns: Column titles.
+        """
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        """
+        Formats a cell. This is only called for the visible cells.
+
+        :returns: Text to display in the cell.
+        """
+        if not index.isValid():
+            return None
+
+        result = self._results[index.row()]
+        column = index.column()
+
+        if role == QtCore.Qt.ToolTipRole and column == 4:
+            # detail the time spent in each phase
+            return "\n".join(
+                "%s: %.1fs" % (phase, seconds)
+                for (phase, seconds) in result["phase_times"].items()
+            )
+
+        if role != QtCore.Qt.DisplayRole:
+            return None
+
+        if column == 0:
+            return result["name"]
+        elif column == 1:
+            return self.STATUS_LABELS.get(result["state"], result["state"])
+        elif column == 2:
+            return str(result["version_id"] or "")
+        elif column == 3:
+            if result["size"] is None:
+                return ""
+            return "%s%.1f MB" % (
+                "~" if result["size_estimated"] else "",
+                result["size"] / 1e6,
+            )
+        elif column == 4:
+            return "%.1fs" % sum(result["phase_times"].values())
+        return None
@@ -0,0 +1,338 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Lightweight tracing of submissions across the Flame session and the jobs it
+starts.
+
+Spans are written to local JSON files following the OTLP/JSON trace format,
+so that they can be loaded by any OpenTelemetry compatible tool. A trace is
+started by the export session and its context, a small dictionary, is passed
+along to the jobs so that their spans join the same trace.
+"""
+
+import contextlib
+import itertools
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+# OTLP status codes
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# OTLP span kind of all the spans recorded
+SPAN_KIND_INTERNAL = 1
+
+# age in seconds after which trace files are deleted
+MAX_AGE = 7 * 24 * 3600
+
+# total size in bytes of the trace files kept, the oldest are deleted first
+MAX_SIZE = 100 * 1024 * 1024
+
+
+def _encode_attributes(attributes):
+    """
+    :param attributes: Dictionary of attributes.
+    :returns: Attributes in the OTLP/JSON format.
+    """
+    encoded = []
+    for key, value in sorted(attributes.items()):
+        if isinstance(value, bool):
+            encoded_value = {"boolValue": value}
+        elif isinstance(value, int):
+            encoded_value = {"intValue": str(value)}
+        elif isinstance(value, float):
+            encoded_value = {"doubleValue": value}
+        else:
+            encoded_value = {"stringValue": str(value)}
+        encoded.append({"key": key, "value": encoded_value})
+    return encoded
+
+
+class Span(object):
+    """
+    A span being recorded.
+    """
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "attributes")
+
+    def __init__(self, trace_id, parent_id, name, start, attributes):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start = start
+        self.attributes = attributes
+
+
+class Tracer(object):
+    """
+    Records spans for the trace active in the current thread.
+
+    Spans are only recorded while a trace is active, see :meth:`start_trace`
+    and :meth:`resume`, and only if the tracer has a folder to write them to.
+    Finished spans are kept in memory until :meth:`flush` is called, which
+    also deletes the trace files that are too old or too many.
+    """
+
+    def __init__(
+        self, folder, service_name, logger=None, max_age=MAX_AGE, max_size=MAX_SIZE
+    ):
+        """
+        Constructor
+
+        :param folder: Folder the trace files are written to. None disables tracing.
+        :param service_name: Name of the service the spans are reported for.
+        :param logger: Optional callable used to log debug messages.
+        :param max_age: Age in seconds after which trace files are deleted.
+        :param max_size: Total size in bytes of the trace files kept.
+        """
+        self._folder = folder
+        self._service_name = service_name
+        self._max_age = max_age
+        self._max_size = max_size
+        self._log = logger or (lambda msg: None)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._finished = []
+        self._counter = itertools.count()
+
+    @property
+    def enabled(self):
+        """
+        True if spans are recorded.
+        """
+        return bool(self._folder)
+
+    def _get_stack(self):
+        """
+        :returns: The trace id, the stack of open spans and the id of the
+                  parent of the outermost span of the current thread.
+        """
+        if not hasattr(self._local, "trace_id"):
+            self._local.trace_id = None
+            self._local.stack = []
+            self._local.parent_id = None
+        return self._local
+
+    def start_trace(self):
+        """
+        Starts a new trace in the current thread, replacing any active one.
+
+        :returns: Id of the trace, or None if tracing is disabled.
+        """
+        state = self._get_stack()
+        state.trace_id = os.urandom(16).hex() if self.enabled else None
+        state.stack = []
+        state.parent_id = None
+        return state.trace_id
+
+    def context(self):
+        """
+        Returns the context to pass to a job so that its spans join the active trace.
+
+        :returns: Dictionary with the trace id, the id of the innermost open
+                  span and the current time, or None if no trace is active.
+        """
+        state = self._get_stack()
+        if state.trace_id is None:
+            return None
+        return {
+            "trace_id": state.trace_id,
+            "parent_id": state.stack[-1].span_id if state.stack else None,
+            "created_at": time.time(),
+        }
+
+    @contextlib.contextmanager
+    def resume(self, context):
+        """
+        Makes a trace started by another process active in the current thread.
+
+        :param context: Dictionary returned by :meth:`context`, or None.
+        """
+        state = self._get_stack()
+        previous = (state.trace_id, state.stack, state.parent_id)
+        if context and self.enabled:
+            state.trace_id = context["trace_id"]
+            state.parent_id = context.get("parent_id")
+        else:
+            state.trace_id = None
+            state.parent_id = None
+        state.stack = []
+        try:
+            yield
+        finally:
+            state.trace_id, state.stack, state.parent_id = previous
+
+    def begin(self, name, start=None, **attributes):
+        """
+        Opens a span, child of the innermost open span of the current thread.
+
+        :param name: Name of the span.
+        :param start: Start time of the span, defaults to now.
+        :param attributes: Attributes of the span.
+        :returns: :class:`Span`, or None if no trace is active.
+        """
+        state = self._get_stack()
+        if state.trace_id is None:
+            return None
+        if state.stack:
+            parent_id = state.stack[-1].span_id
+        else:
+            parent_id = state.parent_id
+        span = Span(state.trace_id, parent_id, name, start or time.time(), attributes)
+        state.stack.append(span)
+        return span
+
+    def end(self, span, error=None):
+        """
+        Closes a span opened by :meth:`begin`.
+
+        :param span: :class:`Span` to close. None is ignored.
+        :param error: Exception or message if the span failed.
+        """
+        if span is None:
+            return
+        state = self._get_stack()
+        if span in state.stack:
+            state.stack.remove(span)
+        self._record(span, time.time(), error)
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        """
+        Records a span around a block of code.
+
+        :param name: Name of the span.
+        :param attributes: Attributes of the span.
+        """
+        span = self.begin(name, **attributes)
+        try:
+            yield span
+        except Exception as e:
+            self.end(span, error=e)
+            raise
+        else:
+            self.end(span)
+
+    def add(self, name, start, end, **attributes):
+        """
+        Records a span which already happened, e.g. time spent waiting.
+
+        :param name: Name of the span.
+        :param start: Start time of the span.
+        :param end: End time of the span.
+        :param attributes: Attributes of the span.
+        """
+        span = self.begin(name, start=start, **attributes)
+        if span is not None:
+            self._get_stack().stack.remove(span)
+            self._record(span, end, None)
+
+    def _record(self, span, end, error):
+        """
+        Stores a finished span in the OTLP/JSON format.
+        """
+        record = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(int(span.start * 1e9)),
+            "endTimeUnixNano": str(int(end * 1e9)),
+            "attributes": _encode_attributes(span.attributes),
+            "status": {"code": STATUS_OK},
+        }
+        if span.parent_id:
+            record["parentSpanId"] = span.parent_id
+        if error is not None:
+            record["status"] = {"code": STATUS_ERROR, "message": str(error)}
+        with self._lock:
+            self._finished.append(record)
+
+    def flush(self):
+        """
+        Writes the finished spans to a new trace file. Errors are logged.
+        """
+        with self._lock:
+            spans, self._finished = self._finished, []
+        if not spans:
+            return
+
+        document = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": _encode_attributes(
+                            {
+                                "service.name": self._service_name,
+                                "host.name": socket.gethostname(),
+                                "process.pid": os.getpid(),
+                            }
+                        )
+                    },
+                    "scopeSpans": [
+                        {"scope": {"name": self._service_name}, "spans": spans}
+                    ],
+                }
+            ]
+        }
+        path = os.path.join(
+            self._folder,
+            "%s.%d.%d.json" % (spans[0]["traceId"], os.getpid(), next(self._counter)),
+        )
+        try:
+            if not os.path.isdir(self._folder):
+                os.makedirs(self._folder)
+            fd, tmp_path = tempfile.mkstemp(dir=self._folder, prefix=".")
+            with os.fdopen(fd, "w") as fh:
+                json.dump(document, fh)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            self._log("Could not write trace file '%s': %s" % (path, e))
+        self.prune()
+
+    def prune(self):
+        """
+        Deletes the trace files older than the maximum age, then the oldest
+        ones until they fit the maximum size. Left over temporary files are
+        deleted once they are older than the maximum age.
+        """
+        try:
+            names = os.listdir(self._folder)
+        except OSError:
+            return
+
+        now = time.time()
+        files = []
+        for name in names:
+            path = os.path.join(self._folder, name)
+            try:
+                stat = os.stat(path)
+                if now - stat.st_mtime > self._max_age:
+                    os.remove(path)
+                elif name.endswith(".json") and not name.startswith("."):
+                    files.append((stat.st_mtime, stat.st_size, path))
+            except OSError:
+                continue
+
+        total = sum(size for (_, size, _) in files)
+        for mtime, size, path in sorted(files):
+            if total <= self._max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
@@ -0,0 +1,468 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Long lived upload service for a Flame host.
+
+The daemon listens on a local Unix socket and processes uploads one at a time
+from a queue, reusing the same warm Flow Production Tracking connection. Queued
+uploads are processed in the order they were submitted or, optionally,
+shortest first, or earliest deadline first for the ones whose job carries a
+``deadline``, based on the ``expected_size`` of the job, see
+:func:`get_upload_priority`. Clients speak a line based JSON protocol, one
+request and one response per connection:
+
+- ``{"op": "ping"}`` returns the daemon health.
+- ``{"op": "submit", "job": {...}, "wait": bool}`` queues an upload. If ``wait``
+  is set, the response is only sent once the upload has ended.
+- ``{"op": "status", "job_id": id}`` returns the state of an upload.
+- ``{"op": "shutdown"}`` stops the daemon.
+
+The socket lives in a folder only its owner can access, and both ends check
+that the other one runs as the same user. Jobs still queued when the daemon
+stops are cancelled, their clients are told so and can upload themselves.
+The ones no client waits for are handed to the ``on_cancelled`` callback of
+the daemon, however it was stopped.
+
+The daemon shuts itself down once it has been idle for a while.
+"""
+
+import itertools
+import json
+import os
+import queue
+import socket
+import socketserver
+import stat
+import struct
+import threading
+import time
+import uuid
+
+from .scheduling import get_upload_priority
+
+# states of a job
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+def ensure_private_folder(folder):
+    """
+    Creates a folder only accessible by the current user, or checks that an
+    existing one is.
+
+    :param folder: Path to the folder.
+    :raises OSError: If the folder belongs to another user or isn't a folder.
+    """
+    try:
+        os.mkdir(folder, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(folder)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise PermissionError(
+            "'%s' is not a folder owned by the current user." % folder
+        )
+    if info.st_mode & 0o077:
+        os.chmod(folder, 0o700)
+
+
+def get_peer_uid(sock):
+    """
+    Returns the id of the user running the process at the other end of a
+    Unix socket.
+
+    :param sock: Connected Unix socket.
+    :returns: User id, or None if the platform can't tell.
+    """
+    if hasattr(socket, "SO_PEERCRED"):
+        # Linux, struct ucred
+        creds = sock.getsockopt(
+            socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+        )
+        return struct.unpack("3i", creds)[1]
+    if hasattr(socket, "LOCAL_PEERCRED"):
+        # macOS, struct xucred, at level SOL_LOCAL
+        creds = sock.getsockopt(0, socket.LOCAL_PEERCRED, struct.calcsize("IIh16I"))
+        return struct.unpack_from("II", creds)[1]
+    return None
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handles a single client request.
+    """
+
+    def handle(self):
+        """
+        Reads a request, dispatches it to the daemon and writes the response.
+        """
+        line = self.rfile.readline()
+        try:
+            request = json.loads(line.decode("utf-8"))
+            response = self.server.upload_daemon.handle_request(request)
+        except Exception as e:
+            response = {"ok": False, "error": str(e)}
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server spawning a thread per connection.
+    """
+
+    daemon_threads = True
+
+    def verify_request(self, request, client_address):
+        """
+        Only serves the processes of the user running the daemon.
+        """
+        try:
+            uid = get_peer_uid(request)
+        except OSError:
+            uid = None
+        return uid == os.getuid()
+
+
+class UploadDaemon(object):
+    """
+    Upload service listening on a local Unix socket.
+    """
+
+    def __init__(
+        self,
+        socket_path,
+        handler,
+        idle_timeout=3600,
+        shortest_first=False,
+        on_cancelled=None,
+        logger=None,
+    ):
+        """
+        Constructor
+
+        :param socket_path: Path of the Unix socket to listen on.
+        :param handler: Callable accepting a job dictionary and performing the upload.
+                        It is always called from the same worker thread.
+        :param idle_timeout: Seconds without any job after which the daemon stops.
+        :param shortest_first: If True, the queued jobs are processed in the order
+                               of :func:`get_upload_priority` rather than in the
+                               order they were submitted.
+        :param on_cancelled: Optional callable accepting a job dictionary, called
+                             for each queued job no client was waiting for when
+                             the daemon stops.
+        :param logger: Optional callable used to log debug messages.
+        """
+        self._socket_path = socket_path
+        self._handler = handler
+        self._shortest_first = shortest_first
+        self._on_cancelled = on_cancelled
+        self._idle_timeout = idle_timeout
+        self._log = logger or (lambda msg: None)
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._jobs = {}
+        self._jobs_lock = threading.Lock()
+        self._server = None
+        self._started_at = None
+        self._last_activity = None
+
+    @property
+    def is_running(self):
+        """
+        True if the daemon is serving requests.
+        """
+        return self._server is not None
+
+    def start(self):
+        """
+        Starts serving requests in background threads.
+
+        :returns: False if another daemon is already serving the socket.
+        :raises OSError: If the folder of the socket isn't private.
+        """
+        ensure_private_folder(os.path.dirname(self._socket_path))
+        if UploadDaemonClient(self._socket_path).ping():
+            return False
+        if os.path.exists(self._socket_path):
+            # left behind by a daemon which didn't shut down cleanly.
+            os.remove(self._socket_path)
+
+        self._server = _Server(self._socket_path, _RequestHandler)
+        os.chmod(self._socket_path, 0o600)
+        self._server.upload_daemon = self
+        self._started_at = self._last_activity = time.time()
+
+        for target in (self._server.serve_forever, self._work, self._watch_idle):
+            thread = threading.Thread(target=target, name="tk-flame-review-upload")
+            thread.daemon = True
+            thread.start()
+
+        self._log("Upload daemon listening on '%s'." % self._socket_path)
+        return True
+
+    def stop(self):
+        """
+        Stops serving requests. Uploads in progress are not interrupted, the
+        queued ones are cancelled and handed to the ``on_cancelled`` callback.
+
+        :returns: List of the cancelled jobs no client was waiting for.
+        """
+        server = self._server
+        if server is None:
+            return []
+        self._server = None
+        # sorted before any job, the worker stops after the current upload.
+        self._queue.put(((-1,), next(self._counter), None))
+
+        cancelled = []
+        with self._jobs_lock:
+            for job in self._jobs.values():
+                if job["state"] != QUEUED:
+                    continue
+                job["state"] = CANCELLED
+                job["error"] = "Upload daemon stopped before the upload started."
+                job["done"].set()
+                if not job["waited"]:
+                    cancelled.append(job["job"])
+        if cancelled:
+            self._log("Upload daemon cancelled %d queued uploads." % len(cancelled))
+            if self._on_cancelled:
+                for job in cancelled:
+                    try:
+                        self._on_cancelled(job)
+                    except Exception as e:
+                        self._log("Could not hand back cancelled upload: %s" % e)
+
+        server.shutdown()
+        server.server_close()
+        try:
+            os.remove(self._socket_path)
+        except OSError:
+            pass
+        self._log("Upload daemon stopped.")
+        return cancelled
+
+    def handle_request(self, request):
+        """
+        Processes a client request.
+
+        :param request: Request dictionary.
+        :returns: Response dictionary.
+        """
+        op = request.get("op")
+        if op == "ping":
+            with self._jobs_lock:
+                pending = len(
+                    [j for j in self._jobs.values() if j["state"] in (QUEUED, RUNNING)]
+                )
+            return {
+                "ok": True,
+                "pid": os.getpid(),
+                "uptime": time.time() - self._started_at,
+                "pending": pending,
+            }
+
+        if op == "submit":
+            job_id = self.submit(request["job"], waited=bool(request.get("wait")))
+            if request.get("wait"):
+                return dict(self.wait(job_id), ok=True)
+            return {"ok": True, "job_id": job_id}
+
+        if op == "status":
+            with self._jobs_lock:
+                job = self._jobs.get(request.get("job_id"))
+                if job is None:
+                    return {"ok": False, "error": "Unknown job."}
+                return dict(self._describe(job), ok=True)
+
+        if op == "shutdown":
+            threading.Thread(target=self.stop).start()
+            return {"ok": True}
+
+        return {"ok": False, "error": "Unknown operation '%s'." % op}
+
+    def submit(self, job, waited=False):
+        """
+        Queues an upload.
+
+        :param job: Job dictionary passed to the handler.
+        :param waited: True if the client waits for the upload, and therefore
+                       knows about it if it gets cancelled.
+        :returns: Id of the job.
+        :raises RuntimeError: If the daemon is stopped.
+        """
+        job_id = uuid.uuid4().hex
+        with self._jobs_lock:
+            if not self.is_running:
+                raise RuntimeError("Upload daemon is stopped.")
+            self._jobs[job_id] = {
+                "id": job_id,
+                "job": job,
+                "state": QUEUED,
+                "error": None,
+                "waited": waited,
+                "done": threading.Event(),
+            }
+        self._last_activity = time.time()
+        if self._shortest_first:
+            priority = get_upload_priority(
+                job.get("expected_size") or 0, job.get("deadline")
+            )
+        else:
+            priority = (0,)
+        self._queue.put((priority, next(self._counter), job_id))
+        return job_id
+
+    def wait(self, job_id):
+        """
+        Waits for an upload to end.
+
+        :param job_id: Id of the job.
+        :returns: Dictionary with the job id, state and error.
+        """
+        with self._jobs_lock:
+            job = self._jobs[job_id]
+        job["done"].wait()
+        return self._describe(job)
+
+    def _describe(self, job):
+        """
+        :returns: Serializable description of a job.
+        """
+        return {"job_id": job["id"], "state": job["state"], "error": job["error"]}
+
+    def _work(self):
+        """
+        Processes queued uploads until the daemon stops.
+        """
+        while True:
+            _, _, job_id = self._queue.get()
+            if job_id is None:
+                return
+            with self._jobs_lock:
+                job = self._jobs[job_id]
+                if job["state"] != QUEUED:
+                    # cancelled
+                    continue
+                job["state"] = RUNNING
+            try:
+                self._handler(job["job"])
+            except Exception as e:
+                self._log("Upload %s failed: %s" % (job_id, e))
+                job["state"] = FAILED
+                job["error"] = str(e)
+            else:
+                job["state"] = DONE
+            self._last_activity = time.time()
+            job["done"].set()
+
+            # only remember the outcome of finished jobs for a while
+            with self._jobs_lock:
+                for other_id, other in list(self._jobs.items()):
+                    if other["done"].is_set() and other_id != job_id:
+                        del self._jobs[other_id]
+
+    def _watch_idle(self):
+        """
+        Stops the daemon once nothing has been queued for the idle timeout.
+        """
+        while self._server is not None:
+            time.sleep(min(60, self._idle_timeout))
+            idle = self._queue.empty() and not any(
+                job["state"] == RUNNING for job in list(self._jobs.values())
+            )
+            if idle and time.time() - self._last_activity > self._idle_timeout:
+                self._log("Upload daemon idle for %ds." % self._idle_timeout)
+                self.stop()
+
+
+class UploadDaemonClient(object):
+    """
+    Client for :class:`UploadDaemon`.
+    """
+
+    def __init__(self, socket_path, timeout=5.0):
+        """
+        Constructor
+
+        :param socket_path: Path of the Unix socket the daemon listens on.
+        :param timeout: Seconds to wait for a response, except when waiting
+                        for an upload to end.
+        """
+        self._socket_path = socket_path
+        self._timeout = timeout
+
+    def _request(self, request, timeout):
+        """
+        Sends a request and reads the response.
+
+        :param request: Request dictionary.
+        :param timeout: Seconds to wait for the response, None to wait forever.
+        :returns: Response dictionary.
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(timeout)
+            sock.connect(self._socket_path)
+            if get_peer_uid(sock) != os.getuid():
+                raise ConnectionRefusedError(
+                    "'%s' is served by another user." % self._socket_path
+                )
+            sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            with sock.makefile("rb") as fh:
+                line = fh.readline()
+        finally:
+            sock.close()
+        if not line:
+            raise ConnectionError("Upload daemon closed the connection.")
+        return json.loads(line.decode("utf-8"))
+
+    def ping(self):
+        """
+        Checks if the daemon is running.
+
+        :returns: The daemon health dictionary, or None if it isn't reachable.
+        """
+        try:
+            return self._request({"op": "ping"}, self._timeout)
+        except (OSError, ValueError):
+            return None
+
+    def submit(self, job, wait=False):
+        """
+        Queues an upload.
+
+        :param job: Job dictionary passed to the daemon handler.
+        :param wait: If True, block until the upload has ended.
+        :returns: Dictionary with the job id, and the state and error if waiting.
+        """
+        return self._request(
+            {"op": "submit", "job": job, "wait": wait},
+            None if wait else self._timeout,
+        )
+
+    def status(self, job_id):
+        """
+        Returns the state of an upload.
+
+        :param job_id: Id of the job, as returned by :meth:`submit`.
+        :returns: Dictionary with the job id, state and error.
+        """
+        return self._request({"op": "status", "job_id": job_id}, self._timeout)
+
+    def shutdown(self):
+        """
+        Asks the daemon to stop.
+        """
+        return self._request({"op": "shutdown"}, self._timeout)
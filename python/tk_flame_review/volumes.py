@@ -0,0 +1,183 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import json
+import os
+import shutil
+import tempfile
+import time
+
+
+def estimate_output_size(bitrate, frame_count, fps):
+    """
+    Estimates the size of a movie.
+
+    :param bitrate: Bitrate of the movie, in bits per second.
+    :param frame_count: Number of frames in the movie.
+    :param fps: Frame rate of the movie.
+    :returns: Estimated size in bytes.
+    """
+    if not fps:
+        return 0
+    return int(bitrate / 8.0 * frame_count / fps)
+
+
+class TempVolumeSelector(object):
+    """
+    Picks the volume temporary movies are written to.
+
+    Volumes without enough free space for the expected output are discarded,
+    then the one with the best recently measured write throughput is chosen.
+    Throughput is measured by writing a small probe file and the results are
+    cached on disk so that each volume is only measured once per
+    :attr:`MEASUREMENT_TTL`.
+    """
+
+    # how long a throughput measurement remains valid, in seconds.
+    MEASUREMENT_TTL = 3600
+
+    # size of the probe file used to measure the write throughput.
+    PROBE_SIZE = 16 * 1024 * 1024
+
+    # safety margin applied to the estimated output size.
+    SPACE_MARGIN = 1.2
+
+    def __init__(self, cache_path, logger=None):
+        """
+        Constructor
+
+        :param cache_path: Path to the JSON file caching the throughput measurements.
+        :param logger: Optional callable used to log debug messages.
+        """
+        self._cache_path = cache_path
+        self._log = logger or (lambda msg: None)
+
+    def select(self, volumes, required_size):
+        """
+        Picks the volume to write temporary movies to.
+
+        :param volumes: List of candidate folders.
+        :param required_size: Expected size of the output, in bytes.
+        :returns: The selected folder. If no volume has enough free space, the
+                  one with the most free space is returned.
+        """
+        if len(volumes) == 1:
+            return volumes[0]
+
+        free_space = {}
+        for volume in volumes:
+            try:
+                free_space[volume] = shutil.disk_usage(volume).free
+            except OSError as e:
+                self._log("Ignoring temp volume '%s': %s" % (volume, e))
+
+        if not free_space:
+            # nothing usable, let the export fail on the first one with a clear error.
+            return volumes[0]
+
+        candidates = [
+            volume
+            for volume in volumes
+            if free_space.get(volume, 0) >= required_size * self.SPACE_MARGIN
+        ]
+        if not candidates:
+            volume = max(free_space, key=free_space.get)
+            self._log(
+                "No temp volume has the %d bytes required, using '%s' which has "
+                "the most free space." % (required_size, volume)
+            )
+            return volume
+
+        throughputs = self._get_throughputs(candidates)
+        volume = max(candidates, key=lambda v: throughputs.get(v, 0))
+        self._log(
+            "Selected temp volume '%s' (%d bytes free, %.1f MB/s)."
+            % (volume, free_space[volume], throughputs.get(volume, 0) / 1e6)
+        )
+        return volume
+
+    def _get_throughputs(self, volumes):
+        """
+        Returns the write throughput of volumes, measuring the ones without
+        a recent measurement.
+
+        :param volumes: List of folders.
+        :returns: Dictionary of throughputs in bytes per second, keyed by folder.
+        """
+        try:
+            with open(self._cache_path) as fh:
+                cache = json.load(fh)
+        except (IOError, ValueError):
+            cache = {}
+
+        now = time.time()
+        updated = False
+        for volume in volumes:
+            entry = cache.get(volume)
+            if entry and now - entry["measured_at"] < self.MEASUREMENT_TTL:
+                continue
+            throughput = self.measure(volume)
+            cache[volume] = {"throughput": throughput, "measured_at": now}
+            updated = True
+
+        if updated:
+            self._save_cache(cache)
+
+        return dict((volume, cache[volume]["throughput"]) for volume in volumes)
+
+    def measure(self, volume):
+        """
+        Measures the write throughput of a volume.
+
+        :param volume: Folder to measure.
+        :returns: Throughput in bytes per second, 0 if the volume can't be written to.
+        """
+        block = b"\0" * (1024 * 1024)
+        try:
+            fd, path = tempfile.mkstemp(prefix=".tk_flame_review_probe", dir=volume)
+        except OSError as e:
+            self._log("Cannot write to temp volume '%s': %s" % (volume, e))
+            return 0
+
+        try:
+            start = time.time()
+            with os.fdopen(fd, "wb") as fh:
+                for _ in range(self.PROBE_SIZE // len(block)):
+                    fh.write(block)
+                fh.flush()
+                os.fsync(fh.fileno())
+            elapsed = max(time.time() - start, 1e-6)
+        except OSError as e:
+            self._log("Cannot write to temp volume '%s': %s" % (volume, e))
+            return 0
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+        return self.PROBE_SIZE / elapsed
+
+    def _save_cache(self, cache):
+        """
+        Atomically writes the throughput measurements to disk.
+
+        :param cache: Dictionary of measurements keyed by folder.
+        """
+        folder = os.path.dirname(self._cache_path)
+        try:
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            fd, tmp_path = tempfile.mkstemp(dir=folder)
+            with os.fdopen(fd, "w") as fh:
+                json.dump(cache, fh)
+            os.replace(tmp_path, self._cache_path)
+        except OSError as e:
+            self._log("Could not save temp volume measurements: %s" % e)
@@ -0,0 +1,25 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Synthetic load for the app, without Flame or a site.
+
+The app still needs tk-core and a Qt binding to be importable. See
+:mod:`tk_flame_review_load.driver` for the command line entry point.
+"""
+
+from .fake_engine import (
+    FakeEngine,
+    FakeShotgun,
+    FakeSettingsHook,
+    create_app,
+    load_settings,
+)
+from .driver import Timeline, LoadDriver, format_report, percentile
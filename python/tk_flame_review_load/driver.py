@@ -0,0 +1,478 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Synthetic load driver for the Flame hooks of the app.
+
+A timeline description is turned into export sessions: preCustomExport, then
+preExportAsset and postExportAsset for every asset, then postCustomExport.
+They are fed to the callbacks the app registers with a fake engine, against
+an in memory site or an API cassette, and the latency of every callback and
+the time until every movie is uploaded are reported::
+
+    PYTHONPATH=/path/to/tk-core/python:/path/to/tk-flame-review/python \\
+        python -m tk_flame_review_load --assets 2000 --sequences 150 \\
+        --background-ratio 0.7 --sg-latency 0.02
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+
+from .fake_engine import (
+    FakeEngine,
+    FakeSettingsHook,
+    FakeShotgun,
+    create_app,
+    load_settings,
+)
+
+# Flame callbacks, in the order they are called
+CALLBACKS = ("preCustomExport", "preExportAsset", "postExportAsset", "postCustomExport")
+
+# first frame of the synthetic sequences, 10:00:00:00 at 24 fps
+FIRST_FRAME = 864000
+
+
+class Timeline(object):
+    """
+    Description of the exports to generate.
+    """
+
+    # names and default values of the parameters of a timeline
+    DEFAULTS = {
+        # number of export sessions
+        "sessions": 1,
+        # number of assets exported, spread over the sessions
+        "assets": 100,
+        # number of distinct sequences, assets of the same sequence are
+        # exported as successive versions
+        "sequences": 20,
+        # range of the durations of the assets, in seconds
+        "durations": [30, 1320],
+        # frame rate of the assets
+        "fps": 24,
+        # bitrate of the movies, in bits per second
+        "bitrate": 8000000,
+        # share of the assets rendered in the background
+        "background_ratio": 0.5,
+        # probability of a render failing to write its movie
+        "render_failure_rate": 0.0,
+        # probability of a call to the site failing with a transient error
+        "sg_failure_rate": 0.0,
+        # seconds each call to the site takes
+        "sg_latency": 0.0,
+        # upload bandwidth in bytes per second, 0 for instant uploads
+        "upload_bandwidth": 0,
+        # seed of the random choices
+        "seed": 0,
+    }
+
+    def __init__(self, **parameters):
+        """
+        Constructor
+
+        :param parameters: Values replacing the defaults in :attr:`DEFAULTS`.
+        """
+        unknown = set(parameters) - set(self.DEFAULTS)
+        if unknown:
+            raise ValueError(
+                "Unknown timeline parameters: %s" % ", ".join(sorted(unknown))
+            )
+        values = dict(self.DEFAULTS)
+        values.update(parameters)
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    def generate(self):
+        """
+        Generates the assets of the timeline.
+
+        :returns: List of sessions, each a list of assets. An asset is a
+                  dictionary with the Flame info of the asset and whether
+                  its render succeeds.
+        """
+        rng = random.Random(self.seed)
+        versions = {}
+        assets = []
+        for index in range(self.assets):
+            sequence = "seq%04d" % (index % self.sequences)
+            versions[sequence] = versions.get(sequence, 0) + 1
+            frames = max(1, int(rng.uniform(*self.durations) * self.fps))
+            name = "%s_v%03d" % (sequence, versions[sequence])
+            assets.append(
+                {
+                    "info": {
+                        "namePattern": "<name>",
+                        "resolvedPath": "%s.mov" % name,
+                        "name": name,
+                        "sequenceName": sequence,
+                        "shotName": "",
+                        "assetType": "movie",
+                        "isBackground": rng.random() < self.background_ratio,
+                        "backgroundJobId": "",
+                        "width": 1920,
+                        "height": 1080,
+                        "aspectRatio": 1.778,
+                        "depth": "8-bits",
+                        "scanFormat": "PROGRESSIVE",
+                        "fps": self.fps,
+                        "sequenceFps": self.fps,
+                        "sourceIn": FIRST_FRAME,
+                        "sourceOut": FIRST_FRAME + frames,
+                        "recordIn": FIRST_FRAME,
+                        "recordOut": FIRST_FRAME + frames,
+                        "track": "1",
+                        "trackName": "V1",
+                        "segmentIndex": 1,
+                        "versionName": "v%03d" % versions[sequence],
+                        "versionNumber": versions[sequence],
+                    },
+                    "size": int(self.bitrate * frames / float(self.fps) / 8),
+                    "render_fails": rng.random() < self.render_failure_rate,
+                }
+            )
+
+        per_session = -(-len(assets) // max(1, self.sessions))
+        return [
+            assets[start : start + per_session]
+            for start in range(0, len(assets), per_session)
+        ]
+
+
+def percentile(values, fraction):
+    """
+    Nearest rank percentile.
+
+    :param values: Sorted list of values.
+    :param fraction: Percentile, from 0 to 1.
+    :returns: The value or None if there are none.
+    """
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))
+    return values[index]
+
+
+def _summarize(values):
+    """
+    :returns: Dictionary with the count, mean and percentiles of durations.
+    """
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 0.5),
+        "p90": percentile(values, 0.9),
+        "p99": percentile(values, 0.99),
+        "max": values[-1] if values else None,
+    }
+
+
+def _render(path, size, fails):
+    """
+    Writes the movie of an asset, sparse so that its size costs nothing.
+    """
+    if fails:
+        return
+    with open(path, "wb") as fh:
+        fh.truncate(size)
+
+
+class LoadDriver(object):
+    """
+    Feeds the sessions of a timeline to the app and measures it.
+    """
+
+    def __init__(self, timeline, app_folder, work_folder, settings=None):
+        """
+        Constructor
+
+        :param timeline: :class:`Timeline` to play.
+        :param app_folder: Folder of the app, holding app.py and info.yml.
+        :param work_folder: Folder for the app cache and the rendered movies.
+        :param settings: Optional dictionary of app settings replacing the defaults.
+        """
+        self._timeline = timeline
+        temp_folder = os.path.join(work_folder, "renders")
+        if not os.path.isdir(temp_folder):
+            os.makedirs(temp_folder)
+        preset_path = os.path.join(work_folder, "QuickTime (H.264 720p 8Mbits).xml")
+        with open(preset_path, "w") as fh:
+            fh.write("<preset/>\n")
+
+        self.engine = FakeEngine()
+        self.sg = FakeShotgun(
+            latency=timeline.sg_latency,
+            failure_rate=timeline.sg_failure_rate,
+            bandwidth=timeline.upload_bandwidth,
+            seed=timeline.seed,
+        )
+        self.app = create_app(
+            app_folder,
+            self.engine,
+            self.sg,
+            load_settings(os.path.join(app_folder, "info.yml"), settings),
+            os.path.join(work_folder, "cache"),
+            FakeSettingsHook(preset_path, temp_folder, timeline.bitrate),
+        )
+        if self.app._uses_upload_daemon():
+            # Flame hosts the upload daemon in its interactive session, which
+            # the fake engine doesn't stand for.
+            self.app._start_upload_daemon()
+
+    def _wait_for_upload_daemon(self):
+        """
+        Waits until the upload daemon hosted by the app, if any, has processed
+        all the uploads handed over to it.
+        """
+        daemon = self.app._upload_daemon
+        while daemon is not None and daemon.is_running:
+            if not daemon.handle_request({"op": "ping"})["pending"]:
+                return
+            time.sleep(0.05)
+
+    def run(self):
+        """
+        Plays the timeline and waits for all the jobs to end.
+
+        :returns: Report dictionary, see :func:`format_report`.
+        """
+        callbacks = self.engine.callbacks
+        latencies = dict((name, []) for name in CALLBACKS)
+        exported = {}
+        failures = 0
+
+        def call(name, *args):
+            start = time.time()
+            try:
+                callbacks[name](*args)
+            finally:
+                latencies[name].append(time.time() - start)
+
+        start = time.time()
+        for index, assets in enumerate(self._timeline.generate()):
+            session_id = "load_%d_%d" % (os.getpid(), index)
+            session_info = {
+                "destinationHost": socket.gethostname(),
+                "destinationPath": "",
+                "presetPath": "",
+                "isBackground": True,
+                "abort": False,
+                "abortMessage": "",
+            }
+            call("preCustomExport", session_id, session_info)
+
+            for asset in assets:
+                info = dict(asset["info"])
+                info["destinationHost"] = session_info["destinationHost"]
+                info["destinationPath"] = session_info["destinationPath"]
+                call("preExportAsset", session_id, info)
+
+                path = os.path.join(info["destinationPath"], info["resolvedPath"])
+                if info["isBackground"]:
+                    info["backgroundJobId"] = str(
+                        self.engine.submit_job(
+                            "render",
+                            _render,
+                            {
+                                "path": path,
+                                "size": asset["size"],
+                                "fails": asset["render_fails"],
+                            },
+                        )
+                    )
+                else:
+                    _render(path, asset["size"], asset["render_fails"])
+
+                exported[path] = time.time()
+                try:
+                    call("postExportAsset", session_id, info)
+                except Exception as e:
+                    failures += 1
+                    logging.getLogger("tk_flame_review_load").warning(
+                        "postExportAsset failed for %s: %s" % (info["name"], e)
+                    )
+
+            call(
+                "postCustomExport",
+                session_id,
+                {
+                    "destinationHost": session_info["destinationHost"],
+                    "destinationPath": session_info["destinationPath"],
+                    "presetPath": session_info["presetPath"],
+                },
+            )
+        sessions_ended = time.time()
+
+        self.engine.wait_for_jobs()
+        self._wait_for_upload_daemon()
+        ended = time.time()
+        self.app.destroy_app()
+
+        # uploads handed over to the upload daemon end after their job.
+        reviewable = [
+            self.sg.uploaded[path] - exported_at
+            for (path, exported_at) in exported.items()
+            if path in self.sg.uploaded
+        ]
+        assets = self._timeline.assets
+        return {
+            "assets": assets,
+            "callback_failures": failures,
+            "callbacks": dict(
+                (name, _summarize(values)) for (name, values) in latencies.items()
+            ),
+            "sessions_seconds": sessions_ended - start,
+            "assets_per_second": assets / max(sessions_ended - start, 1e-9),
+            "uploads": len(exported),
+            "upload_failures": len(exported) - len(reviewable),
+            "uploads_per_second": len(reviewable) / max(ended - start, 1e-9),
+            "time_to_reviewable": _summarize(reviewable),
+            "site_calls": dict(self.sg.calls),
+        }
+
+
+def format_report(report):
+    """
+    Formats a report returned by :meth:`LoadDriver.run` as text.
+
+    :param report: Report dictionary.
+    :returns: Text of the report.
+    """
+
+    def ms(value):
+        return "-" if value is None else "%.1f" % (value * 1000)
+
+    lines = [
+        "%d assets in %.1fs: %.1f assets/s, %d failed callbacks"
+        % (
+            report["assets"],
+            report["sessions_seconds"],
+            report["assets_per_second"],
+            report["callback_failures"],
+        ),
+        "",
+        "%-20s %8s %10s %10s %10s %10s %10s"
+        % ("latency (ms)", "count", "mean", "p50", "p90", "p99", "max"),
+    ]
+    rows = [(name, report["callbacks"][name]) for name in CALLBACKS]
+    rows.append(("time to reviewable", report["time_to_reviewable"]))
+    for name, summary in rows:
+        lines.append(
+            "%-20s %8d %10s %10s %10s %10s %10s"
+            % (
+                name,
+                summary["count"],
+                ms(summary["mean"]),
+                ms(summary["p50"]),
+                ms(summary["p90"]),
+                ms(summary["p99"]),
+                ms(summary["max"]),
+            )
+        )
+    lines.extend(
+        [
+            "",
+            "%d uploads, %d failed, %.1f uploads/s"
+            % (
+                report["uploads"],
+                report["upload_failures"],
+                report["uploads_per_second"],
+            ),
+            "site calls: %s"
+            % ", ".join(
+                "%s %d" % (method, count)
+                for (method, count) in sorted(report["site_calls"].items())
+            ),
+        ]
+    )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """
+    Command line entry point.
+
+    :param argv: Arguments, defaults to the process arguments.
+    :returns: Exit code.
+    """
+    parser = argparse.ArgumentParser(
+        prog="tk_flame_review_load",
+        description="Drives the Flame hooks of the app with synthetic exports.",
+    )
+    parser.add_argument(
+        "--timeline", help="JSON file with the parameters of the timeline."
+    )
+    for name, default in sorted(Timeline.DEFAULTS.items()):
+        option = "--%s" % name.replace("_", "-")
+        if isinstance(default, list):
+            parser.add_argument(
+                option, type=float, nargs=2, metavar=("MIN", "MAX"), default=None
+            )
+        else:
+            parser.add_argument(option, type=type(default), default=None)
+    parser.add_argument(
+        "--setting",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="App setting, the value is parsed as JSON if possible.",
+    )
+    parser.add_argument(
+        "--work-dir", help="Folder for the app cache and the rendered movies."
+    )
+    parser.add_argument("--json", help="Also write the report to this JSON file.")
+    parser.add_argument("--verbose", action="store_true", help="Log the app debug.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.WARNING,
+        format="%(asctime)s %(levelname)s %(message)s",
+    )
+
+    parameters = {}
+    if args.timeline:
+        with open(args.timeline) as fh:
+            parameters.update(json.load(fh))
+    for name in Timeline.DEFAULTS:
+        value = getattr(args, name)
+        if value is not None:
+            parameters[name] = value
+
+    settings = {}
+    for setting in args.setting:
+        name, _, value = setting.partition("=")
+        try:
+            settings[name] = json.loads(value)
+        except ValueError:
+            settings[name] = value
+
+    app_folder = os.path.dirname(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    driver = LoadDriver(
+        Timeline(**parameters),
+        app_folder,
+        args.work_dir or tempfile.mkdtemp(prefix="tk_flame_review_load_"),
+        settings,
+    )
+    report = driver.run()
+    sys.stdout.write(format_report(report) + "\n")
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(report, fh, indent=2)
+    return 0
@@ -0,0 +1,458 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Stand-ins for the Flame engine, the site and the settings hook, providing
+only what the app uses, so that :class:`FlameReview` can be driven without
+Flame or a site.
+"""
+
+import copy
+import importlib
+import importlib.util
+import itertools
+import logging
+import os
+import queue
+import random
+import socket
+import sys
+import threading
+import time
+import uuid
+
+
+class FakeShotgun(object):
+    """
+    In memory Shotgun API connection, thread safe.
+
+    Calls wait for a simulated latency and can fail at random, before doing
+    anything, with a transient error.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, bandwidth=0.0, seed=None):
+        """
+        Constructor
+
+        :param latency: Seconds each call takes.
+        :param failure_rate: Probability of a call failing, from 0 to 1.
+        :param bandwidth: Upload bandwidth in bytes per second, 0 for instant uploads.
+        :param seed: Seed of the failures.
+        """
+        self._latency = latency
+        self._failure_rate = failure_rate
+        self._bandwidth = bandwidth
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._entities = {}
+        self._ids = itertools.count(1)
+        self.calls = {}
+        # time each file was uploaded at, by path
+        self.uploaded = {}
+
+    def _call(self, method):
+        """
+        Accounts for a call, waits for its latency and fails it at random.
+        """
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            failed = self._random.random() < self._failure_rate
+        if self._latency:
+            time.sleep(self._latency)
+        if failed:
+            raise ConnectionResetError("Simulated failure of %s." % method)
+
+    def _match(self, entity, filters, operator="all"):
+        """
+        :returns: True if an entity matches a list of filters.
+        """
+        results = []
+        for condition in filters:
+            if isinstance(condition, dict):
+                results.append(
+                    self._match(
+                        entity, condition["filters"], condition["filter_operator"]
+                    )
+                )
+                continue
+            field, relation, value = condition
+            actual = entity.get(field)
+            if isinstance(actual, dict) and isinstance(value, dict):
+                actual = (actual.get("type"), actual.get("id"))
+                value = (value.get("type"), value.get("id"))
+            if relation == "is":
+                results.append(actual == value)
+            elif relation == "in":
+                results.append(actual in value)
+            elif relation == "starts_with":
+                results.append(str(actual or "").startswith(value))
+            else:
+                raise ValueError("Unsupported filter relation '%s'." % relation)
+        return any(results) if operator == "any" else all(results)
+
+    def find(self, entity_type, filters, fields=None, order=None, limit=0, **kwargs):
+        self._call("find")
+        with self._lock:
+            entities = [
+                copy.deepcopy(entity)
+                for entity in self._entities.get(entity_type, {}).values()
+                if self._match(entity, filters)
+            ]
+        for sort in reversed(order or []):
+            entities.sort(
+                key=lambda entity: entity.get(sort["field_name"]),
+                reverse=sort.get("direction") == "desc",
+            )
+        return entities[:limit] if limit else entities
+
+    def find_one(self, entity_type, filters, fields=None, order=None, **kwargs):
+        entities = self.find(entity_type, filters, fields, order, limit=1)
+        return entities[0] if entities else None
+
+    def _create(self, entity_type, data):
+        entity = dict(data, type=entity_type, id=next(self._ids))
+        self._entities.setdefault(entity_type, {})[entity["id"]] = entity
+        return copy.deepcopy(entity)
+
+    def create(self, entity_type, data, return_fields=None):
+        self._call("create")
+        with self._lock:
+            return self._create(entity_type, data)
+
+    def update(self, entity_type, entity_id, data, **kwargs):
+        self._call("update")
+        with self._lock:
+            entity = self._entities[entity_type][entity_id]
+            entity.update(data)
+            return copy.deepcopy(entity)
+
+    def delete(self, entity_type, entity_id):
+        self._call("delete")
+        with self._lock:
+            return self._entities.get(entity_type, {}).pop(entity_id, None) is not None
+
+    def batch(self, requests):
+        self._call("batch")
+        results = []
+        with self._lock:
+            for request in requests:
+                if request["request_type"] == "create":
+                    results.append(
+                        self._create(request["entity_type"], request["data"])
+                    )
+                elif request["request_type"] == "delete":
+                    results.append(
+                        self._entities.get(request["entity_type"], {}).pop(
+                            request["entity_id"], None
+                        )
+                        is not None
+                    )
+                else:
+                    raise ValueError(
+                        "Unsupported batch request '%s'." % request["request_type"]
+                    )
+        return results
+
+    def upload(self, entity_type, entity_id, path, field_name=None, **kwargs):
+        self._call("upload")
+        if self._bandwidth:
+            time.sleep(os.path.getsize(path) / float(self._bandwidth))
+        with self._lock:
+            self.uploaded[path] = time.time()
+            return self._create(
+                "Attachment",
+                {"this_file": os.path.basename(path), "field_name": field_name},
+            )["id"]
+
+
+class FakeThumbnailGenerator(object):
+    """
+    Thumbnail generator of the engine, submitting empty backburner jobs.
+    """
+
+    def __init__(self, engine):
+        self._engine = engine
+
+    def generate(self, **kwargs):
+        pass
+
+    def finalize(self):
+        return self._engine.submit_job("thumbnail", None, {})
+
+
+class FakeEngine(object):
+    """
+    Flame engine running the backburner jobs of the app from a single
+    worker thread, in the order they are submitted, like a backburner
+    server with one slot. Background renders are submitted as jobs too, so
+    they always run before the jobs depending on them.
+    """
+
+    has_ui = False
+
+    def __init__(self, comments="Synthetic load"):
+        """
+        Constructor
+
+        :param comments: Review comments the submit dialog returns.
+        """
+        self.callbacks = {}
+        self.thumbnail_generator = FakeThumbnailGenerator(self)
+        self.jobs = []
+        self._comments = comments
+        self._job_ids = itertools.count(1)
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._work, name="fake-backburner")
+        self._worker.daemon = True
+        self._worker.start()
+
+    def register_export_hook(self, menu_caption, callbacks):
+        self.callbacks = callbacks
+
+    def get_server_hostname(self):
+        return socket.gethostname()
+
+    def show_modal(self, title, bundle, widget_class, *args, **kwargs):
+        from sgtk.platform.qt import QtGui
+
+        if title == "Submit for Review":
+            widget = type("FakeSubmitDialog", (object,), {})()
+            widget.get_comments = lambda: self._comments
+            return QtGui.QDialog.Accepted, widget
+        return QtGui.QDialog.Accepted, None
+
+    def create_local_backburner_job(
+        self, name, description, dependencies, instance, method_name, args, host=None
+    ):
+        return self.submit_job(name, getattr(instance, method_name), args)
+
+    def submit_job(self, name, method, args):
+        """
+        Queues a job.
+
+        :param name: Name of the job.
+        :param method: Callable run with the arguments as keywords, or None.
+        :param args: Dictionary of arguments.
+        :returns: Id of the job.
+        """
+        job = {
+            "id": next(self._job_ids),
+            "name": name,
+            "method": method,
+            "args": args,
+            "submitted": time.time(),
+            "started": None,
+            "ended": None,
+            "error": None,
+        }
+        self.jobs.append(job)
+        self._queue.put(job)
+        return job["id"]
+
+    def wait_for_jobs(self):
+        """
+        Waits until all the jobs submitted so far have run.
+        """
+        self._queue.join()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            job["started"] = time.time()
+            try:
+                if job["method"] is not None:
+                    job["method"](**job["args"])
+            except Exception as e:
+                job["error"] = str(e)
+            job["ended"] = time.time()
+            self._queue.task_done()
+
+
+class FakeSettingsHook(object):
+    """
+    Settings hook returning a fixed export preset and temp volume.
+    """
+
+    def __init__(self, preset_path, temp_folder, bitrate):
+        self._preset_path = preset_path
+        self._temp_folder = temp_folder
+        self._bitrate = bitrate
+
+    def get_export_preset(self):
+        return self._preset_path
+
+    def get_export_bitrate(self, preset_path):
+        return self._bitrate
+
+    def get_budget_export_preset(self, preset_path, max_bitrate):
+        return preset_path
+
+    def get_temp_volumes(self):
+        return [self._temp_folder]
+
+    def get_upload_deadline(self, info):
+        return None
+
+    def get_render_identity(self, info):
+        return None
+
+
+def _define_qt():
+    """
+    Populates sgtk.platform.qt with a Qt binding, as an engine does when it
+    starts, the dialogs of the app need it to be imported.
+    """
+    from sgtk.platform import qt
+
+    if getattr(qt.QtGui, "QDialog", None) is not None:
+        return
+    from sgtk.util.qt_importer import QtImporter
+
+    importer = QtImporter()
+    if importer.QtGui is None:
+        raise RuntimeError("The app can't be imported without PySide2 or PySide6.")
+    qt.QtCore = importer.QtCore
+    qt.QtGui = importer.QtGui
+
+
+def load_settings(info_path, overrides=None):
+    """
+    Reads the default values of the settings of the app.
+
+    :param info_path: Path to the info.yml of the app.
+    :param overrides: Optional dictionary of values replacing the defaults.
+    :returns: Dictionary of settings.
+    """
+    try:
+        import yaml
+    except ImportError:
+        from tank_vendor import yaml
+
+    with open(info_path) as fh:
+        configuration = yaml.safe_load(fh)["configuration"]
+    settings = dict(
+        (name, definition.get("default_value"))
+        for (name, definition) in configuration.items()
+    )
+    settings.update(overrides or {})
+    return settings
+
+
+def _load_bundle_package(python_folder):
+    """
+    Loads the python folder of the app the way tk-core does: as a package
+    named after a uid, without the folder on sys.path, so that imports which
+    only work from sys.path fail here as they would in Flame.
+
+    :param python_folder: Path to the python folder of the app.
+    :returns: Name of the package.
+    """
+    package_name = "tkimp%s" % uuid.uuid4().hex
+    spec = importlib.util.spec_from_file_location(
+        package_name,
+        os.path.join(python_folder, "__init__.py"),
+        submodule_search_locations=[python_folder],
+    )
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[package_name] = package
+
+    # the driver itself is usually run from the same folder.
+    python_folder = os.path.realpath(python_folder)
+    sys_path = list(sys.path)
+    sys.path[:] = [
+        path
+        for path in sys.path
+        if os.path.realpath(path or os.getcwd()) != python_folder
+    ]
+    try:
+        spec.loader.exec_module(package)
+    except Exception:
+        del sys.modules[package_name]
+        raise
+    finally:
+        sys.path[:] = sys_path
+    return package_name
+
+
+def create_app(app_folder, engine, sg, settings, cache_location, hook):
+    """
+    Creates and initializes a :class:`FlameReview` driven by fakes.
+
+    The toolkit bundle behind an app, i.e. its descriptor, environment and
+    hooks, isn't needed: the few bundle methods the app uses are provided
+    by the fakes instead.
+
+    :param app_folder: Folder of the app, holding app.py and info.yml.
+    :param engine: :class:`FakeEngine` the app registers its callbacks with.
+    :param sg: Connection returned by the shotgun property, e.g. :class:`FakeShotgun`.
+    :param settings: Dictionary of settings, see :func:`load_settings`.
+    :param cache_location: Folder the app keeps its state in.
+    :param hook: Object implementing the methods of the settings hook.
+    :returns: The initialized app.
+    """
+    _define_qt()
+    package_name = _load_bundle_package(os.path.join(app_folder, "python"))
+    spec = importlib.util.spec_from_file_location(
+        "tk_flame_review_app", os.path.join(app_folder, "app.py")
+    )
+    app_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app_module)
+
+    logger = logging.getLogger("tk_flame_review_load.app")
+    context = type("FakeContext", (object,), {})()
+    context.project = {"type": "Project", "id": 1, "name": "Synthetic load"}
+    context.user = {"type": "HumanUser", "id": 1, "name": "Synthetic load"}
+
+    class DrivenApp(app_module.FlameReview):
+        def __init__(self):
+            # Application.__init__ needs a toolkit bundle, see create_app.
+            pass
+
+        def __repr__(self):
+            return "<FlameReview driven by tk_flame_review_load>"
+
+        engine = property(lambda self: engine)
+        context = property(lambda self: context)
+        cache_location = property(lambda self: cache_location)
+
+        @property
+        def shotgun(self):
+            cassette = getattr(self, "_cassette", None)
+            if cassette is None or cassette.mode == "off":
+                return sg
+            return cassette.wrap(None if cassette.mode == "replay" else sg)
+
+        def get_setting(self, key, default=None):
+            return settings.get(key, default)
+
+        def import_module(self, name):
+            return sys.modules["%s.%s" % (package_name, name)]
+
+        def execute_hook_method(self, hook_name, method_name, **kwargs):
+            return getattr(hook, method_name)(**kwargs)
+
+        def log_debug(self, msg):
+            logger.debug(msg)
+
+        def log_info(self, msg):
+            logger.info(msg)
+
+        def log_warning(self, msg):
+            logger.warning(msg)
+
+        def log_error(self, msg):
+            logger.error(msg)
+
+        def log_metric(self, *args, **kwargs):
+            pass
+
+    app = DrivenApp()
+    app.init_app()
+    return app
@@ -0,0 +1,29 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Headless quicktime upload to Flow Production Tracking.
+
+This package only depends on the standard library and on the Shotgun API
+connection it is given, so that uploads can run without Qt, an engine or the
+rest of the app. See :mod:`tk_flame_review_upload.job` for the command line
+entry point.
+"""
+
+from .concurrency import ConcurrencyController
+from .retry import (
+    RetryPolicy,
+    CircuitOpenError,
+    RetryBudgetExceeded,
+    is_transient_error,
+)
+from .upload_progress import UploadProgress, remove_old_status_files
+from .uploader import upload, UploadError
+from .job import upload_quicktime
@@ -0,0 +1,192 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class ConcurrencyController(object):
+    """
+    Adapts the number of parts uploaded at the same time to the uplink,
+    additive increase, multiplicative decrease.
+
+    Parts are measured in rounds of as many parts as the current limit. The
+    limit is raised by one after a round faster than the previous one, and
+    halved when a part fails or takes much longer than usual, which is how a
+    congested link shows. The throughput of the last round is kept across a
+    decrease, so the limit is only raised again once the throughput improves
+    on it. Parts started before a decrease don't trigger another one, so that
+    a single congestion only halves the limit once, and don't count towards
+    the rounds measuring the new limit. The limit learned is stored in a
+    small JSON file so that the next upload from the host starts from it.
+    """
+
+    # factor applied to the limit on errors and latency spikes
+    DECREASE = 0.5
+
+    # relative throughput gain needed to raise the limit
+    IMPROVEMENT = 0.05
+
+    # a part is a latency spike if it takes this many times the average,
+    # for its size
+    SPIKE_FACTOR = 2.0
+
+    # weight of the latest part in the average latency
+    SMOOTHING = 0.3
+
+    def __init__(self, path, initial=4, minimum=1, maximum=16, logger=None):
+        """
+        Constructor
+
+        :param path: Path to the JSON file holding the limit learned.
+        :param initial: Limit used when nothing was learned yet.
+        :param minimum: Lowest limit.
+        :param maximum: Highest limit.
+        :param logger: Optional callable used to log debug messages.
+        """
+        self._path = path
+        self._minimum = max(1, minimum)
+        self._maximum = max(self._minimum, maximum)
+        self._log = logger or (lambda msg: None)
+        self._condition = threading.Condition()
+        self._latency = None
+        self._round = []
+        self._baseline = None
+        self._decreased_at = 0
+
+        try:
+            with open(self._path) as fh:
+                initial = json.load(fh)["limit"]
+        except (IOError, ValueError, KeyError):
+            pass
+        self._limit = self._clamp(initial)
+
+    @property
+    def limit(self):
+        """
+        Number of parts to upload at the same time.
+        """
+        return self._limit
+
+    @property
+    def maximum(self):
+        """
+        Highest limit, i.e. the number of upload threads to start.
+        """
+        return self._maximum
+
+    def _clamp(self, limit):
+        return min(self._maximum, max(self._minimum, int(limit)))
+
+    def _decrease(self, start, reason):
+        """
+        Halves the limit, unless the part which triggered it started before
+        the last decrease. Must be called with the condition held.
+        """
+        if start < self._decreased_at:
+            return
+        self._decreased_at = time.time()
+        self._set_limit(self._limit * self.DECREASE, reason)
+
+    def _set_limit(self, limit, reason):
+        """
+        Changes the limit and wakes up the threads waiting for a slot.
+        Must be called with the condition held.
+        """
+        limit = self._clamp(limit)
+        if limit != self._limit:
+            self._log("Upload concurrency %d -> %d (%s)" % (self._limit, limit, reason))
+            self._limit = limit
+            self._condition.notify_all()
+        self._round = []
+
+    def wait_for_slot(self, slot, timeout):
+        """
+        Waits until a thread is allowed to upload.
+
+        :param slot: Index of the thread, from 0 to :attr:`maximum` - 1.
+        :param timeout: Seconds to wait at most.
+        :returns: True if the thread can upload a part.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: slot < self._limit, timeout)
+
+    def record_part(self, size, start, end):
+        """
+        Records a part uploaded successfully.
+
+        :param size: Size of the part, in bytes.
+        :param start: Time the upload of the part started.
+        :param end: Time the upload of the part ended.
+        """
+        if size <= 0 or end <= start:
+            return
+        latency = (end - start) / size
+        with self._condition:
+            if (
+                self._latency is not None
+                and latency > self.SPIKE_FACTOR * self._latency
+            ):
+                self._latency = latency
+                self._decrease(start, "latency spike")
+                return
+            if self._latency is None:
+                self._latency = latency
+            else:
+                self._latency = (
+                    self.SMOOTHING * latency + (1 - self.SMOOTHING) * self._latency
+                )
+
+            if start < self._decreased_at:
+                # measures the limit before the decrease.
+                return
+            self._round.append((size, start, end))
+            if len(self._round) < self._limit:
+                return
+            throughput = sum(part[0] for part in self._round) / (
+                max(part[2] for part in self._round)
+                - min(part[1] for part in self._round)
+            )
+            improved = self._baseline is None or throughput > self._baseline * (
+                1 + self.IMPROVEMENT
+            )
+            self._baseline = throughput
+            if improved:
+                self._set_limit(self._limit + 1, "%.1f MB/s" % (throughput / 1000000.0))
+            else:
+                self._round = []
+
+    def record_error(self, start):
+        """
+        Records a failed attempt at uploading a part, including the ones the
+        Shotgun API retries on its own.
+
+        :param start: Time the upload of the part started.
+        """
+        with self._condition:
+            self._decrease(start, "upload error")
+
+    def save(self):
+        """
+        Stores the limit learned for the next uploads. Errors are logged.
+        """
+        try:
+            folder = os.path.dirname(self._path)
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            fd, tmp_path = tempfile.mkstemp(dir=folder)
+            with os.fdopen(fd, "w") as fh:
+                json.dump({"limit": self._limit}, fh)
+            os.replace(tmp_path, self._path)
+        except Exception as e:
+            self._log("Could not save upload concurrency: %s" % e)
@@ -0,0 +1,282 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Entry point uploading a quicktime to a Version without starting an engine.
+
+The only thing needed besides the file is a connection to Flow Production
+Tracking, built either from a toolkit user serialized in the
+``TK_FLAME_REVIEW_USER`` environment variable or from script credentials::
+
+    PYTHONPATH=/path/to/tk-flame-review/python python -m tk_flame_review_upload \\
+        --version-id 1234 --path /var/tmp/seq.mov --remove
+
+Use ``--benchmark-startup N`` to measure how long it takes for this entry point
+to be ready to upload.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from .concurrency import ConcurrencyController
+from .retry import RetryPolicy
+from .upload_progress import UploadProgress, remove_old_status_files
+from .uploader import upload
+
+# environment variable holding a user serialized with sgtk.authentication.serialize_user
+USER_ENV_VAR = "TK_FLAME_REVIEW_USER"
+
+# age in seconds after which status files of ended uploads are deleted
+STATUS_FILE_MAX_AGE = 24 * 3600
+
+
+def upload_quicktime(
+    sg,
+    version_id,
+    path,
+    field_name,
+    status_folder,
+    retry_policy=None,
+    part_size=None,
+    concurrency=1,
+    controller=None,
+    logger=None,
+):
+    """
+    Uploads a quicktime to a Version, publishing its progress to a status file.
+
+    :param sg: Shotgun API connection.
+    :param version_id: Id of the Version to upload to.
+    :param path: Path to the quicktime to upload.
+    :param field_name: Field to upload to, "sg_uploaded_movie" or "sg_uploaded_movie_mp4".
+    :param status_folder: Folder where the status file of the upload is written.
+    :param retry_policy: Optional :class:`RetryPolicy` used to retry the failed
+                         requests of the upload, e.g. failed parts of multipart
+                         uploads, on their own.
+    :param part_size: Size in bytes of the parts of multipart uploads, None for
+                      the Shotgun API default.
+    :param concurrency: Number of parts uploaded at the same time.
+    :param controller: Optional :class:`ConcurrencyController` adapting the
+                       number of parts uploaded at the same time. The limit it
+                       learns is saved once the upload ends.
+    :param logger: Optional callable used to log debug messages.
+    :returns: Time the upload took, in seconds.
+    """
+    log = logger or (lambda msg: None)
+
+    # publish the progress of the upload so that it can be followed from
+    # Flame or a shell without querying the site.
+    remove_old_status_files(status_folder, STATUS_FILE_MAX_AGE)
+    status_path = os.path.join(status_folder, "%s.json" % os.path.basename(path))
+    log("Upload progress is published to '%s'" % status_path)
+    progress = UploadProgress(status_path, os.path.getsize(path))
+
+    start_time = time.time()
+    try:
+        # the policy is applied to each request rather than to the whole
+        # upload, which would repeat the parts already sent and link the file
+        # again once uploaded.
+        upload(
+            sg,
+            "Version",
+            version_id,
+            path,
+            field_name,
+            progress,
+            part_size=part_size,
+            concurrency=concurrency,
+            retry=retry_policy.call if retry_policy is not None else None,
+            controller=controller,
+        )
+    finally:
+        if controller is not None:
+            controller.save()
+    return time.time() - start_time
+
+
+def connect(site=None, script_name=None, api_key=None):
+    """
+    Connects to Flow Production Tracking.
+
+    A toolkit user serialized in :data:`USER_ENV_VAR` is used if set, otherwise
+    the script credentials given.
+
+    :param site: Url of the site.
+    :param script_name: Name of the API script.
+    :param api_key: Key of the API script.
+    :returns: Shotgun API connection.
+    :raises ValueError: If no credentials were provided.
+    """
+    serialized_user = os.environ.get(USER_ENV_VAR)
+    if serialized_user:
+        # only imported when needed, tk-core is slow to import.
+        import sgtk
+
+        user = sgtk.authentication.deserialize_user(serialized_user)
+        return user.create_sg_connection()
+
+    if not (site and script_name and api_key):
+        raise ValueError(
+            "No credentials: set %s or provide a site, script name and key."
+            % USER_ENV_VAR
+        )
+    try:
+        import shotgun_api3
+    except ImportError:
+        from tank_vendor import shotgun_api3
+    return shotgun_api3.Shotgun(site, script_name=script_name, api_key=api_key)
+
+
+def benchmark_startup(runs, out=sys.stdout):
+    """
+    Measures how long a fresh interpreter takes to be ready to upload.
+
+    Each run starts a new interpreter importing this package, which is what
+    a job using this entry point pays before sending its first byte.
+
+    :param runs: Number of interpreters to start.
+    :param out: Stream to print the results to.
+    """
+    python_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [python_folder] + [p for p in [env.get("PYTHONPATH")] if p]
+    )
+    code = (
+        "import time; t = time.time(); import tk_flame_review_upload; "
+        "print(time.time() - t)"
+    )
+
+    totals = []
+    imports = []
+    for _ in range(runs):
+        start = time.time()
+        output = subprocess.check_output([sys.executable, "-c", code], env=env)
+        totals.append(time.time() - start)
+        imports.append(float(output))
+
+    for label, values in (("startup", totals), ("import", imports)):
+        values.sort()
+        out.write(
+            "%s: min %.1f ms, median %.1f ms, max %.1f ms over %d runs\n"
+            % (
+                label,
+                values[0] * 1000,
+                values[len(values) // 2] * 1000,
+                values[-1] * 1000,
+                len(values),
+            )
+        )
+
+
+def main(argv=None):
+    """
+    Command line entry point.
+
+    :param argv: Arguments, defaults to the process arguments.
+    :returns: Exit code.
+    """
+    parser = argparse.ArgumentParser(
+        prog="tk_flame_review_upload",
+        description="Uploads a quicktime to a Flow Production Tracking Version.",
+    )
+    parser.add_argument("--version-id", type=int, help="Id of the Version.")
+    parser.add_argument("--path", help="Quicktime to upload.")
+    parser.add_argument(
+        "--field",
+        default="sg_uploaded_movie",
+        help="Field to upload to, sg_uploaded_movie_mp4 bypasses transcoding.",
+    )
+    parser.add_argument(
+        "--status-folder",
+        default=os.path.join(os.path.expanduser("~"), ".tk_flame_review_upload"),
+        help="Folder where the upload progress is published.",
+    )
+    parser.add_argument(
+        "--part-size",
+        type=float,
+        metavar="MB",
+        help="Size of the parts of multipart uploads, in megabytes.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Number of parts uploaded at the same time.",
+    )
+    parser.add_argument(
+        "--adaptive-max",
+        type=int,
+        metavar="N",
+        help="Adapt the number of parts uploaded at the same time, up to N, "
+        "starting from the number learned by the previous uploads.",
+    )
+    parser.add_argument(
+        "--remove", action="store_true", help="Delete the quicktime once uploaded."
+    )
+    parser.add_argument("--site", default=os.environ.get("SHOTGUN_SITE"))
+    parser.add_argument("--script-name", default=os.environ.get("SHOTGUN_SCRIPT_NAME"))
+    parser.add_argument("--api-key", default=os.environ.get("SHOTGUN_SCRIPT_KEY"))
+    parser.add_argument(
+        "--benchmark-startup",
+        type=int,
+        metavar="RUNS",
+        help="Measure the startup time of this entry point instead of uploading.",
+    )
+    args = parser.parse_args(argv)
+
+    if args.benchmark_startup:
+        benchmark_startup(args.benchmark_startup)
+        return 0
+
+    if args.version_id is None or not args.path:
+        parser.error("--version-id and --path are required")
+    if not os.path.exists(args.path):
+        sys.stderr.write("Cannot find quicktime '%s'!\n" % args.path)
+        return 1
+
+    try:
+        sg = connect(args.site, args.script_name, args.api_key)
+    except ValueError as e:
+        sys.stderr.write("%s\n" % e)
+        return 1
+
+    def log(msg):
+        sys.stderr.write(msg + "\n")
+
+    controller = None
+    if args.adaptive_max:
+        controller = ConcurrencyController(
+            os.path.join(args.status_folder, "concurrency.json"),
+            initial=args.concurrency,
+            maximum=args.adaptive_max,
+            logger=log,
+        )
+
+    elapsed = upload_quicktime(
+        sg,
+        args.version_id,
+        args.path,
+        args.field,
+        args.status_folder,
+        retry_policy=RetryPolicy(logger=log),
+        part_size=int(args.part_size * 1000000) if args.part_size else None,
+        concurrency=args.concurrency,
+        controller=controller,
+    )
+    sys.stdout.write(
+        "Uploaded %s to Version %d in %.1fs.\n" % (args.path, args.version_id, elapsed)
+    )
+    if args.remove:
+        os.remove(args.path)
+    return 0
@@ -0,0 +1,330 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import errno
+import http.client
+import random
+import re
+import socket
+import ssl
+import threading
+import time
+import urllib.error
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised when a call is refused because the circuit breaker is open,
+    meaning the site has been failing repeatedly and should not be contacted.
+    """
+
+
+class RetryBudgetExceeded(Exception):
+    """
+    Raised when the retries allowed for the current session have been used up.
+    """
+
+
+# socket level errors which guarantee that the request never reached the server.
+# These are the only errors that are safe to retry for non idempotent calls.
+_CONNECT_ERRNOS = (
+    errno.ECONNREFUSED,
+    errno.EHOSTUNREACH,
+    errno.ENETUNREACH,
+    errno.ENETDOWN,
+)
+
+
+def is_connect_error(exception):
+    """
+    Checks if an exception was raised before the request could reach the server.
+
+    :param exception: Exception instance to classify.
+    :returns: True if the request was never sent.
+    """
+    if isinstance(exception, urllib.error.URLError) and isinstance(
+        exception.reason, Exception
+    ):
+        exception = exception.reason
+    if isinstance(exception, socket.gaierror):
+        return True
+    return isinstance(exception, OSError) and exception.errno in _CONNECT_ERRNOS
+
+
+# HTTP status codes of a server or a storage which is temporarily unavailable.
+_TRANSIENT_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# messages of the ShotgunError raised by the Shotgun API once its own retries
+# of a form post or of an upload to storage are exhausted, or when storage
+# answers with a server error.
+_TRANSIENT_SHOTGUN_ERRORS = re.compile(
+    r"^Max attempts limit reached\.|^Server encountered an internal error\."
+)
+_SHOTGUN_ERROR_STATUS = re.compile(r"Got a (\d{3}) response|HTTP Error (\d{3})")
+
+
+def _is_certificate_error(exception):
+    """
+    :returns: True if an exception is a failed verification of the site certificate,
+              which won't go away by retrying.
+    """
+    if isinstance(exception, urllib.error.URLError):
+        exception = exception.reason
+    return isinstance(exception, ssl.SSLCertVerificationError)
+
+
+def _is_transient_shotgun_error(exception):
+    """
+    Checks if a ShotgunError wraps a transient failure. The Shotgun API raises
+    it for failures of the storage uploads and form posts, inside the handler
+    of the original error when there is one.
+    """
+    if exception.__context__ is not None and is_transient_error(exception.__context__):
+        return True
+    message = str(exception)
+    if _TRANSIENT_SHOTGUN_ERRORS.search(message):
+        return True
+    match = _SHOTGUN_ERROR_STATUS.search(message)
+    if match is None:
+        return False
+    return int(match.group(1) or match.group(2)) in _TRANSIENT_STATUS_CODES
+
+
+def is_transient_error(exception):
+    """
+    Checks if an exception is a transient network or server error that
+    is worth retrying.
+
+    The Shotgun API exceptions are matched by name so that this module doesn't
+    depend on a particular copy of shotgun_api3.
+
+    :param exception: Exception instance to classify.
+    :returns: True if the call may succeed if tried again.
+    """
+    if is_connect_error(exception):
+        return True
+    if _is_certificate_error(exception):
+        return False
+    if isinstance(exception, urllib.error.HTTPError):
+        return exception.code in _TRANSIENT_STATUS_CODES
+    if isinstance(
+        exception,
+        (
+            ConnectionError,
+            TimeoutError,
+            socket.timeout,
+            ssl.SSLError,
+            http.client.HTTPException,
+            urllib.error.URLError,
+        ),
+    ):
+        return True
+    name = type(exception).__name__
+    if name == "ProtocolError":
+        return getattr(exception, "errcode", 0) in _TRANSIENT_STATUS_CODES
+    if name == "ShotgunError":
+        return _is_transient_shotgun_error(exception)
+    return False
+
+
+class CircuitBreaker(object):
+    """
+    Tracks consecutive failures against the site.
+
+    After ``threshold`` consecutive failures the breaker opens and all calls are
+    refused for ``cooldown`` seconds. Once the cooldown has elapsed a single
+    trial call is let through; its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, threshold, cooldown):
+        """
+        Constructor
+
+        :param threshold: Number of consecutive failures before opening.
+        :param cooldown: Seconds to stay open before allowing a trial call.
+        """
+        self._threshold = threshold
+        self._cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        """
+        True if calls are currently being refused.
+        """
+        with self._lock:
+            return self._opened_at is not None and (
+                time.time() - self._opened_at < self._cooldown
+            )
+
+    def allow(self):
+        """
+        Checks if a call may go through. When the cooldown has elapsed, the
+        breaker is moved to half-open and one trial call is allowed.
+
+        :returns: True if the call may be attempted.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.time() - self._opened_at < self._cooldown:
+                return False
+            # half-open: let this call through but re-open immediately so
+            # that concurrent callers keep failing fast until it succeeds.
+            self._opened_at = time.time()
+            return True
+
+    def record_success(self):
+        """
+        Records a successful call, closing the breaker.
+        """
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        """
+        Records a failed call, opening the breaker if the threshold is reached.
+        """
+        with self._lock:
+            self._failures += 1
+            if self._threshold and self._failures >= self._threshold:
+                self._opened_at = time.time()
+
+
+class RetryPolicy(object):
+    """
+    Central retry policy for calls made to the site.
+
+    Transient errors are retried with exponential backoff and full jitter. The
+    number of retries is capped both per call and per session, and repeated
+    failures trip a shared :class:`CircuitBreaker`.
+
+    Counters for attempts, retries and time spent waiting are kept in
+    :attr:`stats` so they can be reported alongside the other timings.
+    """
+
+    def __init__(
+        self,
+        max_attempts=5,
+        backoff_base=1.0,
+        backoff_max=30.0,
+        session_budget=20,
+        breaker_threshold=5,
+        breaker_cooldown=60.0,
+        logger=None,
+    ):
+        """
+        Constructor
+
+        :param max_attempts: Maximum number of attempts for a single call.
+        :param backoff_base: Base delay in seconds for the exponential backoff.
+        :param backoff_max: Upper bound in seconds for a single delay.
+        :param session_budget: Maximum number of retries for a session. 0 for unlimited.
+        :param breaker_threshold: Consecutive failures before the breaker opens. 0 to disable.
+        :param breaker_cooldown: Seconds the breaker stays open.
+        :param logger: Optional callable used to log debug messages.
+        """
+        self._max_attempts = max(1, max_attempts)
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        self._session_budget = session_budget
+        self._log = logger or (lambda msg: None)
+        self._lock = threading.Lock()
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self.reset_session()
+
+    def reset_session(self):
+        """
+        Resets the retry budget and the counters for a new session.
+        """
+        with self._lock:
+            self._budget_used = 0
+            self.stats = {"calls": 0, "attempts": 0, "retries": 0, "wait_time": 0.0}
+
+    def get_delay(self, attempt):
+        """
+        Computes the delay before the given retry attempt.
+
+        :param attempt: 1 based index of the retry.
+        :returns: Delay in seconds.
+        """
+        ceiling = min(self._backoff_max, self._backoff_base * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+    def call(self, func, *args, **kwargs):
+        """
+        Calls a function, retrying it on transient errors.
+
+        Calls that are not idempotent, such as entity creation, are only
+        retried when the request is known never to have reached the server.
+
+        :param func: Callable to execute.
+        :param idempotent: Keyword only. False if repeating a call which may have
+                           reached the server could have side effects. Defaults to True.
+        :param args: Positional arguments passed to the callable.
+        :param kwargs: Keyword arguments passed to the callable.
+        :returns: The return value of the callable.
+        :raises CircuitOpenError: If the breaker is open.
+        """
+        idempotent = kwargs.pop("idempotent", True)
+        classify = is_transient_error if idempotent else is_connect_error
+        name = getattr(func, "__name__", repr(func))
+
+        with self._lock:
+            self.stats["calls"] += 1
+
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError(
+                    "Refusing to call '%s': the site has been failing repeatedly."
+                    % name
+                )
+
+            attempt += 1
+            with self._lock:
+                self.stats["attempts"] += 1
+
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if not is_transient_error(e):
+                    # says nothing about the health of the site, e.g. a
+                    # request it rejected.
+                    raise
+                self.breaker.record_failure()
+                if not classify(e) or attempt >= self._max_attempts:
+                    raise
+                with self._lock:
+                    if (
+                        self._session_budget
+                        and self._budget_used >= self._session_budget
+                    ):
+                        raise RetryBudgetExceeded(
+                            "Retry budget of %d exhausted while calling '%s': %s"
+                            % (self._session_budget, name, e)
+                        ) from e
+                    self._budget_used += 1
+                    self.stats["retries"] += 1
+
+                delay = self.get_delay(attempt)
+                self._log(
+                    "Call to '%s' failed (%s), retrying in %.1fs (attempt %d of %d)..."
+                    % (name, e, delay, attempt + 1, self._max_attempts)
+                )
+                time.sleep(delay)
+                with self._lock:
+                    self.stats["wait_time"] += delay
+            else:
+                self.breaker.record_success()
+                return result
@@ -0,0 +1,232 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Progress reporting for quicktime uploads.
+
+Upload jobs publish their progress to a small JSON status file. This module only
+depends on the standard library so that it can also be run as a script to watch
+an upload from a shell::
+
+    python upload_progress.py /path/to/status.json
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+
+class UploadProgress(object):
+    """
+    Publishes the progress of an upload to a JSON status file.
+
+    :meth:`advance` is called for every block sent, so it only updates a
+    counter. The status file is rewritten at most every :attr:`REPORT_BYTES`
+    bytes and :attr:`REPORT_INTERVAL` seconds, which keeps the overhead
+    negligible even at very high throughputs. Parts uploaded in parallel can
+    report to the same instance.
+    """
+
+    # minimum number of bytes sent between two status updates
+    REPORT_BYTES = 8 * 1024 * 1024
+
+    # minimum number of seconds between two status updates
+    REPORT_INTERVAL = 0.5
+
+    def __init__(self, status_path, total):
+        """
+        Constructor
+
+        :param status_path: Path to the status file to write.
+        :param total: Total number of bytes to upload.
+        """
+        self._status_path = status_path
+        self._total = total
+        self._sent = 0
+        self._next_report = self.REPORT_BYTES
+        self._start_time = None
+        self._last_write = 0
+        self._lock = threading.Lock()
+
+    @property
+    def sent(self):
+        """
+        Number of bytes sent so far.
+        """
+        return self._sent
+
+    def start(self):
+        """
+        Records the start of the upload.
+        """
+        self._start_time = time.time()
+        self._sent = 0
+        self._next_report = self.REPORT_BYTES
+        self._write("uploading")
+
+    def advance(self, size):
+        """
+        Records that a block of data has been sent.
+
+        :param size: Number of bytes sent.
+        """
+        with self._lock:
+            self._sent += size
+            if self._sent < self._next_report:
+                return
+            self._next_report = self._sent + self.REPORT_BYTES
+            if time.time() - self._last_write >= self.REPORT_INTERVAL:
+                self._write("uploading")
+
+    def rewind(self, size):
+        """
+        Records that a block of data has to be sent again, e.g. after a failed part.
+
+        :param size: Number of bytes to discount.
+        """
+        with self._lock:
+            self._sent = max(0, self._sent - size)
+
+    def finish(self, error=None):
+        """
+        Records the end of the upload.
+
+        :param error: Description of the error if the upload failed.
+        """
+        if error is None:
+            self._sent = self._total
+            self._write("done")
+        else:
+            self._write("failed", error=str(error))
+
+    def _write(self, state, error=None):
+        """
+        Atomically writes the status file.
+
+        :param state: One of "uploading", "done" or "failed".
+        :param error: Optional error message.
+        """
+        now = time.time()
+        self._last_write = now
+        elapsed = now - (self._start_time or now)
+        throughput = self._sent / elapsed if elapsed > 0 else 0
+        if throughput and state == "uploading":
+            eta = (self._total - self._sent) / throughput
+        else:
+            eta = None
+
+        status = {
+            "state": state,
+            "total": self._total,
+            "sent": self._sent,
+            "throughput": throughput,
+            "eta": eta,
+            "error": error,
+            "pid": os.getpid(),
+            "updated_at": now,
+        }
+
+        folder = os.path.dirname(self._status_path)
+        try:
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            fd, tmp_path = tempfile.mkstemp(dir=folder)
+            with os.fdopen(fd, "w") as fh:
+                json.dump(status, fh)
+            os.replace(tmp_path, self._status_path)
+        except OSError:
+            # progress is informative only, never fail an upload because of it.
+            pass
+
+
+def read_status(status_path):
+    """
+    Reads an upload status file.
+
+    :param status_path: Path to the status file.
+    :returns: Status dictionary or None if it can't be read.
+    """
+    try:
+        with open(status_path) as fh:
+            return json.load(fh)
+    except (IOError, ValueError):
+        return None
+
+
+def remove_old_status_files(folder, max_age):
+    """
+    Deletes status files of uploads which ended a while ago.
+
+    :param folder: Folder containing the status files.
+    :param max_age: Age in seconds after which status files are deleted.
+    """
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return
+    now = time.time()
+    for name in names:
+        path = os.path.join(folder, name)
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def format_status(status):
+    """
+    Formats a status as a single line of text.
+
+    :param status: Status dictionary, as returned by :func:`read_status`.
+    :returns: Human readable description.
+    """
+    total = status["total"] or 1
+    line = "%s: %.1f%% of %.1f MB at %.1f MB/s" % (
+        status["state"],
+        100.0 * status["sent"] / total,
+        status["total"] / 1e6,
+        status["throughput"] / 1e6,
+    )
+    if status["eta"] is not None:
+        line += ", %ds left" % status["eta"]
+    if status["error"]:
+        line += " (%s)" % status["error"]
+    return line
+
+
+def watch(status_path, interval=1.0, out=sys.stdout):
+    """
+    Prints the progress of an upload until it ends.
+
+    :param status_path: Path to the status file.
+    :param interval: Seconds between two reads of the status file.
+    :param out: Stream to print to.
+    """
+    while True:
+        status = read_status(status_path)
+        if status is None:
+            out.write("waiting for upload to start...\n")
+        else:
+            out.write(format_status(status) + "\n")
+            if status["state"] != "uploading":
+                return
+        out.flush()
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.stderr.write("usage: %s STATUS_FILE\n" % sys.argv[0])
+        sys.exit(1)
+    watch(sys.argv[1])
@@ -0,0 +1,417 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Quicktime upload to Flow Production Tracking with progress reporting.
+
+Uploads to cloud storage are driven step by step, mirroring what
+``Shotgun.upload`` does internally, so that the data sent can be observed and
+streamed from disk through a fixed size buffer instead of being loaded in memory.
+Sites or API versions which don't support this fall back to ``Shotgun.upload``.
+"""
+
+import mimetypes
+import os
+import queue
+import threading
+import time
+import urllib.parse
+
+
+class UploadError(Exception):
+    """
+    Raised when the site rejects an upload.
+    """
+
+
+# Shotgun methods the step by step upload relies on
+_STORAGE_UPLOAD_METHODS = (
+    "_requires_direct_s3_upload",
+    "_get_attachment_upload_info",
+    "_get_upload_part_link",
+    "_upload_data_to_storage",
+    "_complete_multipart_upload",
+    "_send_form",
+    "_auth_params",
+)
+
+# size of the buffer files are streamed from disk with
+BUFFER_SIZE = 1024 * 1024
+
+# limits of multipart uploads to cloud storage
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+class FileRange(object):
+    """
+    Iterable streaming a range of a file from disk, reporting progress.
+
+    Data is read into a buffer provided by the caller and yielded as views on
+    it, so memory use doesn't depend on the size of the file. Each view is
+    only valid until the next one is requested, which is how the HTTP client
+    consumes them.
+
+    Every iteration starts over from the beginning of the range. A request
+    retried by the Shotgun API therefore sends the whole range again, and the
+    bytes sent by the failed attempt are discounted from the progress. This
+    is also how the retries the Shotgun API makes on its own can be observed.
+    """
+
+    def __init__(self, fh, offset, length, buffer, progress, on_retry=None):
+        """
+        Constructor
+
+        :param fh: File object opened in binary mode.
+        :param offset: Position of the range in the file.
+        :param length: Size of the range.
+        :param buffer: Writable buffer, e.g. a bytearray, to read the data into.
+        :param progress: :class:`UploadProgress` to report to.
+        :param on_retry: Optional callable accepting the start time of a
+                         failed attempt, called when the range is sent again.
+        """
+        self._fh = fh
+        self._offset = offset
+        self._length = length
+        self._view = memoryview(buffer)
+        self._progress = progress
+        self._on_retry = on_retry
+        self._sent = 0
+        self.started = None
+
+    def __iter__(self):
+        if self.started is not None and self._on_retry is not None:
+            self._on_retry(self.started)
+        self.started = time.time()
+        if self._sent:
+            self._progress.rewind(self._sent)
+            self._sent = 0
+        self._fh.seek(self._offset)
+        remaining = self._length
+        while remaining > 0:
+            size = self._fh.readinto(self._view[: min(remaining, len(self._view))])
+            if not size:
+                raise UploadError(
+                    "'%s' is shorter than expected." % getattr(self._fh, "name", "")
+                )
+            remaining -= size
+            yield self._view[:size]
+            self._sent += size
+            self._progress.advance(size)
+
+
+def supports_storage_upload(sg, entity_type, field_name):
+    """
+    Checks if a file can be uploaded step by step to cloud storage.
+
+    :param sg: Shotgun API connection.
+    :param entity_type: Type of the entity to upload to.
+    :param field_name: Field to upload to.
+    :returns: True if :func:`upload` can report progress for this upload.
+    """
+    if not all(hasattr(sg, name) for name in _STORAGE_UPLOAD_METHODS):
+        return False
+    return sg._requires_direct_s3_upload(entity_type, field_name)
+
+
+def upload(
+    sg,
+    entity_type,
+    entity_id,
+    path,
+    field_name,
+    progress,
+    part_size=None,
+    concurrency=1,
+    retry=None,
+    controller=None,
+):
+    """
+    Uploads a file to an entity field, reporting progress.
+
+    :param sg: Shotgun API connection.
+    :param entity_type: Type of the entity to upload to.
+    :param entity_id: Id of the entity to upload to.
+    :param path: Path to the file to upload.
+    :param field_name: Field to upload to.
+    :param progress: :class:`UploadProgress` to report to.
+    :param part_size: Size in bytes of the parts of multipart uploads. Defaults
+                      to the size used by the Shotgun API.
+    :param concurrency: Number of parts uploaded at the same time.
+    :param retry: Optional callable, e.g. :meth:`RetryPolicy.call`, through which
+                  each request of the upload is made so that failed parts are
+                  retried on their own. Requests which can't safely be
+                  repeated, like linking the uploaded file, are made with
+                  ``idempotent=False``.
+    :param controller: Optional :class:`ConcurrencyController` adapting the
+                       number of parts uploaded at the same time, in which
+                       case concurrency is ignored.
+    :returns: Id of the Attachment created.
+    """
+    retry = retry or _call
+    progress.start()
+    try:
+        if supports_storage_upload(sg, entity_type, field_name):
+            attachment_id = _upload_to_storage(
+                sg,
+                entity_type,
+                entity_id,
+                path,
+                field_name,
+                progress,
+                part_size or sg._MULTIPART_UPLOAD_CHUNK_SIZE,
+                max(1, concurrency),
+                retry,
+                controller,
+            )
+        else:
+            attachment_id = retry(
+                sg.upload, entity_type, entity_id, path, field_name, idempotent=False
+            )
+    except Exception as e:
+        progress.finish(error=e)
+        raise
+    progress.finish()
+    return attachment_id
+
+
+def _call(func, *args, **kwargs):
+    """
+    Calls a function once, the retry callable used when none is given.
+    """
+    kwargs.pop("idempotent", None)
+    return func(*args, **kwargs)
+
+
+def get_part_size(file_size, part_size):
+    """
+    Adjusts a part size to the limits of cloud storage multipart uploads.
+
+    :param file_size: Size of the file to upload.
+    :param part_size: Requested part size.
+    :returns: Part size to use, in bytes.
+    """
+    part_size = max(part_size, MIN_PART_SIZE)
+    # round up so that the file fits in the maximum number of parts.
+    return max(part_size, -(-file_size // MAX_PARTS))
+
+
+def _upload_to_storage(
+    sg,
+    entity_type,
+    entity_id,
+    path,
+    field_name,
+    progress,
+    part_size,
+    concurrency,
+    retry,
+    controller=None,
+):
+    """
+    Uploads a file to cloud storage and links it to an entity field.
+
+    :param sg: Shotgun API connection.
+    :param entity_type: Type of the entity to upload to.
+    :param entity_id: Id of the entity to upload to.
+    :param path: Path to the file to upload.
+    :param field_name: Field to upload to.
+    :param progress: :class:`UploadProgress` to report to.
+    :param part_size: Size in bytes of the parts of multipart uploads.
+    :param concurrency: Number of parts uploaded at the same time.
+    :param retry: Callable through which each request is made.
+    :param controller: Optional :class:`ConcurrencyController`.
+    :returns: Id of the Attachment created.
+    """
+    filename = os.path.basename(path)
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    file_size = os.path.getsize(path)
+    part_size = get_part_size(file_size, part_size)
+    is_multipart_upload = file_size > part_size
+
+    upload_info = retry(
+        sg._get_attachment_upload_info, False, filename, is_multipart_upload
+    )
+
+    if is_multipart_upload:
+        etags = _upload_parts(
+            sg,
+            upload_info,
+            path,
+            content_type,
+            file_size,
+            part_size,
+            concurrency,
+            progress,
+            retry,
+            controller,
+        )
+        retry(
+            sg._complete_multipart_upload,
+            upload_info,
+            filename,
+            etags,
+            idempotent=False,
+        )
+    else:
+        buffer = bytearray(min(BUFFER_SIZE, max(file_size, 1)))
+        with open(path, "rb") as fh:
+            retry(
+                sg._upload_data_to_storage,
+                FileRange(fh, 0, file_size, buffer, progress),
+                content_type,
+                file_size,
+                upload_info["upload_url"],
+            )
+
+    # linking twice would create two Attachments.
+    return retry(
+        _link_upload,
+        sg,
+        entity_type,
+        entity_id,
+        field_name,
+        filename,
+        upload_info,
+        idempotent=False,
+    )
+
+
+def _upload_parts(
+    sg,
+    upload_info,
+    path,
+    content_type,
+    file_size,
+    part_size,
+    concurrency,
+    progress,
+    retry,
+    controller=None,
+):
+    """
+    Uploads the parts of a multipart upload from parallel threads.
+
+    Each thread streams its parts from its own file handle and buffer, so
+    memory use only depends on the concurrency. The first part to fail for
+    good stops the upload.
+
+    With a controller, as many threads as its maximum are started but only
+    the ones below its current limit upload parts, the others wait for the
+    limit to be raised.
+
+    :param sg: Shotgun API connection.
+    :param upload_info: Upload details returned by the site.
+    :param path: Path to the file to upload.
+    :param content_type: Content type of the file.
+    :param file_size: Size of the file.
+    :param part_size: Size of the parts.
+    :param concurrency: Number of parts uploaded at the same time.
+    :param progress: :class:`UploadProgress` to report to.
+    :param retry: Callable through which each part is uploaded.
+    :param controller: Optional :class:`ConcurrencyController`.
+    :returns: List of the etags of the parts, in order.
+    """
+    filename = os.path.basename(path)
+    offsets = list(range(0, file_size, part_size))
+    etags = [None] * len(offsets)
+    errors = []
+    parts = queue.Queue()
+    for index in range(len(offsets)):
+        parts.put(index)
+
+    def upload_part(fh, buffer, index):
+        part_url = sg._get_upload_part_link(upload_info, filename, index + 1)
+        length = min(part_size, file_size - offsets[index])
+        start = time.time()
+        # the Shotgun API retries failed parts on its own before giving up,
+        # the controller is told about every failed attempt.
+        part = FileRange(
+            fh,
+            offsets[index],
+            length,
+            buffer,
+            progress,
+            on_retry=controller.record_error if controller is not None else None,
+        )
+        try:
+            etag = sg._upload_data_to_storage(part, content_type, length, part_url)
+        except Exception:
+            if controller is not None:
+                controller.record_error(part.started or start)
+            raise
+        if controller is not None:
+            # only the attempt which succeeded tells how fast the link is.
+            controller.record_part(length, part.started or start, time.time())
+        return etag
+
+    def work(slot):
+        buffer = bytearray(BUFFER_SIZE)
+        with open(path, "rb") as fh:
+            while not errors:
+                if controller is not None and not controller.wait_for_slot(slot, 1.0):
+                    if parts.empty():
+                        return
+                    continue
+                try:
+                    index = parts.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    etags[index] = retry(upload_part, fh, buffer, index)
+                except Exception as e:
+                    errors.append(e)
+
+    if controller is not None:
+        concurrency = controller.maximum
+    threads = []
+    for slot in range(min(concurrency, len(offsets))):
+        thread = threading.Thread(
+            target=work, args=(slot,), name="tk-flame-review-upload-part"
+        )
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return etags
+
+
+def _link_upload(sg, entity_type, entity_id, field_name, filename, upload_info):
+    """
+    Creates the Attachment for a file uploaded to cloud storage.
+
+    :param sg: Shotgun API connection.
+    :param entity_type: Type of the entity to link to.
+    :param entity_id: Id of the entity to link to.
+    :param field_name: Field to link to.
+    :param filename: Display name of the file.
+    :param upload_info: Upload details returned by the site.
+    :returns: Id of the Attachment created.
+    """
+    url = urllib.parse.urlunparse(
+        (sg.config.scheme, sg.config.server, "/upload/api_link_file", None, None, None)
+    )
+    params = {
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "upload_link_info": upload_info["upload_info"],
+        "field_name": field_name,
+        "display_name": filename,
+    }
+    params.update(sg._auth_params())
+
+    result = sg._send_form(url, params)
+    if not result.startswith("1"):
+        raise UploadError("Could not link uploaded file '%s': %s" % (filename, result))
+    return int(result.split(":", 2)[1].split("\n", 1)[0])
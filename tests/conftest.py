@@ -0,0 +1,31 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Makes the packages of the app importable from the tests.
+
+tk_flame_review_upload only needs the standard library. The package
+tk_flame_review imports the dialogs, which need an engine and Qt, so its
+modules which don't are imported without running the package ``__init__``.
+"""
+
+import os
+import sys
+import types
+
+PYTHON_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "python")
+
+if PYTHON_FOLDER not in sys.path:
+    sys.path.insert(0, PYTHON_FOLDER)
+
+if "tk_flame_review" not in sys.modules:
+    package = types.ModuleType("tk_flame_review")
+    package.__path__ = [os.path.join(PYTHON_FOLDER, "tk_flame_review")]
+    sys.modules["tk_flame_review"] = package
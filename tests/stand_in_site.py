@@ -0,0 +1,116 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Local stand-in for a site storing uploads in cloud storage.
+
+:class:`StandInSite` implements the Shotgun API methods the step by step
+upload of :mod:`tk_flame_review_upload.uploader` relies on. Data sent to
+storage is consumed the way the HTTP client does, block by block, and
+discarded, so that files of any size can be uploaded.
+"""
+
+import threading
+import time
+
+
+class StandInConfig(object):
+    scheme = "https"
+    server = "stand-in.shotgunstudio.com"
+
+
+class StandInSite(object):
+    """
+    Stand-in for a Shotgun API connection to a site using cloud storage.
+
+    Failures can be scripted per storage url: each call to
+    :meth:`_upload_data_to_storage` for an url pops and raises the next
+    exception listed for it in :attr:`failures`. Linking the file pops from
+    :attr:`link_failures` the same way. :attr:`internal_retries` sets how
+    many attempts at an url fail after the first block and are retried
+    without raising, like the Shotgun API does on server errors.
+    """
+
+    _MULTIPART_UPLOAD_CHUNK_SIZE = 20000000
+
+    def __init__(self, bandwidth=None):
+        """
+        Constructor
+
+        :param bandwidth: Optional bytes per second each request is limited to.
+        """
+        self.config = StandInConfig()
+        self.bandwidth = bandwidth
+        self.failures = {}
+        self.link_failures = []
+        self.internal_retries = {}
+        self.received = {}
+        self.completed = None
+        self.links = 0
+        self._lock = threading.Lock()
+
+    def _requires_direct_s3_upload(self, entity_type, field_name):
+        return True
+
+    def _get_attachment_upload_info(self, is_thumbnail, filename, is_multipart):
+        return {
+            "upload_url": "https://storage.example.com/%s" % filename,
+            "upload_info": {"upload_type": "Amazon", "filename": filename},
+        }
+
+    def _get_upload_part_link(self, upload_info, filename, part_number):
+        return "https://storage.example.com/%s?part=%d" % (filename, part_number)
+
+    def _upload_data_to_storage(self, data, content_type, size, storage_url):
+        with self._lock:
+            failures = self.failures.get(storage_url)
+            if failures:
+                raise failures.pop(0)
+            retries = self.internal_retries.pop(storage_url, 0)
+
+        for _ in range(retries):
+            for block in data:
+                break
+
+        received = 0
+        start = time.time()
+        for block in data:
+            received += len(block)
+            if self.bandwidth:
+                delay = start + received / float(self.bandwidth) - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+        if received != size:
+            raise ValueError("Received %d bytes instead of %d" % (received, size))
+
+        with self._lock:
+            self.received[storage_url] = received
+        return "etag-%s" % storage_url
+
+    def _complete_multipart_upload(self, upload_info, filename, etags):
+        self.completed = list(etags)
+
+    def _auth_params(self):
+        return {"script_name": "script", "script_key": "key"}
+
+    def _send_form(self, url, params):
+        with self._lock:
+            self.links += 1
+            if self.link_failures:
+                raise self.link_failures.pop(0)
+        return "1:123\n"
+
+    @property
+    def bytes_received(self):
+        """
+        Total number of bytes successfully sent to storage.
+        """
+        with self._lock:
+            return sum(self.received.values())
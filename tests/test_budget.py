@@ -0,0 +1,104 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+
+import pytest
+
+from tk_flame_review.budget import (
+    derive_preset,
+    find_preset_for_bitrate,
+    get_preset_resolution,
+)
+
+
+def _preset(folder, name, content="<preset><bitrate>20</bitrate></preset>"):
+    path = os.path.join(str(folder), name)
+    with open(path, "w") as fh:
+        fh.write(content)
+    return path
+
+
+def test_resolution_from_settings(tmp_path):
+    path = _preset(
+        tmp_path,
+        "custom.xml",
+        "<preset><width>2048</width><height>858</height></preset>",
+    )
+    assert get_preset_resolution(path) == (2048, 858)
+
+
+def test_resolution_from_name(tmp_path):
+    assert get_preset_resolution(
+        _preset(tmp_path, "QuickTime (H.264 720p 8Mbits).xml")
+    ) == (None, 720)
+    assert get_preset_resolution(_preset(tmp_path, "custom.xml")) is None
+
+
+def test_keeps_the_resolution(tmp_path):
+    source = _preset(tmp_path, "QuickTime (H.264 1080p 20Mbits).xml")
+    _preset(tmp_path, "QuickTime (H.264 720p 8Mbits).xml")
+    _preset(tmp_path, "QuickTime (H.264 1080p 5Mbits).xml")
+    _preset(tmp_path, "QuickTime (H.264 1080p 3Mbits).xml")
+    assert find_preset_for_bitrate(source, 10000000) == os.path.join(
+        str(tmp_path), "QuickTime (H.264 1080p 5Mbits).xml"
+    )
+
+
+def test_no_preset_at_the_resolution(tmp_path):
+    source = _preset(tmp_path, "QuickTime (H.264 1080p 20Mbits).xml")
+    _preset(tmp_path, "QuickTime (H.264 720p 8Mbits).xml")
+    assert find_preset_for_bitrate(source, 10000000) is None
+
+
+def test_unknown_resolution(tmp_path):
+    source = _preset(tmp_path, "Studio review.xml")
+    _preset(tmp_path, "QuickTime (H.264 720p 8Mbits).xml")
+    assert find_preset_for_bitrate(source, 10000000) is None
+
+
+def test_derived_preset_only_changes_the_bitrate(tmp_path):
+    source = _preset(
+        tmp_path,
+        "Studio review 20Mbits.xml",
+        "<preset><width>1920</width><height>1080</height>"
+        "<bitrate>20</bitrate></preset>",
+    )
+    derived = derive_preset(source, 5000000, str(tmp_path / "derived"), "Mbps")
+    assert os.path.basename(derived).startswith("Studio review 5Mbits.")
+    assert get_preset_resolution(derived) == (1920, 1080)
+    with open(derived) as fh:
+        assert "<bitrate>5</bitrate>" in fh.read()
+
+
+def test_derived_preset_uses_the_unit_of_the_setting(tmp_path):
+    for unit, base, derived_value in (
+        ("bps", "20000000", "2500000"),
+        ("kbps", "20000", "2500"),
+        ("Mbps", "20", "2.5"),
+        # 8000 could be megabits as well, the value alone doesn't tell.
+        ("kbps", "8000", "2500"),
+    ):
+        source = _preset(
+            tmp_path, "review.xml", "<preset><bitrate>%s</bitrate></preset>" % base
+        )
+        derived = derive_preset(source, 2500000, str(tmp_path / unit), unit)
+        with open(derived) as fh:
+            assert "<bitrate>%s</bitrate>" % derived_value in fh.read()
+
+
+def test_derived_preset_validates_the_unit(tmp_path):
+    source = _preset(tmp_path, "review.xml")
+    with pytest.raises(ValueError):
+        derive_preset(source, 5000000, str(tmp_path / "derived"), "Mbits")
+    # 20 bits per second is not a movie bitrate.
+    with pytest.raises(ValueError):
+        derive_preset(source, 5000000, str(tmp_path / "derived"), "bps")
+    assert not os.path.exists(str(tmp_path / "derived"))
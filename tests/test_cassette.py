@@ -0,0 +1,130 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import datetime
+import time
+
+import pytest
+
+from tk_flame_review.cassette import OFF, RECORD, REPLAY, Cassette, CassetteError
+from tk_flame_review_upload import is_transient_error
+
+PROJECT = {"type": "Project", "id": 1}
+
+
+class ShotgunError(Exception):
+    """
+    Stands for the exception of the same name of the Shotgun API.
+    """
+
+
+class Site(object):
+    """
+    Connection answering a few calls, some of them slowly.
+    """
+
+    base_url = "https://example.shotgunstudio.com"
+
+    def __init__(self):
+        self.versions = 0
+
+    def find_one(self, entity_type, filters, fields=None):
+        return {
+            "type": entity_type,
+            "id": 1,
+            "created_at": datetime.datetime(2024, 5, 1, 12, 30),
+        }
+
+    def create(self, entity_type, data):
+        time.sleep(0.05)
+        self.versions += 1
+        return dict(data, type=entity_type, id=self.versions)
+
+    def upload(self, entity_type, entity_id, path, field_name):
+        raise ShotgunError("Max attempts limit reached.")
+
+
+def _record_session(sg):
+    """
+    Makes the calls of a short submission.
+
+    :returns: The responses, and the error of the upload.
+    """
+    responses = [
+        sg.find_one(
+            "Sequence", [["code", "is", "seq_010"], ["project", "is", PROJECT]]
+        ),
+        sg.create("Version", {"code": "seq_010", "project": PROJECT}),
+        sg.create("Version", {"code": "seq_010", "project": PROJECT}),
+    ]
+    with pytest.raises(Exception) as info:
+        sg.upload("Version", 2, "/var/tmp/seq_010.%d.mov" % id(sg), "sg_uploaded_movie")
+    return responses, info.value
+
+
+def test_record_and_replay(tmp_path):
+    path = str(tmp_path / "session.jsonl")
+    site = Site()
+    recorded, recorded_error = _record_session(Cassette(path, RECORD).wrap(site))
+
+    replayed, replayed_error = _record_session(
+        Cassette(path, REPLAY, latency_scale=0).wrap(None)
+    )
+
+    assert replayed == recorded
+    assert replayed[0]["created_at"] == datetime.datetime(2024, 5, 1, 12, 30)
+    # identical calls get their responses in the order they were recorded.
+    assert [version["id"] for version in replayed[1:]] == [1, 2]
+    # the upload path differs, the upload is matched on its method alone.
+    assert type(replayed_error).__name__ == "ShotgunError"
+    assert str(replayed_error) == str(recorded_error)
+    assert is_transient_error(replayed_error)
+
+
+def test_replay_keeps_the_recorded_latency(tmp_path):
+    path = str(tmp_path / "session.jsonl")
+    _record_session(Cassette(path, RECORD).wrap(Site()))
+
+    for scale, minimum, maximum in ((1.0, 0.1, 1.0), (0, 0, 0.05)):
+        sg = Cassette(path, REPLAY, latency_scale=scale).wrap(None)
+        start = time.time()
+        _record_session(sg)
+        assert minimum <= time.time() - start < maximum
+
+
+def test_replaying_an_unrecorded_call_fails(tmp_path):
+    path = str(tmp_path / "session.jsonl")
+    _record_session(Cassette(path, RECORD).wrap(Site()))
+    sg = Cassette(path, REPLAY, latency_scale=0).wrap(None)
+
+    with pytest.raises(CassetteError):
+        sg.delete("Version", 1)
+
+    _record_session(sg)
+    with pytest.raises(CassetteError):
+        sg.create("Version", {"code": "seq_020", "project": PROJECT})
+
+
+def test_recording_proxy(tmp_path):
+    site = Site()
+    sg = Cassette(str(tmp_path / "session.jsonl"), RECORD).wrap(site)
+
+    assert sg.base_url == site.base_url
+    # private methods, e.g. the storage upload, aren't recorded.
+    with pytest.raises(AttributeError):
+        sg._upload_data_to_storage
+
+
+def test_off(tmp_path):
+    site = Site()
+    assert Cassette(str(tmp_path / "session.jsonl"), OFF).wrap(site) is site
+    assert Cassette(None, RECORD).wrap(site) is site
+    with pytest.raises(ValueError):
+        Cassette(str(tmp_path / "session.jsonl"), "rewind")
@@ -0,0 +1,133 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import time
+
+from stand_in_site import StandInSite
+from tk_flame_review_upload import ConcurrencyController, UploadProgress, upload
+from tk_flame_review_upload.uploader import MIN_PART_SIZE
+
+MB = 1000000
+
+
+def _controller(tmp_path, **kwargs):
+    return ConcurrencyController(str(tmp_path / "concurrency.json"), **kwargs)
+
+
+def _round(controller, throughput, start, part_size=10 * MB):
+    """
+    Records a round of parts uploaded in parallel at the given total throughput.
+
+    :returns: End time of the round.
+    """
+    parts = controller.limit
+    end = start + parts * part_size / float(throughput)
+    for _ in range(parts):
+        controller.record_part(part_size, start, end)
+    return end
+
+
+def test_raises_the_limit_while_throughput_improves(tmp_path):
+    controller = _controller(tmp_path, initial=2)
+    now = time.time()
+    for throughput in (10 * MB, 20 * MB, 30 * MB):
+        now = _round(controller, throughput, now)
+    assert controller.limit == 5
+
+    # the link is saturated.
+    now = _round(controller, 30 * MB, now)
+    now = _round(controller, 30 * MB, now)
+    assert controller.limit == 5
+
+
+def test_halves_the_limit_once_per_congestion(tmp_path):
+    controller = _controller(tmp_path, initial=8)
+    start = time.time()
+    for _ in range(8):
+        # all the parts in flight fail together.
+        controller.record_error(start)
+    assert controller.limit == 4
+
+    controller.record_error(time.time() + 1)
+    assert controller.limit == 2
+
+
+def test_keeps_the_baseline_after_a_decrease(tmp_path):
+    controller = _controller(tmp_path, initial=4)
+    now = _round(controller, 40 * MB, time.time())
+    assert controller.limit == 5
+
+    controller.record_error(now + 1)
+    assert controller.limit == 2
+
+    # slower than before the decrease, the limit must not go back up.
+    now = _round(controller, 20 * MB, now + 2)
+    assert controller.limit == 2
+    # the link recovers.
+    _round(controller, 30 * MB, now)
+    assert controller.limit == 3
+
+
+def test_latency_spike_halves_the_limit(tmp_path):
+    controller = _controller(tmp_path, initial=4, maximum=4)
+    now = _round(controller, 40 * MB, time.time())
+    controller.record_part(10 * MB, now, now + 10)
+    assert controller.limit == 2
+
+
+def test_limits(tmp_path):
+    controller = _controller(tmp_path, initial=1, minimum=1, maximum=2)
+    controller.record_error(time.time())
+    assert controller.limit == 1
+    now = _round(controller, 10 * MB, time.time())
+    now = _round(controller, 20 * MB, now)
+    now = _round(controller, 40 * MB, now)
+    assert controller.limit == 2
+
+
+def test_learned_limit_is_kept_for_the_next_upload(tmp_path):
+    controller = _controller(tmp_path, initial=2)
+    _round(controller, 10 * MB, time.time())
+    controller.save()
+
+    assert _controller(tmp_path, initial=2).limit == 3
+
+
+def test_slots_above_the_limit_wait(tmp_path):
+    controller = _controller(tmp_path, initial=2)
+    assert controller.wait_for_slot(1, 0)
+    assert not controller.wait_for_slot(2, 0.01)
+
+
+def test_retries_made_by_the_shotgun_api_lower_the_limit(tmp_path):
+    path = tmp_path / "movie.mov"
+    with open(str(path), "wb") as fh:
+        fh.truncate(4 * MIN_PART_SIZE)
+    site = StandInSite(bandwidth=200 * MB)
+    # the site fails the first attempt at a part, the Shotgun API retries it.
+    site.internal_retries["https://storage.example.com/movie.mov?part=1"] = 1
+    messages = []
+    controller = _controller(tmp_path, initial=4, maximum=4, logger=messages.append)
+    progress = UploadProgress(str(tmp_path / "status.json"), 4 * MIN_PART_SIZE)
+
+    upload(
+        site,
+        "Version",
+        1,
+        str(path),
+        "sg_uploaded_movie",
+        progress,
+        part_size=MIN_PART_SIZE,
+        controller=controller,
+    )
+
+    assert messages[0] == "Upload concurrency 4 -> 2 (upload error)"
+    assert site.bytes_received == 4 * MIN_PART_SIZE
+    assert progress.sent == 4 * MIN_PART_SIZE
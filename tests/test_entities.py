@@ -0,0 +1,284 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import contextlib
+import threading
+import time
+
+from tk_flame_review import entities
+from tk_flame_review.entities import bulk_find_or_create, find_or_create, host_lock
+
+PROJECT = {"type": "Project", "id": 1}
+
+
+class Site(object):
+    """
+    In memory site, each call taking some time like a round trip would.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.entities = []
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _call(self, name):
+        with self._lock:
+            self.calls.append(name)
+        time.sleep(self.latency)
+
+    def _create(self, entity_type, data):
+        with self._lock:
+            entity = dict(data, type=entity_type, id=len(self.entities) + 1)
+            self.entities.append(entity)
+        return {"type": entity_type, "id": entity["id"], "code": entity["code"]}
+
+    def find(self, entity_type, filters, fields=None, order=None):
+        self._call("find")
+        _, _, codes = [f for f in filters if f[0] == "code"][0]
+        codes = codes if isinstance(codes, list) else [codes]
+        with self._lock:
+            return [
+                {"type": entity_type, "id": entity["id"], "code": entity["code"]}
+                for entity in sorted(self.entities, key=lambda e: e["id"])
+                if entity["type"] == entity_type and entity["code"] in codes
+            ]
+
+    def find_one(self, entity_type, filters, fields=None, order=None):
+        matches = self.find(entity_type, filters, fields, order)
+        self.calls[-1] = "find_one"
+        return matches[0] if matches else None
+
+    def create(self, entity_type, data):
+        self._call("create")
+        return self._create(entity_type, data)
+
+    def delete(self, entity_type, entity_id):
+        self._call("delete")
+        with self._lock:
+            self.entities = [e for e in self.entities if e["id"] != entity_id]
+        return True
+
+    def batch(self, requests):
+        self._call("batch")
+        results = []
+        for request in requests:
+            if request["request_type"] == "create":
+                results.append(self._create(request["entity_type"], request["data"]))
+            else:
+                self.entities = [
+                    e for e in self.entities if e["id"] != request["entity_id"]
+                ]
+                results.append(True)
+        return results
+
+    def codes(self):
+        return sorted(entity["code"] for entity in self.entities)
+
+
+def _call(func, *args, **kwargs):
+    kwargs.pop("idempotent", None)
+    return func(*args, **kwargs)
+
+
+def _get_data(code):
+    return {"code": code, "project": PROJECT}
+
+
+def _find_or_create(site, tmp_path, code):
+    return find_or_create(
+        site, _call, "Sequence", PROJECT, code, _get_data, str(tmp_path)
+    )
+
+
+def test_finds_existing_entity(tmp_path):
+    site = Site()
+    site.create("Sequence", _get_data("seq_010"))
+    site.calls = []
+
+    entity, created = _find_or_create(site, tmp_path, "seq_010")
+
+    assert entity["id"] == 1 and not created
+    assert site.calls == ["find_one"]
+
+
+def test_creation_is_checked_again(tmp_path):
+    site = Site()
+
+    entity, created = _find_or_create(site, tmp_path, "seq_010")
+
+    assert created
+    assert site.calls == ["find_one", "create", "find"]
+
+
+def test_creation_without_the_lock_is_checked_again(tmp_path, monkeypatch):
+    @contextlib.contextmanager
+    def unavailable_lock(*args, **kwargs):
+        yield False
+
+    monkeypatch.setattr(entities, "host_lock", unavailable_lock)
+    site = Site()
+    create = site.create
+
+    def racing_create(entity_type, data):
+        # another process creates the entity between the find and the create.
+        create(entity_type, data)
+        return create(entity_type, data)
+
+    site.create = racing_create
+
+    entity, created = _find_or_create(site, tmp_path, "seq_010")
+
+    assert entity["id"] == 1 and not created
+    assert site.codes() == ["seq_010"]
+
+
+def test_host_lock_times_out(tmp_path):
+    with host_lock(str(tmp_path), "key") as locked:
+        assert locked
+        with host_lock(str(tmp_path), "key", timeout=0.1) as locked_again:
+            assert not locked_again
+
+
+def test_concurrent_submissions_create_each_entity_once(tmp_path):
+    site = Site(latency=0.01)
+    codes = ["seq_%03d" % (index % 4) for index in range(32)]
+    results = []
+
+    def submit(code):
+        results.append(_find_or_create(site, tmp_path, code))
+
+    threads = [threading.Thread(target=submit, args=(code,)) for code in codes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert site.codes() == ["seq_000", "seq_001", "seq_002", "seq_003"]
+    assert len([entity for (entity, created) in results if created]) == 4
+    assert len(set(entity["id"] for (entity, _) in results)) == 4
+    assert "delete" not in site.calls
+
+
+def test_concurrent_submissions_from_two_hosts(tmp_path):
+    site = Site(latency=0.01)
+    results = []
+    barrier = threading.Barrier(2)
+
+    def submit(host):
+        # each host has its own lock folder, the locks don't see each other.
+        barrier.wait()
+        results.append(_find_or_create(site, tmp_path / host, "seq_010"))
+
+    threads = [
+        threading.Thread(target=submit, args=(host,)) for host in ("host1", "host2")
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert site.codes() == ["seq_010"]
+    assert len([entity for (entity, created) in results if created]) == 1
+    assert results[0][0]["id"] == results[1][0]["id"]
+
+
+def test_concurrent_bulk_and_single_submissions(tmp_path):
+    site = Site(latency=0.01)
+    codes = ["seq_%03d" % index for index in range(8)]
+    results = {}
+
+    def submit_bulk():
+        found, _ = bulk_find_or_create(
+            site, _call, "Sequence", PROJECT, codes, _get_data, str(tmp_path)
+        )
+        results["bulk"] = found
+
+    threads = [threading.Thread(target=submit_bulk)] + [
+        threading.Thread(
+            target=lambda code=code: results.setdefault(
+                code, _find_or_create(site, tmp_path, code)[0]
+            )
+        )
+        for code in codes
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert site.codes() == codes
+    for code in codes:
+        assert results["bulk"][code]["id"] == results[code]["id"]
+
+
+def _bulk_find_or_create(site, lock_folder, codes):
+    return bulk_find_or_create(
+        site, _call, "Sequence", PROJECT, codes, _get_data, str(lock_folder)
+    )
+
+
+def test_bulk_creation_is_checked_again(tmp_path):
+    site = Site()
+
+    found, created = _bulk_find_or_create(site, tmp_path, ["seq_010", "seq_020"])
+
+    assert created == set(["seq_010", "seq_020"])
+    assert site.calls == ["find", "batch", "find"]
+
+
+def test_bulk_holds_the_locks_of_a_single_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(entities, "BULK_BATCH_SIZE", 2)
+    held = []
+    maximum = []
+    lock = entities.host_lock
+
+    @contextlib.contextmanager
+    def counting_lock(*args, **kwargs):
+        with lock(*args, **kwargs) as locked:
+            held.append(args[1])
+            maximum.append(len(held))
+            yield locked
+            held.remove(args[1])
+
+    monkeypatch.setattr(entities, "host_lock", counting_lock)
+    site = Site()
+    codes = ["seq_%03d" % index for index in range(5)]
+
+    found, created = _bulk_find_or_create(site, tmp_path, codes)
+
+    assert max(maximum) == 2
+    assert sorted(found) == codes and created == set(codes)
+    assert site.codes() == codes
+
+
+def test_concurrent_bulk_submissions_from_two_hosts(tmp_path):
+    site = Site(latency=0.01)
+    codes = ["seq_%03d" % index for index in range(4)]
+    results = []
+    barrier = threading.Barrier(2)
+
+    def submit(host):
+        barrier.wait()
+        results.append(_bulk_find_or_create(site, tmp_path / host, codes))
+
+    threads = [
+        threading.Thread(target=submit, args=(host,)) for host in ("host1", "host2")
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert site.codes() == codes
+    assert not results[0][1] & results[1][1]
+    assert results[0][1] | results[1][1] == set(codes)
+    for code in codes:
+        assert results[0][0][code]["id"] == results[1][0][code]["id"]
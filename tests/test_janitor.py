@@ -0,0 +1,65 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import time
+
+from tk_flame_review import janitor
+from tk_flame_review.janitor import TempJanitor
+
+
+def _movie(tmp_path, name, size=10):
+    path = tmp_path / name
+    path.write_bytes(b"\0" * size)
+    return str(path)
+
+
+def _age(monkeypatch, seconds):
+    now = time.time() + seconds
+    monkeypatch.setattr(janitor.time, "time", lambda: now)
+
+
+def test_old_movies_are_reclaimed(tmp_path, monkeypatch):
+    temp_janitor = TempJanitor(str(tmp_path / "index.db"), max_age=3600, quota=0)
+    path = _movie(tmp_path, "seq010.mov")
+    temp_janitor.track(path)
+    _age(monkeypatch, 7200)
+    assert temp_janitor.reclaim() == 10
+    assert not (tmp_path / "seq010.mov").exists()
+
+
+def test_movies_in_use_are_kept(tmp_path, monkeypatch):
+    temp_janitor = TempJanitor(str(tmp_path / "index.db"), max_age=3600, quota=5)
+    spooled = _movie(tmp_path, "seq010.mov")
+    orphaned = _movie(tmp_path, "seq020.mov")
+    temp_janitor.track(spooled)
+    temp_janitor.track(orphaned)
+    _age(monkeypatch, 7200)
+    assert temp_janitor.reclaim(in_use=[spooled]) == 10
+    assert (tmp_path / "seq010.mov").exists()
+    assert not (tmp_path / "seq020.mov").exists()
+
+
+def test_nothing_is_reclaimed_without_limits(tmp_path, monkeypatch):
+    temp_janitor = TempJanitor(str(tmp_path / "index.db"), max_age=0, quota=0)
+    temp_janitor.track(_movie(tmp_path, "seq010.mov"))
+    _age(monkeypatch, 30 * 24 * 3600)
+    assert temp_janitor.reclaim() == 0
+    assert (tmp_path / "seq010.mov").exists()
+
+
+def test_quota_spares_recent_movies(tmp_path, monkeypatch):
+    temp_janitor = TempJanitor(str(tmp_path / "index.db"), max_age=0, quota=15)
+    old = _movie(tmp_path, "seq010.mov")
+    temp_janitor.track(old)
+    _age(monkeypatch, 2 * TempJanitor.QUOTA_GRACE_PERIOD)
+    temp_janitor.track(_movie(tmp_path, "seq020.mov"))
+    assert temp_janitor.reclaim() == 10
+    assert not (tmp_path / "seq010.mov").exists()
+    assert (tmp_path / "seq020.mov").exists()
@@ -0,0 +1,82 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import pytest
+
+from tk_flame_review.ledger import SubmissionLedger
+
+ENTITY = {"type": "Sequence", "id": 12}
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return SubmissionLedger(str(tmp_path / "ledger.db"))
+
+
+@pytest.fixture
+def key():
+    return SubmissionLedger.make_key(1, "Sequence", "seq010", 3, 100, 200)
+
+
+def test_in_flight_submissions_are_not_resumed(ledger, key):
+    entry_id = ledger.record_entity(key, ENTITY)
+    ledger.record_version(entry_id, 34)
+    # e.g. the same asset exported again while the first upload is running
+    assert ledger.claim(key) is None
+
+
+def test_failed_uploads_are_resumed(ledger, key):
+    entry_id = ledger.record_entity(key, ENTITY)
+    ledger.record_version(entry_id, 34)
+    ledger.record_upload_failure(34)
+    assert ledger.claim(key) == {"id": entry_id, "entity": ENTITY, "version_id": 34}
+    # claimed, so in flight again
+    assert ledger.claim(key) is None
+
+
+def test_released_submissions_are_resumed(ledger, key):
+    entry_id = ledger.record_entity(key, ENTITY)
+    ledger.release(entry_id)
+    assert ledger.claim(key)["version_id"] is None
+
+
+def test_completed_submissions_are_not_resumed(ledger, key):
+    entry_id = ledger.record_entity(key, ENTITY)
+    ledger.record_version(entry_id, 34)
+    ledger.record_upload(34)
+    ledger.record_upload_failure(34)
+    assert ledger.claim(key) is None
+
+
+def test_abandoned_submissions_are_resumed(ledger, key, monkeypatch):
+    entry_id = ledger.record_entity(key, ENTITY)
+    monkeypatch.setattr(SubmissionLedger, "IN_FLIGHT_TIMEOUT", -1)
+    assert ledger.claim(key)["id"] == entry_id
+
+
+def test_concurrent_submissions_are_kept_apart(ledger, key):
+    first = ledger.record_entity(key, ENTITY)
+    ledger.record_version(first, 34)
+    second = ledger.record_entity(key, ENTITY)
+    ledger.record_version(second, 35)
+    ledger.record_upload(35)
+    ledger.record_upload_failure(34)
+    assert ledger.claim(key)["version_id"] == 34
+
+
+def test_in_flight_paths(ledger, key):
+    first = ledger.record_entity(key, ENTITY)
+    ledger.record_version(first, 34, "/var/tmp/seq010.a.mov")
+    second = ledger.record_entity(key, ENTITY)
+    ledger.record_version(second, 35, "/var/tmp/seq010.b.mov")
+    ledger.record_upload(35)
+    assert ledger.get_in_flight_paths() == set(["/var/tmp/seq010.a.mov"])
+    ledger.record_upload_failure(34)
+    assert ledger.get_in_flight_paths() == set()
@@ -0,0 +1,109 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+
+from tk_flame_review.manifest import AssetRecord, SessionManifest
+
+
+def _info(name, **extra):
+    info = {
+        "assetName": name,
+        "sequenceName": name,
+        "sourceIn": 0,
+        "sourceOut": 48,
+        "recordIn": 86400,
+        "recordOut": 86448,
+        "fps": 24.0,
+        "aspectRatio": 1.78,
+        "versionNumber": 1,
+        "backgroundJobId": "job_%s" % name,
+        "destinationPath": "/var/tmp/flame/review",
+        "destinationHost": "flame01",
+        "resolvedPath": "%s.mov" % name,
+        "isBackground": True,
+        # keys the app doesn't use aren't kept.
+        "shotName": name,
+        "width": 1920,
+    }
+    info.update(extra)
+    return info
+
+
+def _manifest(tmp_path):
+    manifest = SessionManifest(str(tmp_path))
+    manifest.start()
+    return manifest
+
+
+def test_records_keep_what_a_submission_needs(tmp_path):
+    manifest = _manifest(tmp_path)
+    info = _info("seq_010", renderFingerprint="abc")
+    record = AssetRecord.from_info(info)
+    record.state = AssetRecord.PENDING
+    manifest.append(record)
+
+    (read,) = manifest.records()
+
+    assert read.state == AssetRecord.PENDING
+    expected = dict(info)
+    del expected["shotName"], expected["width"]
+    assert read.to_info() == expected
+
+
+def test_latest_record_of_each_asset_wins(tmp_path):
+    manifest = _manifest(tmp_path)
+    for name in ("seq_010", "seq_020"):
+        record = AssetRecord.from_info(_info(name))
+        record.state = AssetRecord.PENDING
+        manifest.append(record)
+    record = AssetRecord.from_info(_info("seq_010"))
+    record.state = "submitted"
+    record.version_id = 12
+    record.size = 1024
+    record.phase_times = {"Version": 1.5}
+    manifest.append(record)
+
+    latest = manifest.latest()
+
+    assert [record.sequence_name for record in latest] == ["seq_010", "seq_020"]
+    assert [record.state for record in latest] == ["submitted", AssetRecord.PENDING]
+    assert latest[0].to_result() == {
+        "name": "seq_010",
+        "state": "submitted",
+        "version_id": 12,
+        "size": 1024,
+        "size_estimated": False,
+        "phase_times": {"Version": 1.5},
+    }
+
+
+def test_incomplete_lines_are_skipped(tmp_path):
+    manifest = _manifest(tmp_path)
+    manifest.append(AssetRecord.from_info(_info("seq_010")))
+    with open(manifest.path, "a") as fh:
+        fh.write('{"sequence_name": "seq_0')
+
+    assert [record.sequence_name for record in manifest.records()] == ["seq_010"]
+
+
+def test_nothing_recorded(tmp_path):
+    assert SessionManifest(str(tmp_path)).latest() == []
+    assert _manifest(tmp_path).latest() == []
+
+
+def test_old_manifests_are_deleted(tmp_path):
+    for index in range(3):
+        with open(str(tmp_path / ("2024010%d_000000_1.jsonl" % index)), "w"):
+            pass
+
+    SessionManifest(str(tmp_path), keep=2).start()
+
+    assert sorted(os.listdir(str(tmp_path))) == ["20240102_000000_1.jsonl"]
@@ -0,0 +1,184 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import re
+
+import pytest
+
+from tk_flame_review import metrics
+from tk_flame_review.metrics import MetricsFlusher, MetricsRegistry
+
+_SAMPLE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$")
+_LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"(?:,|$)')
+_ESCAPES = {"\\\\": "\\", '\\"': '"', "\\n": "\n"}
+
+
+def parse_textfile(text):
+    """
+    Parses the Prometheus text exposition format.
+
+    :returns: Tuple (dictionary of types by metric name, dictionary of values
+              by (sample name, frozenset of labels)).
+    """
+    types = {}
+    samples = {}
+    assert text.endswith("\n")
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, metric_type = line.split(" ")
+            assert name not in types
+            types[name] = metric_type
+            continue
+        if line.startswith("#"):
+            continue
+        match = _SAMPLE.match(line)
+        assert match, "Invalid sample %r" % line
+        name, labels, value = match.groups()
+        parsed = {}
+        if labels:
+            assert "".join(m.group(0) for m in _LABEL.finditer(labels)) == labels
+            for label, escaped in _LABEL.findall(labels):
+                parsed[label] = re.sub(r"\\.", lambda m: _ESCAPES[m.group(0)], escaped)
+        key = (name, frozenset(parsed.items()))
+        assert key not in samples
+        samples[key] = float(value)
+    return types, samples
+
+
+def _registry():
+    registry = MetricsRegistry("tk_flame_review")
+    registry.counter("uploads_total", "Uploads, by state.")
+    registry.histogram("upload_seconds", "Upload duration.", buckets=(1, 10))
+    return registry
+
+
+def _flush(registry, tmp_path):
+    textfile = str(tmp_path / "textfile" / "tk_flame_review.prom")
+    registry.flush(str(tmp_path / "state" / "metrics.json"), textfile)
+    with open(textfile) as fh:
+        return parse_textfile(fh.read())
+
+
+def test_textfile_format(tmp_path):
+    registry = _registry()
+    registry.inc("uploads_total", state="done")
+    registry.inc("uploads_total", 2, state="failed")
+    for value in (0.5, 5, 50):
+        registry.observe("upload_seconds", value)
+
+    types, samples = _flush(registry, tmp_path)
+
+    assert types == {
+        "tk_flame_review_uploads_total": "counter",
+        "tk_flame_review_upload_seconds": "histogram",
+    }
+    assert samples == {
+        ("tk_flame_review_uploads_total", frozenset([("state", "done")])): 1,
+        ("tk_flame_review_uploads_total", frozenset([("state", "failed")])): 2,
+        ("tk_flame_review_upload_seconds_bucket", frozenset([("le", "1.0")])): 1,
+        ("tk_flame_review_upload_seconds_bucket", frozenset([("le", "10.0")])): 2,
+        ("tk_flame_review_upload_seconds_bucket", frozenset([("le", "+Inf")])): 3,
+        ("tk_flame_review_upload_seconds_sum", frozenset()): 55.5,
+        ("tk_flame_review_upload_seconds_count", frozenset()): 3,
+    }
+
+
+def test_label_values_are_escaped(tmp_path):
+    registry = _registry()
+    value = 'C:\\movies\\"seq 010"\nv2'
+    registry.inc("uploads_total", state=value)
+
+    _, samples = _flush(registry, tmp_path)
+
+    assert samples == {
+        ("tk_flame_review_uploads_total", frozenset([("state", value)])): 1
+    }
+
+
+def test_totals_of_the_host_are_accumulated(tmp_path):
+    # the session and a backburner job of the same host.
+    session, job = _registry(), _registry()
+    session.inc("uploads_total", state="done")
+    _flush(session, tmp_path)
+    job.inc("uploads_total", 2, state="done")
+    job.inc("uploads_total", state="failed")
+
+    _, samples = _flush(job, tmp_path)
+
+    assert (
+        samples[("tk_flame_review_uploads_total", frozenset([("state", "done")]))] == 3
+    )
+    assert not job.dirty
+
+
+def test_textfile_is_replaced_atomically(tmp_path, monkeypatch):
+    registry = _registry()
+    registry.inc("uploads_total", state="done")
+    _flush(registry, tmp_path)
+    textfile = str(tmp_path / "textfile" / "tk_flame_review.prom")
+
+    renamed = []
+    replace = os.replace
+
+    def checked_replace(source, destination):
+        # the new file is complete and in the same folder when it is renamed.
+        assert os.path.dirname(source) == os.path.dirname(destination)
+        assert os.path.basename(source).startswith(".")
+        if destination == textfile:
+            with open(source) as fh:
+                parse_textfile(fh.read())
+        renamed.append(destination)
+        replace(source, destination)
+
+    monkeypatch.setattr(metrics.os, "replace", checked_replace)
+    registry.inc("uploads_total", state="done")
+    _flush(registry, tmp_path)
+    assert textfile in renamed
+    with open(textfile) as fh:
+        previous = fh.read()
+
+    def failing_replace(source, destination):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(metrics.os, "replace", failing_replace)
+    registry.inc("uploads_total", state="done")
+    with pytest.raises(OSError):
+        registry.flush(str(tmp_path / "state" / "metrics.json"), textfile)
+
+    # readers still see the previous complete files, nothing is left behind.
+    assert os.listdir(str(tmp_path / "textfile")) == ["tk_flame_review.prom"]
+    assert "metrics.json" in os.listdir(str(tmp_path / "state"))
+    assert not [
+        name for name in os.listdir(str(tmp_path / "state")) if name.endswith(".tmp")
+    ]
+    with open(textfile) as fh:
+        assert fh.read() == previous
+    # the values are kept for the next flush.
+    assert registry.dirty
+
+
+def test_flusher_logs_errors(tmp_path):
+    registry = _registry()
+    registry.inc("uploads_total", state="done")
+    messages = []
+    blocker = tmp_path / "blocker"
+    blocker.write_text("")
+    flusher = MetricsFlusher(
+        registry,
+        str(blocker / "metrics.json"),
+        str(blocker / "tk_flame_review.prom"),
+        logger=messages.append,
+    )
+
+    flusher.flush()
+
+    assert messages and messages[0].startswith("Could not write metrics")
+    assert registry.dirty
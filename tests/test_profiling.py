@@ -0,0 +1,139 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+import pytest
+
+from tk_flame_review.profiling import CallbackProfiler
+
+MB = 1024 * 1024
+
+
+def _allocate(session_id, count):
+    """
+    Callback allocating a little memory.
+    """
+    return [str(index) * 10 for index in range(count)]
+
+
+def _profiles(folder):
+    return sorted(
+        os.path.relpath(os.path.join(root, name), str(folder))
+        for (root, dirs, names) in os.walk(str(folder))
+        for name in names
+    )
+
+
+def test_profiled_call_writes_readable_profiles(tmp_path):
+    messages = []
+    profiler = CallbackProfiler(str(tmp_path), 10 * MB, logger=messages.append)
+    callback = profiler.wrap("postExportAsset", _allocate)
+
+    assert len(callback("session/1", 20000)) == 20000
+
+    base_path = "session_1/postExportAsset.%d.0" % os.getpid()
+    assert _profiles(tmp_path) == [
+        base_path + ".allocations.txt",
+        base_path + ".pstats",
+    ]
+    stats = pstats.Stats(str(tmp_path / (base_path + ".pstats")))
+    assert any(function == "_allocate" for (_, _, function) in stats.stats)
+    with open(str(tmp_path / (base_path + ".allocations.txt"))) as fh:
+        allocations = fh.read()
+    assert allocations.startswith("Total: ")
+    assert "test_profiling.py" in allocations
+    assert messages == [
+        "Wrote profile of postExportAsset to '%s/%s.*'."
+        % (
+            tmp_path,
+            base_path,
+        )
+    ]
+    # memory tracing is stopped once the call is profiled.
+    assert not tracemalloc.is_tracing()
+
+
+def test_disabled_profiler_is_a_no_op(tmp_path):
+    profiler = CallbackProfiler(None, 10 * MB)
+
+    assert not profiler.enabled
+    assert profiler.wrap("postExportAsset", _allocate) is _allocate
+    with profiler.profile("backburner_upload_quicktime", None):
+        pass
+    assert not tracemalloc.is_tracing()
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_calls_made_during_a_profiled_call_are_not_profiled(tmp_path):
+    profiler = CallbackProfiler(str(tmp_path), 10 * MB)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_callback(session_id):
+        started.set()
+        release.wait(5)
+
+    thread = threading.Thread(
+        target=profiler.wrap("preExportAsset", slow_callback), args=(1,)
+    )
+    thread.start()
+    started.wait(5)
+    with profiler.profile("postExportAsset", 1):
+        pass
+    release.set()
+    thread.join()
+
+    assert [name.split(".")[0] for name in _profiles(tmp_path / "1")] == [
+        "preExportAsset",
+        "preExportAsset",
+    ]
+
+
+def test_failure_to_write_does_not_fail_the_call(tmp_path):
+    folder = tmp_path / "profiles"
+    folder.write_text("not a folder")
+    messages = []
+    profiler = CallbackProfiler(str(folder), 10 * MB, logger=messages.append)
+
+    assert profiler.wrap("postExportAsset", _allocate)(1, 10) == _allocate(1, 10)
+    assert messages[0].startswith("Could not write profile of postExportAsset: ")
+
+
+def test_exception_of_the_call_is_raised_and_profiled(tmp_path):
+    profiler = CallbackProfiler(str(tmp_path), 10 * MB)
+
+    with pytest.raises(ZeroDivisionError):
+        with profiler.profile("postCustomExport", 1):
+            1 / 0
+    assert len(_profiles(tmp_path)) == 2
+
+
+def test_oldest_profiles_are_deleted(tmp_path):
+    for index, session in enumerate(("1", "2", "3")):
+        os.makedirs(str(tmp_path / session))
+        path = str(tmp_path / session / "preExportAsset.pstats")
+        with open(path, "wb") as fh:
+            fh.write(b"x" * 1000)
+        mtime = time.time() - 10 + index
+        os.utime(path, (mtime, mtime))
+
+    CallbackProfiler(str(tmp_path), 2500).rotate()
+
+    # empty session folders are removed.
+    assert _profiles(tmp_path) == [
+        os.path.join("2", "preExportAsset.pstats"),
+        os.path.join("3", "preExportAsset.pstats"),
+    ]
+    assert sorted(os.listdir(str(tmp_path))) == ["2", "3"]
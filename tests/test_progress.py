@@ -0,0 +1,135 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import importlib
+import sys
+import threading
+import types
+
+import pytest
+
+
+@pytest.fixture
+def progress(monkeypatch):
+    """
+    The progress module, imported with a stand-in for the Qt module of the
+    engine, and driven by a clock advanced by the tests.
+    """
+    qt = types.ModuleType("sgtk.platform.qt")
+    qt.QtCore = types.SimpleNamespace()
+    qt.QtGui = types.SimpleNamespace(QWidget=object)
+    monkeypatch.setitem(sys.modules, "sgtk", types.ModuleType("sgtk"))
+    monkeypatch.setitem(sys.modules, "sgtk.platform", types.ModuleType("sgtk.platform"))
+    monkeypatch.setitem(sys.modules, "sgtk.platform.qt", qt)
+    monkeypatch.delitem(sys.modules, "tk_flame_review.progress", raising=False)
+    module = importlib.import_module("tk_flame_review.progress")
+    monkeypatch.delitem(sys.modules, "tk_flame_review.progress")
+
+    clock = types.SimpleNamespace(now=1000.0)
+    clock.time = lambda: clock.now
+    monkeypatch.setattr(module, "time", clock)
+    return module.SessionProgress(), clock
+
+
+def test_time_is_accumulated_per_phase(progress):
+    session, clock = progress
+
+    session.update("seq_010.mov", "seq_010", "Version", "Creating Version")
+    clock.now += 2
+    session.update("seq_010.mov", "seq_010", "Thumbnail", "Generating thumbnail")
+    clock.now += 3
+    session.update("seq_010.mov", "seq_010", "Version", "Updating Version")
+    clock.now += 1
+    session.finish("seq_010.mov", "seq_010", session.SUBMITTED)
+    # time spent after the asset finished isn't counted.
+    clock.now += 10
+
+    (result,) = session.results()
+    assert result["name"] == "seq_010"
+    assert result["state"] == session.SUBMITTED
+    assert result["phase_times"] == {"Version": 3, "Thumbnail": 3}
+
+
+def test_snapshot(progress):
+    session, clock = progress
+    session.update("a.mov", "a", "Version", "Creating Version a")
+    session.finish("a.mov", "a", session.FAILED)
+    session.update("b.mov", "b", "Queued", "Waiting for the end of the export")
+    session.finish("b.mov", "b", session.DEFERRED)
+    session.update("c.mov", "c", "Upload", "Uploading c")
+
+    assert session.snapshot() == {
+        "total": 3,
+        "finished": 2,
+        "failed": 1,
+        "deferred": 1,
+        "current": ("c", "Uploading c"),
+    }
+
+    session.finish("c.mov", "c", session.SUBMITTED)
+    assert session.snapshot()["current"] is None
+
+
+def test_results_keep_the_order_assets_were_reported_in(progress):
+    session, clock = progress
+    for name in ("c", "a", "b"):
+        session.update(name + ".mov", name, "Version", "")
+    session.set_result("a.mov", version_id=12, size=1024, size_estimated=True)
+    session.finish("a.mov", "a", session.SUBMITTED)
+
+    results = session.results()
+    assert [result["name"] for result in results] == ["c", "a", "b"]
+    assert results[1]["version_id"] == 12
+    assert results[1]["size"] == 1024 and results[1]["size_estimated"]
+    assert results[0]["version_id"] is None and results[0]["state"] is None
+
+
+def test_updates_bump_the_revision(progress):
+    session, clock = progress
+    revision = session.revision
+    session.update("a.mov", "a", "Version", "")
+    session.set_result("a.mov", version_id=1)
+    session.finish("a.mov", "a", session.SUBMITTED)
+    assert session.revision == revision + 3
+
+    session.reset()
+    assert session.revision == 0
+    assert session.results() == []
+
+
+def test_concurrent_updates(progress):
+    session, clock = progress
+
+    def submit(index):
+        key = "%d.mov" % index
+        for phase in ("Version", "Thumbnail", "Upload"):
+            session.update(key, str(index), phase, "")
+        session.finish(key, str(index), session.SUBMITTED)
+
+    threads = [threading.Thread(target=submit, args=(index,)) for index in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    snapshot = session.snapshot()
+    assert snapshot["total"] == snapshot["finished"] == 20
+    assert session.revision == 80
+
+
+def test_result_of_a_single_asset(progress):
+    session, clock = progress
+    session.update("a.mov", "a", "Version", "")
+    clock.now += 2
+    session.finish("a.mov", "a", session.SUBMITTED)
+
+    assert session.result("a.mov") == session.results()[0]
+    assert session.result("a.mov")["phase_times"] == {"Version": 2}
+    assert session.result("b.mov") is None
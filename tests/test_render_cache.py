@@ -0,0 +1,72 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+
+from tk_flame_review.render_cache import RenderCache, make_fingerprint
+
+INFO = {
+    "sequenceName": "seq_010",
+    "versionNumber": 1,
+    "recordIn": 1001,
+    "recordOut": 1100,
+    "sourceIn": 0,
+    "sourceOut": 99,
+    "width": 1920,
+    "height": 1080,
+    "fps": 24.0,
+}
+
+
+def test_fingerprint_depends_on_content():
+    fingerprint = make_fingerprint(INFO, "preset", "edit-1")
+    assert fingerprint == make_fingerprint(dict(INFO), "preset", "edit-1")
+    # same range, but the sequence has been edited since.
+    assert fingerprint != make_fingerprint(INFO, "preset", "edit-2")
+    assert fingerprint != make_fingerprint(INFO, "other preset", "edit-1")
+
+
+def _movie(folder, name, size):
+    path = os.path.join(str(folder), name)
+    with open(path, "wb") as fh:
+        fh.write(b"x" * size)
+    return path
+
+
+def test_put_and_get(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), 1000)
+    movie = _movie(tmp_path, "seq_010.mov", 100)
+
+    assert cache.get("abc") is None
+    cached_path = cache.put("abc", movie)
+
+    assert os.path.exists(movie)
+    assert cache.get("abc") == cached_path
+    assert cache.contains(cached_path)
+    assert not cache.contains(movie)
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), 250)
+    first = cache.put("first", _movie(tmp_path, "first.mov", 100))
+    cache.put("second", _movie(tmp_path, "second.mov", 100))
+    os.utime(first, (0, 0))
+    cache.get("second")
+
+    cache.put("third", _movie(tmp_path, "third.mov", 100))
+
+    assert cache.get("first") is None
+    assert cache.get("second") and cache.get("third")
+
+
+def test_movies_larger_than_the_cache_are_not_cached(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), 50)
+    assert cache.put("abc", _movie(tmp_path, "seq_010.mov", 100)) is None
+    assert cache.get("abc") is None
@@ -0,0 +1,253 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import email.message
+import io
+import ssl
+import urllib.error
+
+import pytest
+
+from tk_flame_review_upload import retry
+from tk_flame_review_upload.retry import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryBudgetExceeded,
+    RetryPolicy,
+    is_transient_error,
+)
+
+shotgun_api3 = pytest.importorskip("shotgun_api3")
+
+STORAGE_URL = "https://storage.example.com/part"
+
+
+def _http_error(code):
+    return urllib.error.HTTPError(
+        STORAGE_URL, code, "Error", email.message.Message(), None
+    )
+
+
+@pytest.fixture
+def sg(monkeypatch):
+    """
+    Shotgun API connection which never reaches a site and doesn't wait
+    between its own retries.
+    """
+    sg = shotgun_api3.Shotgun(
+        "https://example.shotgunstudio.com", "script", "key", connect=False
+    )
+    monkeypatch.setattr(sg, "BACKOFF", 0)
+    return sg
+
+
+def _upload_error(sg, monkeypatch, error):
+    """
+    :returns: The exception raised by the Shotgun API when uploading to storage fails.
+    """
+
+    def fail(request, opener):
+        raise error
+
+    monkeypatch.setattr(sg, "_make_upload_request", fail)
+    with pytest.raises(shotgun_api3.ShotgunError) as info:
+        sg._upload_data_to_storage(
+            io.BytesIO(b"data"), "video/quicktime", 4, STORAGE_URL
+        )
+    return info.value
+
+
+def _form_error(sg, monkeypatch, error):
+    """
+    :returns: The exception raised by the Shotgun API when posting a form fails.
+    """
+
+    class Opener(object):
+        def open(self, url, params):
+            raise error
+
+    monkeypatch.setattr(sg, "_build_opener", lambda handler: Opener())
+    with pytest.raises(shotgun_api3.ShotgunError) as info:
+        sg._send_form("https://example.shotgunstudio.com/upload", {})
+    return info.value
+
+
+@pytest.mark.parametrize("code", [500, 503])
+def test_storage_server_error_is_transient(sg, monkeypatch, code):
+    assert is_transient_error(_upload_error(sg, monkeypatch, _http_error(code)))
+
+
+def test_storage_gateway_error_is_transient(sg, monkeypatch):
+    assert is_transient_error(_upload_error(sg, monkeypatch, _http_error(502)))
+
+
+def test_storage_max_attempts_is_transient(sg, monkeypatch):
+    error = _upload_error(
+        sg, monkeypatch, urllib.error.URLError(ConnectionResetError())
+    )
+    assert str(error) == "Max attempts limit reached."
+    assert is_transient_error(error)
+
+
+def test_storage_client_error_is_permanent(sg, monkeypatch):
+    assert not is_transient_error(_upload_error(sg, monkeypatch, _http_error(403)))
+
+
+def test_form_max_attempts_is_transient(sg, monkeypatch):
+    error = _form_error(sg, monkeypatch, _http_error(500))
+    assert str(error) == "Max attempts limit reached."
+    assert is_transient_error(error)
+
+
+def test_shotgun_errors_are_classified_without_context():
+    # e.g. replayed from a cassette, see tk_flame_review.cassette
+    assert is_transient_error(shotgun_api3.ShotgunError("Max attempts limit reached."))
+    assert not is_transient_error(shotgun_api3.ShotgunError("Path must be a file"))
+    assert not is_transient_error(shotgun_api3.Fault("API create() invalid field"))
+
+
+def test_protocol_error():
+    def error(code):
+        return shotgun_api3.ProtocolError("https://site", code, "Error", {})
+
+    assert is_transient_error(error(503))
+    assert not is_transient_error(error(404))
+
+
+def test_certificate_errors_are_permanent():
+    error = ssl.SSLCertVerificationError("certificate verify failed")
+    assert not is_transient_error(error)
+    assert not is_transient_error(urllib.error.URLError(error))
+    assert is_transient_error(ssl.SSLError("record layer failure"))
+
+
+def test_connect_errors():
+    assert retry.is_connect_error(ConnectionRefusedError(111, "refused"))
+    assert not retry.is_connect_error(ConnectionResetError(104, "reset"))
+
+
+def _policy(**kwargs):
+    kwargs.setdefault("backoff_base", 0)
+    return RetryPolicy(**kwargs)
+
+
+def _failing(errors, result="ok"):
+    """
+    :returns: Callable raising the given errors in turn, then returning result.
+    """
+    errors = list(errors)
+
+    def call(*args):
+        if errors:
+            raise errors.pop(0)
+        return result
+
+    return call
+
+
+def test_retries_transient_errors():
+    policy = _policy(max_attempts=3)
+    assert policy.call(_failing([ConnectionResetError()] * 2)) == "ok"
+    assert policy.stats["attempts"] == 3
+    assert policy.stats["retries"] == 2
+
+
+def test_gives_up_after_max_attempts():
+    policy = _policy(max_attempts=2, breaker_threshold=0)
+    with pytest.raises(ConnectionResetError):
+        policy.call(_failing([ConnectionResetError()] * 3))
+    assert policy.stats["attempts"] == 2
+
+
+def test_does_not_retry_permanent_errors():
+    policy = _policy()
+    with pytest.raises(ValueError):
+        policy.call(_failing([ValueError()]))
+    assert policy.stats["attempts"] == 1
+
+
+def test_non_idempotent_calls_only_retry_connect_errors():
+    policy = _policy()
+    assert policy.call(_failing([ConnectionRefusedError(111, "")]), idempotent=False)
+    with pytest.raises(ConnectionResetError):
+        policy.call(_failing([ConnectionResetError()]), idempotent=False)
+
+
+def test_session_budget():
+    policy = _policy(session_budget=1, breaker_threshold=0)
+    policy.call(_failing([ConnectionResetError()]))
+    with pytest.raises(RetryBudgetExceeded):
+        policy.call(_failing([ConnectionResetError()]))
+    policy.reset_session()
+    assert policy.call(_failing([ConnectionResetError()])) == "ok"
+
+
+def test_breaker_opens_on_consecutive_failures():
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_trial(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(retry.time, "time", lambda: now[0])
+    breaker = CircuitBreaker(threshold=1, cooldown=10)
+    breaker.record_failure()
+    assert not breaker.allow()
+    now[0] += 11
+    # a single trial call is let through
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.allow()
+
+
+def test_success_resets_breaker():
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert not breaker.is_open
+
+
+def test_permanent_errors_do_not_reset_breaker():
+    policy = _policy(max_attempts=1, breaker_threshold=2)
+    with pytest.raises(ConnectionResetError):
+        policy.call(_failing([ConnectionResetError()]))
+    with pytest.raises(ValueError):
+        policy.call(_failing([ValueError()]))
+    with pytest.raises(ConnectionResetError):
+        policy.call(_failing([ConnectionResetError()]))
+    with pytest.raises(CircuitOpenError):
+        policy.call(_failing([]))
+
+
+def test_storage_outage_opens_breaker(sg, monkeypatch):
+    """
+    Uploads failing with the errors the Shotgun API raises for a storage
+    outage are retried and eventually open the breaker.
+    """
+    monkeypatch.setattr(sg, "_make_upload_request", _failing([_http_error(503)] * 100))
+    policy = _policy(max_attempts=2, session_budget=0, breaker_threshold=4)
+
+    def upload():
+        return sg._upload_data_to_storage(
+            io.BytesIO(b"d"), "video/quicktime", 1, STORAGE_URL
+        )
+
+    for _ in range(2):
+        with pytest.raises(shotgun_api3.ShotgunError):
+            policy.call(upload)
+    assert policy.stats["retries"] == 2
+    with pytest.raises(CircuitOpenError):
+        policy.call(upload)
@@ -0,0 +1,43 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+from tk_flame_review.scheduling import get_upload_priority
+
+MB = 1024 * 1024
+
+
+def _order(uploads):
+    return [
+        name
+        for (name, size, deadline) in sorted(
+            uploads, key=lambda upload: get_upload_priority(upload[1], upload[2])
+        )
+    ]
+
+
+def test_smallest_first():
+    assert _order([("reel", 2000 * MB, None), ("spot", 30 * MB, None)]) == [
+        "spot",
+        "reel",
+    ]
+
+
+def test_deadlines_first_earliest_first():
+    uploads = [
+        ("spot", 30 * MB, None),
+        ("late reel", 2000 * MB, 200.0),
+        ("early reel", 2000 * MB, 100.0),
+    ]
+    assert _order(uploads) == ["early reel", "late reel", "spot"]
+
+
+def test_priority_ignores_size_between_deadlines():
+    assert get_upload_priority(10 * MB, 100.0) < get_upload_priority(MB, 200.0)
+    assert get_upload_priority(10 * MB, 100.0) < get_upload_priority(MB)
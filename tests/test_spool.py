@@ -0,0 +1,132 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import threading
+
+import pytest
+
+from tk_flame_review.spool import SpoolWorker, SubmissionSpool
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return SubmissionSpool(str(tmp_path / "spool" / "spool.db"))
+
+
+def test_items_are_handed_out_in_order(spool):
+    first = spool.push("submission", {"name": "seq010"})
+    spool.push("upload", {"name": "seq020"})
+    assert spool.pending_count() == 2
+    assert spool.peek() == (first, "submission", {"name": "seq010"})
+    # peeking doesn't remove the item
+    assert spool.peek()[0] == first
+    spool.ack(first)
+    assert spool.peek()[1:] == ("upload", {"name": "seq020"})
+    assert spool.pending_count() == 1
+
+
+def test_retried_items_stay_at_the_head(spool):
+    first = spool.push("upload", {})
+    spool.push("upload", {})
+    spool.retry_later(first, "Site unavailable")
+    assert spool.peek()[0] == first
+
+
+def test_failed_items_no_longer_block(spool):
+    first = spool.push("upload", {})
+    second = spool.push("upload", {})
+    spool.fail(first, "Bad request")
+    assert spool.peek()[0] == second
+    assert spool.pending_count() == 1
+
+
+def test_items_survive_reopening(spool):
+    spool.push("submission", {"name": "seq010"})
+    assert SubmissionSpool(spool.path).peek()[2] == {"name": "seq010"}
+
+
+def test_worker_processes_and_acks(spool):
+    spool.push("upload", {"index": 0})
+    spool.push("upload", {"index": 1})
+    handled = []
+
+    def handler(kind, payload):
+        handled.append(payload["index"])
+        if spool.pending_count() == 1:
+            worker.stop()
+
+    worker = SpoolWorker(spool, handler, lambda e: False, interval=0.01)
+    worker.start()
+    worker.join(5)
+    assert handled == [0, 1]
+    assert spool.pending_count() == 0
+
+
+def test_worker_postpones_transient_failures(spool):
+    spool.push("upload", {})
+    attempts = []
+
+    def handler(kind, payload):
+        attempts.append(kind)
+        if len(attempts) < 3:
+            raise ConnectionResetError()
+        worker.stop()
+
+    worker = SpoolWorker(
+        spool, handler, lambda e: isinstance(e, ConnectionError), interval=0.01
+    )
+    worker.start()
+    worker.join(5)
+    assert len(attempts) == 3
+    assert spool.pending_count() == 0
+
+
+def test_worker_fails_permanent_errors(spool):
+    spool.push("upload", {})
+    spool.push("upload", {})
+    handled = []
+
+    def handler(kind, payload):
+        handled.append(kind)
+        if len(handled) == 1:
+            raise ValueError("Bad request")
+        worker.stop()
+
+    worker = SpoolWorker(spool, handler, lambda e: False, interval=0.01)
+    worker.start()
+    worker.join(5)
+    assert handled == ["upload", "upload"]
+    assert spool.pending_count() == 0
+    assert spool.peek() is None
+
+
+def test_wake_checks_spool_right_away(spool):
+    processed = threading.Event()
+
+    def handler(kind, payload):
+        processed.set()
+
+    worker = SpoolWorker(spool, handler, lambda e: False, interval=60)
+    worker.start()
+    spool.push("upload", {})
+    worker.wake()
+    assert processed.wait(5)
+    worker.stop()
+    worker.join(5)
+    assert not worker.is_alive()
+
+
+def test_get_pending(spool):
+    failed = spool.push("upload", {"full_path": "/var/tmp/a.mov"})
+    spool.push("upload", {"full_path": "/var/tmp/b.mov"})
+    spool.fail(failed, "Bad request")
+    assert [item[2] for item in spool.get_pending()] == [
+        {"full_path": "/var/tmp/b.mov"}
+    ]
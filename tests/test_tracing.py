@@ -0,0 +1,110 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import json
+import os
+import time
+
+from tk_flame_review.tracing import Tracer
+
+
+def _spans(folder):
+    spans = {}
+    for name in os.listdir(str(folder)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(str(folder), name)) as fh:
+            document = json.load(fh)
+        for resource in document["resourceSpans"]:
+            for scope in resource["scopeSpans"]:
+                for span in scope["spans"]:
+                    spans[span["name"]] = span
+    return spans
+
+
+def test_resumed_spans_keep_their_parent(tmp_path):
+    session = Tracer(str(tmp_path), "test")
+    session.start_trace()
+    with session.span("submit asset"):
+        context = session.context()
+    session.flush()
+
+    job = Tracer(str(tmp_path / "job"), "test")
+    with job.resume(context):
+        with job.span("upload job"):
+            pass
+        # spans opened after another trace was resumed and left.
+        with job.resume(None):
+            pass
+        with job.span("cleanup"):
+            pass
+    job.flush()
+
+    spans = _spans(tmp_path)
+    spans.update(_spans(tmp_path / "job"))
+    assert spans["upload job"]["traceId"] == spans["submit asset"]["traceId"]
+    assert spans["upload job"]["parentSpanId"] == spans["submit asset"]["spanId"]
+    assert spans["cleanup"]["parentSpanId"] == spans["submit asset"]["spanId"]
+
+
+def test_resume_restores_the_active_trace(tmp_path):
+    tracer = Tracer(str(tmp_path), "test")
+    tracer.start_trace()
+    session = tracer.begin("export session")
+    with tracer.resume({"trace_id": "0" * 32, "parent_id": "1" * 16}):
+        pass
+    with tracer.span("submit asset"):
+        pass
+    tracer.end(session)
+    tracer.flush()
+
+    spans = _spans(tmp_path)
+    assert spans["submit asset"]["parentSpanId"] == session.span_id
+    assert spans["submit asset"]["traceId"] == session.trace_id
+
+
+def test_disabled_tracer_records_nothing(tmp_path):
+    tracer = Tracer(None, "test")
+    tracer.start_trace()
+    assert tracer.begin("export session") is None
+    assert tracer.context() is None
+
+
+def _trace_file(folder, name, size, mtime):
+    path = os.path.join(str(folder), name)
+    with open(path, "wb") as fh:
+        fh.write(b"x" * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_old_trace_files_are_deleted(tmp_path):
+    tracer = Tracer(str(tmp_path), "test", max_age=3600)
+    old = _trace_file(tmp_path, "old.json", 10, 0)
+    tmp = _trace_file(tmp_path, ".tmp123", 10, 0)
+
+    tracer.start_trace()
+    with tracer.span("export session"):
+        pass
+    tracer.flush()
+
+    assert not os.path.exists(old)
+    assert not os.path.exists(tmp)
+    assert len(os.listdir(str(tmp_path))) == 1
+
+
+def test_trace_files_fit_the_maximum_size(tmp_path):
+    tracer = Tracer(str(tmp_path), "test", max_size=2500)
+    for index in range(3):
+        _trace_file(tmp_path, "%d.json" % index, 1000, time.time() - 10 + index)
+
+    tracer.prune()
+
+    assert sorted(os.listdir(str(tmp_path))) == ["1.json", "2.json"]
@@ -0,0 +1,209 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import socket
+import stat
+import tempfile
+import threading
+
+import pytest
+
+from tk_flame_review import upload_daemon
+from tk_flame_review.upload_daemon import UploadDaemon, UploadDaemonClient
+
+
+@pytest.fixture
+def socket_path():
+    # Unix socket paths are limited to about a hundred characters.
+    folder = tempfile.mkdtemp(prefix="tkfr")
+    yield os.path.join(folder, "private", "upload.sock")
+    for root, folders, files in os.walk(folder, topdown=False):
+        for name in files:
+            os.remove(os.path.join(root, name))
+        for name in folders:
+            os.rmdir(os.path.join(root, name))
+    os.rmdir(folder)
+
+
+def _start(socket_path, handler):
+    daemon = UploadDaemon(socket_path, handler)
+    assert daemon.start()
+    return daemon
+
+
+def test_socket_is_private(socket_path):
+    daemon = _start(socket_path, lambda job: None)
+    try:
+        folder_mode = os.stat(os.path.dirname(socket_path)).st_mode
+        assert stat.S_IMODE(folder_mode) == 0o700
+        assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+    finally:
+        daemon.stop()
+
+
+def test_loose_folder_is_tightened(socket_path):
+    folder = os.path.dirname(socket_path)
+    os.mkdir(folder, 0o777)
+    os.chmod(folder, 0o777)
+    upload_daemon.ensure_private_folder(folder)
+    assert stat.S_IMODE(os.stat(folder).st_mode) == 0o700
+
+
+def test_peer_uid(socket_path):
+    left, right = socket.socketpair(socket.AF_UNIX)
+    try:
+        assert upload_daemon.get_peer_uid(left) == os.getuid()
+    finally:
+        left.close()
+        right.close()
+
+
+def test_requests_from_other_users_are_refused(socket_path, monkeypatch):
+    daemon = _start(socket_path, lambda job: None)
+    try:
+        client = UploadDaemonClient(socket_path)
+        assert client.ping()["ok"]
+        # as if the daemon and the client were run by different users
+        uid = os.getuid()
+        monkeypatch.setattr(upload_daemon.os, "getuid", lambda: uid + 1)
+        assert client.ping() is None
+    finally:
+        monkeypatch.undo()
+        daemon.stop()
+
+
+def test_submit_and_wait(socket_path):
+    uploaded = []
+    daemon = _start(socket_path, uploaded.append)
+    try:
+        result = UploadDaemonClient(socket_path).submit({"full_path": "a"}, wait=True)
+        assert result["state"] == upload_daemon.DONE
+        assert uploaded == [{"full_path": "a"}]
+    finally:
+        daemon.stop()
+
+
+def test_stop_cancels_queued_jobs(socket_path):
+    started = threading.Event()
+    release = threading.Event()
+
+    def handler(job):
+        started.set()
+        release.wait(5)
+
+    daemon = _start(socket_path, handler)
+    client = UploadDaemonClient(socket_path)
+    running = client.submit({"full_path": "running"})["job_id"]
+    assert started.wait(5)
+
+    waited = {}
+
+    def wait_for_upload():
+        waited.update(client.submit({"full_path": "waited"}, wait=True))
+
+    waiter = threading.Thread(target=wait_for_upload)
+    waiter.start()
+    daemon.submit({"full_path": "local"})
+    while len(daemon._jobs) < 3:
+        threading.Event().wait(0.01)
+
+    # only the job no client waits for is handed back
+    assert daemon.stop() == [{"full_path": "local"}]
+    waiter.join(5)
+    assert waited["state"] == upload_daemon.CANCELLED
+    release.set()
+    assert daemon.wait(running)["state"] == upload_daemon.DONE
+
+    with pytest.raises(RuntimeError):
+        daemon.submit({"full_path": "late"})
+
+
+def test_shutdown_request_hands_back_queued_jobs(socket_path):
+    started = threading.Event()
+    release = threading.Event()
+    cancelled = []
+    handed_back = threading.Event()
+
+    def handler(job):
+        started.set()
+        release.wait(5)
+
+    def on_cancelled(job):
+        cancelled.append(job)
+        handed_back.set()
+
+    daemon = UploadDaemon(socket_path, handler, on_cancelled=on_cancelled)
+    assert daemon.start()
+    client = UploadDaemonClient(socket_path)
+    try:
+        client.submit({"full_path": "running"})
+        assert started.wait(5)
+        queued = client.submit({"full_path": "queued"})["job_id"]
+
+        assert client.shutdown()["ok"]
+        assert daemon.wait(queued)["state"] == upload_daemon.CANCELLED
+        assert handed_back.wait(5)
+        assert cancelled == [{"full_path": "queued"}]
+    finally:
+        release.set()
+        daemon.stop()
+
+
+def _processing_order(socket_path, shortest_first):
+    """
+    Submits uploads while the daemon is busy with a first one.
+
+    :returns: Paths of the uploads in the order they were processed.
+    """
+    started = threading.Event()
+    release = threading.Event()
+    finished = threading.Event()
+    processed = []
+
+    def handler(job):
+        processed.append(job["full_path"])
+        started.set()
+        release.wait(5)
+        if len(processed) == 4:
+            finished.set()
+
+    daemon = UploadDaemon(socket_path, handler, shortest_first=shortest_first)
+    assert daemon.start()
+    try:
+        daemon.submit({"full_path": "first", "expected_size": 900})
+        assert started.wait(5)
+        daemon.submit({"full_path": "reel", "expected_size": 2000})
+        daemon.submit({"full_path": "spot", "expected_size": 30})
+        daemon.submit({"full_path": "due reel", "expected_size": 1500, "deadline": 1})
+        release.set()
+        assert finished.wait(5)
+    finally:
+        release.set()
+        daemon.stop()
+    return processed
+
+
+def test_uploads_start_right_away_and_the_waiting_ones_are_reordered(socket_path):
+    assert _processing_order(socket_path, shortest_first=True) == [
+        "first",
+        "due reel",
+        "spot",
+        "reel",
+    ]
+
+
+def test_uploads_are_processed_in_submission_order_by_default(socket_path):
+    assert _processing_order(socket_path, shortest_first=False) == [
+        "first",
+        "reel",
+        "spot",
+        "due reel",
+    ]
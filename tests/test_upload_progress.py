@@ -0,0 +1,155 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import io
+import os
+import types
+
+import pytest
+
+from tk_flame_review_upload import upload_progress
+from tk_flame_review_upload.upload_progress import (
+    UploadProgress,
+    format_status,
+    read_status,
+    remove_old_status_files,
+)
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Clock of the module, only advanced by the tests.
+    """
+    clock = types.SimpleNamespace(now=1000.0)
+    clock.time = lambda: clock.now
+    clock.sleep = lambda seconds: None
+    monkeypatch.setattr(upload_progress, "time", clock)
+    return clock
+
+
+def _progress(tmp_path, total):
+    path = str(tmp_path / "status" / "job.json")
+    return UploadProgress(path, total), path
+
+
+def test_status_file_contents(tmp_path, clock):
+    progress, path = _progress(tmp_path, 100 * MB)
+    progress.start()
+
+    status = read_status(path)
+    assert status["state"] == "uploading"
+    assert status["total"] == 100 * MB and status["sent"] == 0
+    assert status["eta"] is None and status["error"] is None
+    assert status["pid"] == os.getpid()
+
+    clock.now += 2
+    progress.advance(20 * MB)
+
+    status = read_status(path)
+    assert status["sent"] == 20 * MB
+    assert status["throughput"] == 10 * MB
+    assert status["eta"] == 8
+    assert status["updated_at"] == clock.now
+
+
+def test_writes_are_throttled(tmp_path, clock):
+    progress, path = _progress(tmp_path, 100 * MB)
+    progress.start()
+
+    # less than REPORT_BYTES sent
+    clock.now += 1
+    progress.advance(UploadProgress.REPORT_BYTES - 1)
+    assert read_status(path)["sent"] == 0
+
+    # enough bytes, but too soon after the previous write
+    progress.advance(1)
+    clock.now += UploadProgress.REPORT_INTERVAL / 2
+    progress.advance(UploadProgress.REPORT_BYTES)
+    assert read_status(path)["sent"] == UploadProgress.REPORT_BYTES
+
+    clock.now += UploadProgress.REPORT_INTERVAL
+    progress.advance(UploadProgress.REPORT_BYTES)
+    assert read_status(path)["sent"] == 3 * UploadProgress.REPORT_BYTES
+    assert progress.sent == 3 * UploadProgress.REPORT_BYTES
+
+
+def test_done_is_complete(tmp_path, clock):
+    progress, path = _progress(tmp_path, 100 * MB)
+    progress.start()
+    progress.advance(60 * MB)
+    # a part failed and was sent again.
+    progress.rewind(10 * MB)
+    assert progress.sent == 50 * MB
+    clock.now += 1
+    progress.finish()
+
+    status = read_status(path)
+    assert status["state"] == "done"
+    assert status["sent"] == status["total"] == 100 * MB
+    assert status["eta"] is None
+    assert format_status(status).startswith("done: 100.0% of 104.9 MB")
+    # no temporary file is left behind.
+    assert os.listdir(os.path.dirname(path)) == ["job.json"]
+
+
+def test_failure_is_reported(tmp_path, clock):
+    progress, path = _progress(tmp_path, 100 * MB)
+    progress.start()
+    progress.finish(error=IOError("Connection reset"))
+
+    status = read_status(path)
+    assert status["state"] == "failed"
+    assert status["error"] == "Connection reset"
+    assert format_status(status).endswith("(Connection reset)")
+
+
+def test_status_file_errors_are_ignored(tmp_path, clock):
+    blocker = tmp_path / "status"
+    blocker.write_text("not a folder")
+    progress = UploadProgress(str(blocker / "job.json"), 10)
+
+    progress.start()
+    progress.finish()
+
+    assert read_status(str(blocker / "job.json")) is None
+
+
+def test_old_status_files_are_removed(tmp_path, clock):
+    for name, age in (("old.json", 7200), ("recent.json", 60)):
+        path = tmp_path / name
+        path.write_text("{}")
+        os.utime(str(path), (clock.now - age, clock.now - age))
+
+    remove_old_status_files(str(tmp_path), 3600)
+
+    assert os.listdir(str(tmp_path)) == ["recent.json"]
+
+
+def test_watch_prints_until_the_upload_ends(tmp_path, clock):
+    progress, path = _progress(tmp_path, 10 * MB)
+    out = io.StringIO()
+    statuses = iter([None, "start", "finish"])
+
+    def sleep(seconds):
+        step = next(statuses)
+        if step == "start":
+            progress.start()
+        elif step == "finish":
+            progress.finish()
+
+    clock.sleep = sleep
+    upload_progress.watch(path, out=out)
+
+    lines = out.getvalue().splitlines()
+    assert lines[0] == "waiting for upload to start..."
+    assert lines[-1].startswith("done: 100.0%")
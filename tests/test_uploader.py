@@ -0,0 +1,205 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from stand_in_site import StandInSite
+from tk_flame_review_upload import RetryPolicy, UploadProgress, upload
+from tk_flame_review_upload.job import upload_quicktime
+from tk_flame_review_upload.uploader import MIN_PART_SIZE
+
+# peak resident memory allowed to the process uploading a 10 GB file
+RSS_CEILING = 128 * 1024 * 1024
+
+
+def _upload(site, path, tmp_path, **kwargs):
+    progress = UploadProgress(str(tmp_path / "status.json"), os.path.getsize(str(path)))
+    attachment_id = upload(
+        site, "Version", 1, str(path), "sg_uploaded_movie", progress, **kwargs
+    )
+    return attachment_id, progress
+
+
+def test_single_request_upload(tmp_path):
+    path = tmp_path / "movie.mov"
+    path.write_bytes(b"x" * 3000000)
+    site = StandInSite()
+
+    attachment_id, progress = _upload(site, path, tmp_path)
+
+    assert attachment_id == 123
+    assert site.received == {"https://storage.example.com/movie.mov": 3000000}
+    assert site.completed is None
+    assert site.links == 1
+    assert progress.sent == 3000000
+
+
+def test_multipart_upload_completes_parts_in_order(tmp_path):
+    path = tmp_path / "movie.mov"
+    with open(str(path), "wb") as fh:
+        fh.truncate(3 * MIN_PART_SIZE + 1)
+    site = StandInSite()
+
+    _upload(site, path, tmp_path, part_size=MIN_PART_SIZE, concurrency=3)
+
+    assert site.completed == [
+        "etag-https://storage.example.com/movie.mov?part=%d" % part
+        for part in range(1, 5)
+    ]
+    assert site.bytes_received == 3 * MIN_PART_SIZE + 1
+    assert site.links == 1
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_sparse_10gb_upload_memory_is_bounded(tmp_path, concurrency):
+    resource = pytest.importorskip("resource")
+    path = tmp_path / "movie.mov"
+    with open(str(path), "wb") as fh:
+        fh.truncate(10 * 1024**3)
+
+    # measured in a process of its own, the peak of the test process depends
+    # on the tests which ran before.
+    script = textwrap.dedent("""
+        import resource, sys
+        sys.path[:0] = sys.argv[1:3]
+        from stand_in_site import StandInSite
+        from tk_flame_review_upload import UploadProgress, upload
+        site = StandInSite()
+        upload(
+            site, "Version", 1, sys.argv[3], "sg_uploaded_movie",
+            UploadProgress(sys.argv[4], 10 * 1024 ** 3), concurrency=%d,
+        )
+        assert site.bytes_received == 10 * 1024 ** 3
+        print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+        """ % concurrency)
+    tests_folder = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.check_output(
+        [
+            sys.executable,
+            "-c",
+            script,
+            os.path.join(os.path.dirname(tests_folder), "python"),
+            tests_folder,
+            str(path),
+            str(tmp_path / "status.json"),
+        ]
+    )
+
+    peak_rss = int(output.split()[-1])
+    # kilobytes on Linux, bytes on macOS
+    if sys.platform != "darwin":
+        peak_rss *= 1024
+    assert peak_rss < RSS_CEILING
+
+
+def _part_url(part):
+    return "https://storage.example.com/movie.mov?part=%d" % part
+
+
+def _multipart_movie(tmp_path):
+    path = tmp_path / "movie.mov"
+    with open(str(path), "wb") as fh:
+        fh.truncate(3 * MIN_PART_SIZE)
+    return path
+
+
+def test_failed_parts_are_retried_on_their_own(tmp_path):
+    path = _multipart_movie(tmp_path)
+    site = StandInSite()
+    site.failures[_part_url(2)] = [ConnectionResetError(), ConnectionResetError()]
+    policy = RetryPolicy(backoff_base=0)
+
+    upload_quicktime(
+        site,
+        1,
+        str(path),
+        "sg_uploaded_movie",
+        str(tmp_path),
+        retry_policy=policy,
+        part_size=MIN_PART_SIZE,
+        concurrency=2,
+    )
+
+    assert policy.stats["retries"] == 2
+    assert site.bytes_received == 3 * MIN_PART_SIZE
+    assert site.completed == ["etag-%s" % _part_url(part) for part in range(1, 4)]
+    assert site.links == 1
+
+
+def test_failed_upload_is_not_repeated(tmp_path):
+    path = _multipart_movie(tmp_path)
+    site = StandInSite()
+    site.failures[_part_url(2)] = [ConnectionResetError()] * 10
+    policy = RetryPolicy(max_attempts=3, backoff_base=0, breaker_threshold=0)
+
+    with pytest.raises(ConnectionResetError):
+        upload_quicktime(
+            site,
+            1,
+            str(path),
+            "sg_uploaded_movie",
+            str(tmp_path),
+            retry_policy=policy,
+            part_size=MIN_PART_SIZE,
+        )
+
+    # only the failed part is retried, and only max_attempts times.
+    assert policy.stats["retries"] == 2
+    assert site.completed is None
+    assert site.links == 0
+
+
+def test_link_is_not_repeated(tmp_path):
+    path = _multipart_movie(tmp_path)
+    site = StandInSite()
+    # may have reached the site, which would then link the file twice.
+    site.link_failures.append(ConnectionResetError())
+    policy = RetryPolicy(backoff_base=0)
+
+    with pytest.raises(ConnectionResetError):
+        upload_quicktime(
+            site,
+            1,
+            str(path),
+            "sg_uploaded_movie",
+            str(tmp_path),
+            retry_policy=policy,
+            part_size=MIN_PART_SIZE,
+        )
+
+    assert site.links == 1
+
+
+def test_parallel_parts_raise_throughput(tmp_path):
+    path = tmp_path / "movie.mov"
+    with open(str(path), "wb") as fh:
+        fh.truncate(4 * MIN_PART_SIZE)
+
+    throughputs = {}
+    for concurrency in (1, 4):
+        # each request is limited, like streams on a long distance link.
+        site = StandInSite(bandwidth=50 * 1024 * 1024)
+        elapsed = upload_quicktime(
+            site,
+            1,
+            str(path),
+            "sg_uploaded_movie",
+            str(tmp_path),
+            part_size=MIN_PART_SIZE,
+            concurrency=concurrency,
+        )
+        throughputs[concurrency] = site.bytes_received / elapsed
+
+    assert throughputs[4] > 2 * throughputs[1]
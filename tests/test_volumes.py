@@ -0,0 +1,166 @@
+# Copyright (c) 2014 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import importlib.util
+import os
+import sys
+import types
+
+import pytest
+
+from tk_flame_review import volumes
+from tk_flame_review.volumes import TempVolumeSelector, estimate_output_size
+
+GB = 1024 * 1024 * 1024
+
+HOOKS_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "hooks")
+
+
+@pytest.fixture
+def disks(monkeypatch):
+    """
+    Free space of the volumes, by path. Volumes missing from it can't be read.
+    """
+    free_space = {}
+
+    def disk_usage(path):
+        if path not in free_space:
+            raise OSError("No such file or directory: '%s'" % path)
+        return types.SimpleNamespace(free=free_space[path])
+
+    monkeypatch.setattr(volumes.shutil, "disk_usage", disk_usage)
+    return free_space
+
+
+def _selector(tmp_path, throughputs, measured=None):
+    """
+    :returns: Selector measuring the given throughputs, by volume.
+    """
+    selector = TempVolumeSelector(str(tmp_path / "cache" / "temp_volumes.json"))
+
+    def measure(volume):
+        if measured is not None:
+            measured.append(volume)
+        return throughputs[volume]
+
+    selector.measure = measure
+    return selector
+
+
+def test_single_volume_is_used_as_is(tmp_path, disks):
+    measured = []
+    selector = _selector(tmp_path, {}, measured)
+    assert selector.select(["/mnt/scratch"], 10 * GB) == "/mnt/scratch"
+    assert not measured
+
+
+def test_fastest_volume_with_enough_space(tmp_path, disks):
+    disks.update({"/mnt/ssd": 100 * GB, "/mnt/nas": 100 * GB, "/mnt/small": 11 * GB})
+    selector = _selector(
+        tmp_path, {"/mnt/ssd": 2000e6, "/mnt/nas": 200e6, "/mnt/small": 4000e6}
+    )
+
+    # the fastest volume doesn't have the 20% margin over the 10 GB expected.
+    assert (
+        selector.select(["/mnt/nas", "/mnt/small", "/mnt/ssd"], 10 * GB) == "/mnt/ssd"
+    )
+    assert selector.select(["/mnt/nas", "/mnt/small", "/mnt/ssd"], 5 * GB) == (
+        "/mnt/small"
+    )
+
+
+def test_most_free_space_when_no_volume_is_large_enough(tmp_path, disks):
+    disks.update({"/mnt/ssd": 5 * GB, "/mnt/nas": 8 * GB})
+    measured = []
+    selector = _selector(tmp_path, {"/mnt/ssd": 2000e6, "/mnt/nas": 200e6}, measured)
+
+    assert selector.select(["/mnt/ssd", "/mnt/nas"], 10 * GB) == "/mnt/nas"
+    assert not measured
+
+
+def test_unreadable_volumes_are_ignored(tmp_path, disks):
+    disks.update({"/mnt/nas": 100 * GB})
+    selector = _selector(tmp_path, {"/mnt/nas": 200e6})
+
+    assert selector.select(["/mnt/missing", "/mnt/nas"], GB) == "/mnt/nas"
+    # nothing usable, the export fails on the first volume with a clear error.
+    assert selector.select(["/mnt/missing", "/mnt/gone"], GB) == "/mnt/missing"
+
+
+def test_measurements_are_cached(tmp_path, disks, monkeypatch):
+    disks.update({"/mnt/ssd": 100 * GB, "/mnt/nas": 100 * GB})
+    throughputs = {"/mnt/ssd": 2000e6, "/mnt/nas": 200e6}
+    measured = []
+    _selector(tmp_path, throughputs, measured).select(["/mnt/ssd", "/mnt/nas"], GB)
+    assert sorted(measured) == ["/mnt/nas", "/mnt/ssd"]
+
+    # another session, e.g. after the ssd got busy.
+    del measured[:]
+    throughputs["/mnt/ssd"] = 20e6
+    selector = _selector(tmp_path, throughputs, measured)
+    assert selector.select(["/mnt/ssd", "/mnt/nas"], GB) == "/mnt/ssd"
+    assert not measured
+
+    now = volumes.time.time()
+    monkeypatch.setattr(
+        volumes.time, "time", lambda: now + TempVolumeSelector.MEASUREMENT_TTL
+    )
+    assert selector.select(["/mnt/ssd", "/mnt/nas"], GB) == "/mnt/nas"
+    assert sorted(measured) == ["/mnt/nas", "/mnt/ssd"]
+
+
+def test_measure(tmp_path, monkeypatch):
+    monkeypatch.setattr(TempVolumeSelector, "PROBE_SIZE", 2 * 1024 * 1024)
+    selector = TempVolumeSelector(str(tmp_path / "temp_volumes.json"))
+    volume = tmp_path / "volume"
+    volume.mkdir()
+
+    assert selector.measure(str(volume)) > 0
+    # the probe file is removed.
+    assert os.listdir(str(volume)) == []
+    assert selector.measure(str(tmp_path / "missing")) == 0
+
+
+def test_estimate_output_size():
+    # a minute at 8 Mbit/s
+    assert estimate_output_size(8000000, 24 * 60, 24) == 60 * 1000000
+    assert estimate_output_size(8000000, 100, None) == 0
+
+
+def _load_settings_hook(monkeypatch):
+    """
+    Loads the settings hook with a stand-in for the toolkit.
+    """
+
+    class Hook(object):
+        parent = None
+
+    sgtk = types.ModuleType("sgtk")
+    sgtk.get_hook_baseclass = lambda: Hook
+    monkeypatch.setitem(sys.modules, "sgtk", sgtk)
+    spec = importlib.util.spec_from_file_location(
+        "tk_flame_review_settings_hook", os.path.join(HOOKS_FOLDER, "settings.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.ExportSettings()
+
+
+def test_default_temp_volume_is_the_backburner_folder(tmp_path, monkeypatch, disks):
+    hook = _load_settings_hook(monkeypatch)
+    engine = types.SimpleNamespace(get_backburner_tmp=lambda: "/usr/tmp/backburner")
+    hook.parent = types.SimpleNamespace(engine=engine)
+
+    temp_volumes = hook.get_temp_volumes()
+
+    assert temp_volumes == ["/usr/tmp/backburner"]
+    # a single volume is used as is, without measuring it.
+    selector = _selector(tmp_path, {})
+    assert selector.select(temp_volumes, 10 * GB) == "/usr/tmp/backburner"